@@ -126,6 +126,9 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Transaction uploads are streamed in chunks, so large exports are fine
+TRANSACTION_UPLOAD_MAX_SIZE = 100 * 1024 * 1024  # 100MB
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
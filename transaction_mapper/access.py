@@ -0,0 +1,89 @@
+"""
+Cached role and permission lookups for request-time access checks.
+
+A user's role name and effective permission codenames are resolved once and
+kept in the cache under an access generation, and on the user object for the
+rest of the request, so ``has_perm`` and ``role_required`` do not query per
+check. The generation counter lives in the cache too and is seeded from the
+durable 'access' change stamp, so a request costs no database query. Editing
+a Role bumps both, which retires every user's entry at once; a change to one
+user's role or permissions drops only that user's entry.
+"""
+from typing import FrozenSet, NamedTuple, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .versioning import bump_version, get_version
+
+ACCESS_CACHE_TIMEOUT = 60 * 60
+GENERATION_KEY = 'user_access:generation'
+
+
+class UserAccess(NamedTuple):
+    role: Optional[str]
+    permissions: FrozenSet[str]
+    app_labels: FrozenSet[str]
+
+
+def _cache_key(user_pk, version: int) -> str:
+    return f'user_access:{user_pk}:v{version}'
+
+
+def _generation() -> int:
+    """Return the current access generation, seeding it from the change stamp after a cache miss"""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # add() keeps a value another process seeded first
+        cache.add(GENERATION_KEY, get_version('access'), None)
+        generation = cache.get(GENERATION_KEY, 0)
+    return generation
+
+
+def _advance_generation() -> None:
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Not seeded; the next read seeds it from the already bumped stamp
+        pass
+
+
+def _load_access(user) -> UserAccess:
+    from .models import Role
+
+    role = None
+    if user.role_id is not None:
+        role = Role.objects.filter(pk=user.role_id).values_list('name', flat=True).first()
+    rows = list(user.user_permissions.values_list('content_type__app_label', 'codename'))
+    return UserAccess(
+        role=role,
+        permissions=frozenset(codename for _, codename in rows),
+        app_labels=frozenset(app_label for app_label, _ in rows),
+    )
+
+
+def get_user_access(user) -> UserAccess:
+    """Return a user's role name and permission codenames, loading them at most once per request"""
+    access = getattr(user, '_access', None)
+    if access is None:
+        key = _cache_key(user.pk, _generation())
+        access = cache.get(key)
+        if access is None:
+            access = _load_access(user)
+            cache.set(key, access, ACCESS_CACHE_TIMEOUT)
+        user._access = access
+    return access
+
+
+def invalidate_user_access(user) -> None:
+    """Forget one user's cached access after their role or permissions changed"""
+    key = _cache_key(user.pk, _generation())
+    user.__dict__.pop('_access', None)
+    # Deleting before commit would let a concurrent request cache the old rows again
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def invalidate_all_access() -> None:
+    """Retire every user's cached access, e.g. after a Role's permissions were edited"""
+    bump_version('access')
+    transaction.on_commit(_advance_generation)
@@ -0,0 +1,92 @@
+"""
+In-process prefix index over the chart of accounts for typeahead lookups.
+
+The index keeps sorted lists of lowercase keys (account ids, full names and
+the individual words of names), so a lookup is a ``bisect`` plus a short
+scan instead of a database query. Each process builds it once per chart
+version and rebuilds it when the 'chart' change stamp moves.
+"""
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import Account
+from .versioning import get_version
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Match kinds, best first
+_BY_ID, _BY_NAME, _BY_WORD = range(3)
+
+
+class AccountIndex:
+    """Sorted prefix index over account ids and lowercase account names"""
+
+    def __init__(self, accounts: Iterable[dict]):
+        self.accounts: Dict[str, dict] = {}
+        keys: Tuple[list, list, list] = ([], [], [])
+        for account in accounts:
+            account_id = account['account_id']
+            name = account['name'].lower()
+            self.accounts[account_id] = account
+            keys[_BY_ID].append((account_id.lower(), account_id))
+            keys[_BY_NAME].append((name, account_id))
+            for word in set(name.split()[1:]):
+                keys[_BY_WORD].append((word, account_id))
+        self.keys = [sorted(kind) for kind in keys]
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def _scan(self, kind: int, prefix: str):
+        keys = self.keys[kind]
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            yield keys[position][1]
+            position += 1
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> List[dict]:
+        """
+        Return up to ``limit`` accounts matching a prefix.
+
+        Account id matches come first, then names starting with the query,
+        then names containing a word starting with it.
+        """
+        prefix = ' '.join(query.lower().split())
+        if not prefix:
+            return []
+
+        found = []
+        seen = set()
+        for kind in (_BY_ID, _BY_NAME, _BY_WORD):
+            for account_id in self._scan(kind, prefix):
+                if account_id not in seen:
+                    seen.add(account_id)
+                    found.append(self.accounts[account_id])
+                    if len(found) >= limit:
+                        return found
+        return found
+
+
+_lock = threading.Lock()
+_index: Optional[AccountIndex] = None
+_index_version: Optional[int] = None
+
+
+def build_account_index() -> AccountIndex:
+    """Load the chart of accounts into a new index with one query"""
+    return AccountIndex(Account.objects.order_by().values('account_id', 'name', 'account_type'))
+
+
+def get_account_index() -> AccountIndex:
+    """Return this process's index, rebuilding it if the chart has changed"""
+    global _index, _index_version
+
+    version = get_version('chart')
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = build_account_index()
+                _index_version = version
+    return _index
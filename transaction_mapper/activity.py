@@ -0,0 +1,181 @@
+"""
+Buffered, asynchronous writer for UserActivity rows.
+
+Request code hands events to the process-wide ``ActivitySink`` instead of
+inserting them itself. A background thread drains the queue and writes the
+events with ``bulk_create`` whenever ``ACTIVITY_BATCH_SIZE`` events are
+waiting or ``ACTIVITY_FLUSH_INTERVAL`` seconds have passed, and once more
+when the process exits.
+
+The queue holds at most ``ACTIVITY_QUEUE_SIZE`` events. What happens when
+it is full is set by ``ACTIVITY_OVERFLOW``:
+
+- 'drop' (default): discard the new event and count it in ``dropped``
+- 'block': wait up to ``ACTIVITY_BLOCK_SECONDS`` for room, then drop
+- 'sync': write the event in the calling thread, as before the sink existed
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .models import UserActivity
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop', 'block', 'sync')
+
+# Queued by close() to wake the writer thread without waiting out the flush interval
+_STOP = object()
+
+
+class ActivitySink:
+    """Bounded in-memory queue of UserActivity rows flushed by a daemon thread"""
+
+    def __init__(
+        self,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_queue: int = 10_000,
+        overflow: str = 'drop',
+        block_seconds: float = 0.05,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown activity overflow policy {overflow!r}; use one of {OVERFLOW_POLICIES}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_seconds = block_seconds
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopping.clear()
+                    self._thread = threading.Thread(target=self._run, name='activity-sink', daemon=True)
+                    self._thread.start()
+
+    def record(self, user_id, activity_type: str, description: str, ip_address: Optional[str]) -> None:
+        """Queue an activity event; the timestamp is taken now, not when the row is written"""
+        activity = UserActivity(
+            user_id=user_id,
+            activity_type=activity_type,
+            description=description,
+            ip_address=ip_address,
+            created_at=timezone.now(),
+        )
+        self._ensure_started()
+        try:
+            if self.overflow == 'block':
+                self._queue.put(activity, timeout=self.block_seconds)
+            else:
+                self._queue.put_nowait(activity)
+        except queue.Full:
+            if self.overflow == 'sync':
+                self._write([activity])
+                return
+            self.dropped += 1
+            # Log the first drop and then every thousandth, not every event
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Activity queue full; {self.dropped} events dropped so far")
+
+    def _take_batch(self, timeout: float) -> List[UserActivity]:
+        batch = []
+        try:
+            activity = self._queue.get(timeout=timeout)
+            while activity is not _STOP:
+                batch.append(activity)
+                if len(batch) >= self.batch_size:
+                    break
+                activity = self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        try:
+            deadline = time.monotonic() + self.flush_interval
+            pending: List[UserActivity] = []
+            while not self._stopping.is_set():
+                pending.extend(self._take_batch(max(0.0, deadline - time.monotonic())))
+                if len(pending) >= self.batch_size or time.monotonic() >= deadline:
+                    if pending:
+                        self._write(pending)
+                        pending = []
+                    deadline = time.monotonic() + self.flush_interval
+            self._write(pending + self._drain())
+        finally:
+            connection.close()
+
+    def _drain(self) -> List[UserActivity]:
+        rows = []
+        while True:
+            try:
+                activity = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if activity is not _STOP:
+                rows.append(activity)
+
+    def _write(self, rows: List[UserActivity]) -> None:
+        """Insert a batch; if it fails, retry row by row so one bad event does not lose the rest"""
+        if not rows:
+            return
+        try:
+            UserActivity.objects.bulk_create(rows, batch_size=self.batch_size)
+            return
+        except DatabaseError as e:
+            logger.warning(f"Activity batch of {len(rows)} failed, retrying one by one: {str(e)}")
+        for row in rows:
+            try:
+                with transaction.atomic():
+                    row.save(force_insert=True)
+            except DatabaseError as e:
+                logger.error(f"Dropped activity {row.activity_type}: {str(e)}")
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the writer thread after it has written everything queued so far"""
+        thread = self._thread
+        self._stopping.set()
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put_nowait(_STOP)
+            except queue.Full:
+                # The writer is not waiting on an empty queue
+                pass
+            thread.join(timeout)
+        else:
+            self._write(self._drain())
+
+
+_sink: Optional[ActivitySink] = None
+_sink_lock = threading.Lock()
+
+
+def get_activity_sink() -> ActivitySink:
+    """Return the process-wide sink, configured from settings on first use"""
+    global _sink
+
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = ActivitySink(
+                    batch_size=getattr(settings, 'ACTIVITY_BATCH_SIZE', 200),
+                    flush_interval=getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 1.0),
+                    max_queue=getattr(settings, 'ACTIVITY_QUEUE_SIZE', 10_000),
+                    overflow=getattr(settings, 'ACTIVITY_OVERFLOW', 'drop'),
+                    block_seconds=getattr(settings, 'ACTIVITY_BLOCK_SECONDS', 0.05),
+                )
+                atexit.register(_sink.close)
+    return _sink
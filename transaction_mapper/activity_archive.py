@@ -0,0 +1,245 @@
+"""
+Rollups, monthly archive segments and retention for the UserActivity log.
+
+Completed days are summarized into UserActivityDaily (per user, day and
+activity type) once, so audit views over long periods read a few rows per
+user and day instead of raw events. Whole months older than the retention
+period are then written to gzip-compressed JSON Lines segments, one or more
+per month, and deleted from the hot table. A month is archived only after
+every one of its days has been rolled up, so the rollups stay complete.
+
+Run it daily with ``manage.py archive_activity``.
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import UserActivity, UserActivityDaily
+from .rollups import month_start, next_month
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = ['id', 'user_id', 'activity_type', 'description', 'ip_address', 'created_at']
+DEFAULT_RETENTION_DAYS = 90
+DELETE_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 2000
+# Events are stamped when recorded but written by the activity sink up to its
+# flush interval later, so a day is closed only this long after midnight
+ROLLUP_GRACE_MARGIN = timedelta(minutes=1)
+
+
+def archive_directory() -> str:
+    return str(getattr(settings, 'ACTIVITY_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'activity_archive')))
+
+
+def _day_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _activity_between(first_day: date, end_day: date):
+    """Raw activity from the start of ``first_day`` up to, not including, ``end_day``"""
+    return UserActivity.objects.filter(created_at__gte=_day_start(first_day), created_at__lt=_day_start(end_day))
+
+
+def last_rolled_up_day() -> Optional[date]:
+    return UserActivityDaily.objects.aggregate(last=Max('date'))['last']
+
+
+def _rollup_rows(first_day: date, last_day: date):
+    """(user_id, day, activity_type, count) per rollup row of a range of days"""
+    return (
+        _activity_between(first_day, last_day + timedelta(days=1))
+        .order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values_list('user_id', 'day', 'activity_type')
+        .annotate(n=Count('pk'))
+    )
+
+
+def rollup_days(first_day: date, last_day: date) -> int:
+    """
+    Summarize the raw activity of a range of days into UserActivityDaily.
+
+    :return: Number of rollup rows written
+    """
+    if first_day > last_day:
+        return 0
+    rows = _rollup_rows(first_day, last_day)
+    with transaction.atomic():
+        UserActivityDaily.objects.filter(date__gte=first_day, date__lte=last_day).delete()
+        written = UserActivityDaily.objects.bulk_create(
+            [
+                UserActivityDaily(user_id=user_id, date=day, activity_type=activity_type, count=n)
+                for user_id, day, activity_type, n in rows
+            ],
+            batch_size=1000
+        )
+    return len(written)
+
+
+def rollup_grace() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 1.0)) + ROLLUP_GRACE_MARGIN
+
+
+def pending_rollup_days(today: date) -> Optional[Tuple[date, date]]:
+    """
+    First and last day the next rollup covers, or None if no day is ready.
+
+    A day is ready once it has ended and the grace period after its midnight
+    has passed, so events the sink flushes late are not left out.
+    """
+    last = last_rolled_up_day()
+    if last is not None:
+        first_day = last + timedelta(days=1)
+    else:
+        oldest = UserActivity.objects.aggregate(oldest=Min('created_at'))['oldest']
+        if oldest is None:
+            return None
+        first_day = timezone.localdate(oldest)
+    settled = timezone.localdate(timezone.now() - rollup_grace())
+    last_day = min(today, settled) - timedelta(days=1)
+    if first_day > last_day:
+        return None
+    return first_day, last_day
+
+
+def rollup_completed_days(today: date) -> Tuple[Optional[date], int]:
+    """
+    Roll up every day after the last rolled-up one, through yesterday.
+
+    Days are rolled up once; later days never reread them, because their raw
+    rows may already be archived. Yesterday waits until the grace period after
+    midnight has passed.
+
+    :return: Tuple of (first day rolled up or None, rollup rows written)
+    """
+    days = pending_rollup_days(today)
+    if days is None:
+        return None, 0
+    first_day, last_day = days
+    return first_day, rollup_days(first_day, last_day)
+
+
+def _segment_path(directory: str, month: date) -> str:
+    """Next free segment file name for a month; later runs add numbered parts"""
+    base = os.path.join(directory, f"user_activity-{month:%Y-%m}")
+    path, part = f"{base}.jsonl.gz", 1
+    while os.path.exists(path):
+        part += 1
+        path = f"{base}.{part}.jsonl.gz"
+    return path
+
+
+def archive_month(month: date, directory: str) -> Tuple[Optional[str], int]:
+    """
+    Move a month of raw activity into a gzip JSON Lines segment.
+
+    The segment is written to a temporary file and renamed into place before
+    any row is deleted, and only rows that made it into the segment are
+    deleted, so an interrupted run loses nothing.
+
+    :return: Tuple of (segment path or None if the month had no rows, rows archived)
+    """
+    rows = _activity_between(month, next_month(month)).order_by('pk')
+    if not rows.exists():
+        return None, 0
+
+    os.makedirs(directory, exist_ok=True)
+    path = _segment_path(directory, month)
+    temporary = f"{path}.tmp"
+    archived = 0
+    last_id = None
+    with gzip.open(temporary, 'wt', encoding='utf-8') as segment:
+        for row in rows.values_list(*ARCHIVE_FIELDS).iterator(chunk_size=READ_CHUNK_SIZE):
+            segment.write(json.dumps(dict(zip(ARCHIVE_FIELDS, row)), cls=DjangoJSONEncoder) + '\n')
+            archived += 1
+            last_id = row[0]
+    os.replace(temporary, path)
+
+    # Rows written after the segment was read have higher ids and stay for the next run
+    written = rows.filter(pk__lte=last_id)
+    while True:
+        ids = list(written.values_list('pk', flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            break
+        UserActivity.objects.filter(pk__in=ids).delete()
+    logger.info(f"Archived {archived} activities of {month:%Y-%m} to {path}")
+    return path, archived
+
+
+def months_to_archive(today: date, retention_days: int, last_rolled: Optional[date] = None) -> List[date]:
+    """
+    Months that ended before the retention cutoff and are fully rolled up.
+
+    :param last_rolled: Last rolled-up day; defaults to the last day in UserActivityDaily
+    """
+    oldest = UserActivity.objects.aggregate(oldest=Min('created_at'))['oldest']
+    last_rolled = last_rolled or last_rolled_up_day()
+    if oldest is None or last_rolled is None:
+        return []
+
+    cutoff_month = month_start(today - timedelta(days=retention_days))
+    months = []
+    month = month_start(timezone.localdate(oldest))
+    while month < cutoff_month and next_month(month) - timedelta(days=1) <= last_rolled:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def apply_retention(
+    today: Optional[date] = None,
+    retention_days: int = DEFAULT_RETENTION_DAYS,
+    directory: Optional[str] = None,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Roll up completed days, then archive and delete months past retention.
+
+    A dry run writes nothing; it reports the rollup rows and months a real run
+    would write and archive.
+
+    :return: Dict with the rollup rows written and (month, segment, rows) per archived month
+    """
+    today = today or timezone.localdate()
+    directory = directory or archive_directory()
+
+    last_rolled = None
+    if dry_run:
+        days = pending_rollup_days(today)
+        rolled_up = 0
+        if days is not None:
+            rolled_up = _rollup_rows(*days).count()
+            last_rolled = days[1]
+    else:
+        _, rolled_up = rollup_completed_days(today)
+    archived = []
+    for month in months_to_archive(today, retention_days, last_rolled):
+        if dry_run:
+            archived.append((month, None, _activity_between(month, next_month(month)).count()))
+        else:
+            path, count = archive_month(month, directory)
+            archived.append((month, path, count))
+    return {'rolled_up': rolled_up, 'archived': archived}
+
+
+def activity_summary(user_id=None, date_from: Optional[date] = None, date_to: Optional[date] = None) -> List[dict]:
+    """Daily activity counts per type from the rollups, for audit views"""
+    queryset = UserActivityDaily.objects.all()
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    return list(queryset.values('user_id', 'date', 'activity_type', 'count'))
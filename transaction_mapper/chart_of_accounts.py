@@ -6,6 +6,8 @@ import numpy as np
 from datetime import datetime
 from difflib import SequenceMatcher
 
+from .file_readers import iter_frames
+
 class AccountType(Enum):
     """Enumeration of standard account types."""
     ASSET = "Asset"
@@ -77,22 +79,20 @@ class ChartOfAccounts:
         Load accounts from a file (CSV or Excel) and populate the chart of accounts.
 
         :param file_path: Path to the file containing account data
-        :param file_type: Type of file ('csv' or 'excel')
+        :param file_type: Type of file ('csv', 'excel' or 'parquet')
         """
-        if file_type == 'csv':
-            df = pd.read_csv(file_path)
-        elif file_type == 'excel':
-            df = pd.read_excel(file_path)
-        else:
-            raise ValueError("Unsupported file type. Use 'csv' or 'excel'.")
-
-        for _, row in df.iterrows():
-            account = Account(
-                account_id=row['account_code'],
-                name=row['account_name'],
-                account_type=AccountType[row['account_type'].upper()]
-            )
-            self.add_account(account)
+        if file_type not in ('csv', 'excel', 'parquet'):
+            raise ValueError("Unsupported file type. Use 'csv', 'excel' or 'parquet'.")
+
+        # Excel and Parquet files are streamed in chunks instead of loaded whole
+        for df in iter_frames(file_path, file_type):
+            for _, row in df.iterrows():
+                account = Account(
+                    account_id=row['account_code'],
+                    name=row['account_name'],
+                    account_type=AccountType[row['account_type'].upper()]
+                )
+                self.add_account(account)
 
     def upload_accounts(self, file_path: str, file_type: str = 'csv'):
         """
@@ -101,22 +101,19 @@ class ChartOfAccounts:
         :param file_path: Path to the file containing account data
         :param file_type: Type of file ('csv' or 'excel')
         """
-        if file_type == 'csv':
-            df = pd.read_csv(file_path)
-        elif file_type == 'excel':
-            df = pd.read_excel(file_path)
-        else:
+        if file_type not in ('csv', 'excel'):
             raise ValueError("Unsupported file type")
 
-        for _, row in df.iterrows():
-            account_type = AccountType[row['type'].upper()]
-            account = Account(
-                account_id=row['accounting_code'],
-                name=row['accounting_name'],
-                account_type=account_type
-            )
-            # Assuming sign_convention is used for additional logic, if needed
-            self.add_account(account)
+        for df in iter_frames(file_path, file_type):
+            for _, row in df.iterrows():
+                account_type = AccountType[row['type'].upper()]
+                account = Account(
+                    account_id=row['accounting_code'],
+                    name=row['accounting_name'],
+                    account_type=account_type
+                )
+                # Assuming sign_convention is used for additional logic, if needed
+                self.add_account(account)
 
 class TransactionMapper:
     def __init__(self, chart_of_accounts):
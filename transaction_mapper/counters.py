@@ -0,0 +1,98 @@
+"""
+Per-status transaction counters and the 'transactions' change stamp.
+
+Writers call ``record_transaction_changes`` inside the same database
+transaction as their change, with how many transactions entered or left each
+status. The counters table then always matches the committed data, so the
+transaction header stats are a handful of primary-key reads instead of a
+scan, and the 'transactions' stamp tells readers the table has changed.
+``reconcile_counters`` recomputes the counters from the table, e.g. after a
+raw SQL fix-up.
+"""
+from collections import Counter
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Transaction, TransactionCounter
+from .versioning import bump_version
+
+STATUSES = [code for code, _ in Transaction.STATUS_CHOICES]
+
+
+def record_status_changes(deltas: Dict[str, int]) -> None:
+    """
+    Add signed per-status deltas to the counters.
+
+    :param deltas: Mapping of status to the number of rows that entered (+) or left (-) it
+    """
+    for status, delta in deltas.items():
+        if not delta:
+            continue
+        updated = TransactionCounter.objects.filter(status=status).update(count=F('count') + delta)
+        if not updated:
+            _, created = TransactionCounter.objects.get_or_create(status=status, defaults={'count': delta})
+            if not created:
+                TransactionCounter.objects.filter(status=status).update(count=F('count') + delta)
+
+
+def record_transaction_changes(deltas: Optional[Dict[str, int]] = None) -> None:
+    """
+    Record a write to the Transaction table: apply the status deltas to the
+    counters and bump the 'transactions' change stamp.
+    """
+    if deltas:
+        record_status_changes(deltas)
+    bump_version('transactions')
+
+
+def moved(old_status: str, new_status: str, count: int = 1) -> Dict[str, int]:
+    """Deltas for ``count`` transactions moving from one status to another"""
+    if old_status == new_status or not count:
+        return {}
+    return {old_status: -count, new_status: count}
+
+
+def status_breakdown(queryset) -> Counter:
+    """Count the rows of a queryset per status with one grouped query"""
+    return Counter(dict(
+        queryset.order_by().values('status').annotate(n=Count('pk')).values_list('status', 'n')
+    ))
+
+
+def moved_to(new_status: str, old_statuses: Counter) -> Dict[str, int]:
+    """Deltas for rows with the given old statuses all moving to ``new_status``"""
+    deltas = Counter({status: -n for status, n in old_statuses.items()})
+    deltas[new_status] += sum(old_statuses.values())
+    return dict(deltas)
+
+
+def removed(old_statuses: Counter) -> Dict[str, int]:
+    """Deltas for deleted rows with the given statuses"""
+    return {status: -n for status, n in old_statuses.items()}
+
+
+def status_counts() -> Dict[str, int]:
+    """Return the counter of every status (0 if never written) and their 'total'"""
+    counts = dict.fromkeys(STATUSES, 0)
+    counts.update(TransactionCounter.objects.values_list('status', 'count'))
+    counts['total'] = sum(counts[status] for status in STATUSES)
+    return counts
+
+
+def reconcile_counters() -> Dict[str, tuple]:
+    """
+    Recompute every counter from the Transaction table.
+
+    :return: Mapping of status to (stored, actual) for counters that had drifted
+    """
+    with transaction.atomic():
+        stored = dict(TransactionCounter.objects.select_for_update().values_list('status', 'count'))
+        actual = status_breakdown(Transaction.objects.all())
+        drift = {}
+        for status in set(STATUSES) | set(stored) | set(actual):
+            if stored.get(status, 0) != actual.get(status, 0):
+                drift[status] = (stored.get(status, 0), actual.get(status, 0))
+                TransactionCounter.objects.update_or_create(status=status, defaults={'count': actual.get(status, 0)})
+    return drift
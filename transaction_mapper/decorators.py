@@ -4,6 +4,7 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
 from django.http import JsonResponse
+from .access import get_user_access
 
 def role_required(roles):
     """
@@ -26,13 +27,16 @@ def role_required(roles):
                 return redirect('login')
             
             try:
-                if not hasattr(request.user, 'role') or request.user.role is None:
+                # Role name comes from the cached access entry, not the role FK
+                role = get_user_access(request.user).role
+                if role is None:
                     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                         return JsonResponse({'error': 'No role assigned'}, status=403)
                     messages.error(request, "Your account has no role assigned. Please contact an administrator.")
                     return redirect('login')
                 
-                if request.user.role.name not in roles and 'ADMIN' not in roles:
+                # Administrators pass every role check
+                if role != 'ADMIN' and role not in roles:
                     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                         return JsonResponse({'error': 'Insufficient permissions'}, status=403)
                     raise PermissionDenied(f"This action requires one of these roles: {', '.join(roles)}")
@@ -0,0 +1,319 @@
+"""
+Bulk export of the Transaction table.
+
+Rows are read with ``values_list(...).iterator()``, which uses a server-side
+cursor where the database supports it, and written out in batches, so an
+export never holds more than one batch of rows in memory. The CSV and XLSX
+writers are generators of bytes meant for ``StreamingHttpResponse``: the
+first bytes go out before the query has finished reading.
+"""
+import csv
+import re
+import zipfile
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from .models import Transaction
+
+# (column name, queryset lookup); column names match what the upload expects
+EXPORT_COLUMNS: List[Tuple[str, str]] = [
+    ('transaction_id', 'transaction_id'),
+    ('date', 'date'),
+    ('time', 'time'),
+    ('description', 'description'),
+    ('customer_name', 'customer_name'),
+    ('transaction_type', 'transaction_type'),
+    ('amount', 'amount'),
+    ('account', 'account_id'),
+    ('debit_account', 'debit_account_id'),
+    ('credit_account', 'credit_account_id'),
+    ('status', 'status'),
+    ('confidence_score', 'confidence_score'),
+    ('uploaded_at', 'uploaded_at'),
+    ('mapped_at', 'mapped_at'),
+    ('fingerprint', 'fingerprint'),
+]
+
+# Free-text columns a spreadsheet could read as a formula
+FORMULA_COLUMNS = ('description', 'customer_name')
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+DEFAULT_ROW_GROUP_SIZE = 100_000
+DEFAULT_STREAM_CHUNK_SIZE = 2000
+
+
+def export_queryset(date_from=None, date_to=None, statuses: Optional[Sequence[str]] = None):
+    """Return the transactions to export, filtered by date range and status."""
+    queryset = Transaction.objects.all()
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset.order_by('transaction_id')
+
+
+def iter_batches(rows: Iterable, size: int) -> Iterator[list]:
+    """Group an iterable into lists of at most ``size`` items."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    types = {
+        'date': pa.date32(),
+        'time': pa.time64('us'),
+        'amount': pa.decimal128(15, 2),
+        'confidence_score': pa.float64(),
+        'uploaded_at': pa.timestamp('us', tz='UTC'),
+        'mapped_at': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(name, types.get(name, pa.string())) for name, _ in EXPORT_COLUMNS])
+
+
+def write_transactions_parquet(
+    queryset,
+    destination,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    compression: str = 'zstd'
+) -> int:
+    """
+    Write transactions to a Parquet file, one row group per batch.
+
+    :param queryset: Transactions to export
+    :param destination: Path or writable binary file object
+    :param row_group_size: Rows fetched from the cursor and written per row group
+    :param compression: Parquet compression codec
+    :return: Number of rows written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS]
+    rows = queryset.values_list(*lookups).iterator(chunk_size=row_group_size)
+
+    written = 0
+    with pq.ParquetWriter(destination, schema, compression=compression) as writer:
+        for batch in iter_batches(rows, row_group_size):
+            columns = zip(*batch)
+            arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=row_group_size)
+            written += len(batch)
+    return written
+
+
+def export_rows(queryset, chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE) -> Iterator[tuple]:
+    """Stream export rows as tuples in ``EXPORT_COLUMNS`` order, without building model instances"""
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS]
+    return queryset.values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+def escape_formula(value):
+    """Prefix text a spreadsheet would evaluate as a formula with a quote, so it is shown as text"""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def spreadsheet_rows(queryset, chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE) -> Iterator[tuple]:
+    """Export rows for CSV and XLSX, with the free-text columns escaped against formula injection"""
+    positions = [index for index, (name, _) in enumerate(EXPORT_COLUMNS) if name in FORMULA_COLUMNS]
+    for row in export_rows(queryset, chunk_size):
+        row = list(row)
+        for index in positions:
+            row[index] = escape_formula(row[index])
+        yield row
+
+
+class _Echo:
+    """Pseudo-buffer for csv.writer: writerow() returns the formatted line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def stream_transactions_csv(queryset, chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Generate a CSV export, one chunk of encoded bytes per batch of rows.
+
+    :param queryset: Transactions to export, already filtered and ordered
+    :param chunk_size: Rows fetched from the cursor and encoded per chunk
+    """
+    writer = csv.writer(_Echo())
+    # The BOM lets Excel detect UTF-8 when the file is opened directly
+    yield ('\ufeff' + writer.writerow([name for name, _ in EXPORT_COLUMNS])).encode('utf-8')
+    for batch in iter_batches(spreadsheet_rows(queryset, chunk_size), chunk_size):
+        yield ''.join(writer.writerow(row) for row in batch).encode('utf-8')
+
+
+class _ZipStream:
+    """
+    Write-only, non-seekable file object for zipfile.
+
+    zipfile falls back to data descriptors when it cannot seek, so every
+    member is written front to back and the bytes can be drained and sent
+    as soon as they are written.
+    """
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+# Cell styles declared in xl/styles.xml, by position in cellXfs
+_STYLE_DATE, _STYLE_TIME, _STYLE_DATETIME = 1, 2, 3
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+# Control characters that are not allowed anywhere in an XML document
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Transactions" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="4">'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="21" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '</cellXfs>'
+        '</styleSheet>'
+    ),
+}
+
+_SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_FOOTER = '</sheetData></worksheet>'
+
+
+def _time_fraction(value: time) -> float:
+    return (value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6) / 86400
+
+
+def _xlsx_cell(value) -> str:
+    """Render one value as a worksheet cell; dates become styled Excel serial numbers"""
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, Decimal):
+        return f'<c><v>{value:f}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value!r}</v></c>'
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        delta = value - _EXCEL_EPOCH
+        return f'<c s="{_STYLE_DATETIME}"><v>{delta.days + delta.seconds / 86400 + delta.microseconds / 8.64e10!r}</v></c>'
+    if isinstance(value, date):
+        return f'<c s="{_STYLE_DATE}"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    if isinstance(value, time):
+        return f'<c s="{_STYLE_TIME}"><v>{_time_fraction(value)!r}</v></c>'
+    text = escape(_XML_ILLEGAL.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values) -> str:
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def stream_transactions_xlsx(queryset, chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Generate a single-sheet XLSX export as a stream of bytes.
+
+    The workbook is written directly as SpreadsheetML with inline strings, so
+    nothing but the current batch is held in memory and no shared string
+    table has to be built before the sheet can be written.
+
+    :param queryset: Transactions to export, already filtered and ordered
+    :param chunk_size: Rows fetched from the cursor and written per chunk
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield stream.drain()
+
+        # force_zip64: the sheet size is unknown up front and may pass 4 GiB
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((_SHEET_HEADER + _xlsx_row(name for name, _ in EXPORT_COLUMNS)).encode('utf-8'))
+            for batch in iter_batches(spreadsheet_rows(queryset, chunk_size), chunk_size):
+                sheet.write(''.join(_xlsx_row(row) for row in batch).encode('utf-8'))
+                data = stream.drain()
+                if data:
+                    yield data
+            sheet.write(_SHEET_FOOTER.encode('utf-8'))
+    yield stream.drain()
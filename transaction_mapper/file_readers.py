@@ -0,0 +1,137 @@
+"""
+Chunked readers for uploaded transaction and account files.
+
+Every reader yields pandas DataFrames of at most ``chunksize`` rows so the
+upload views can validate and insert one chunk at a time, whatever the file
+format (CSV, XLSX or Parquet).
+"""
+from typing import Dict, Iterator, Optional
+
+import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 1000
+
+EXCEL_TYPES = ('xlsx', 'excel')
+
+
+def file_type_from_name(name: str) -> str:
+    """Return the lowercase extension of an uploaded file name."""
+    return name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+
+
+def _apply_dtype(frame: pd.DataFrame, dtype: Optional[Dict[str, type]]) -> pd.DataFrame:
+    """Cast the listed columns, leaving empty cells empty."""
+    for column, column_type in (dtype or {}).items():
+        if column in frame.columns:
+            frame[column] = frame[column].astype(column_type).where(frame[column].notna(), None)
+    return frame
+
+
+def iter_xlsx_frames(
+    file,
+    chunksize: int = DEFAULT_CHUNK_SIZE,
+    dtype: Optional[Dict[str, type]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream the first worksheet of an XLSX workbook in chunks.
+
+    The workbook is opened read-only, so rows are parsed lazily from the
+    sheet XML instead of building the whole workbook in memory.
+
+    :param file: Path or file-like object of the workbook
+    :param chunksize: Maximum number of rows per yielded frame
+    :param dtype: Optional column types, as for ``pd.read_csv``
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        columns = [str(value).strip() if value is not None else '' for value in header]
+        width = len(columns)
+        batch = []
+        start = 0
+        for values in rows:
+            if all(value is None for value in values):
+                continue
+            values = tuple(values[:width]) + (None,) * (width - len(values))
+            batch.append(values)
+            if len(batch) >= chunksize:
+                frame = pd.DataFrame.from_records(batch, columns=columns,
+                                                  index=pd.RangeIndex(start, start + len(batch)))
+                yield _apply_dtype(frame, dtype)
+                start += len(batch)
+                batch = []
+
+        if batch:
+            frame = pd.DataFrame.from_records(batch, columns=columns,
+                                              index=pd.RangeIndex(start, start + len(batch)))
+            yield _apply_dtype(frame, dtype)
+    finally:
+        workbook.close()
+
+
+def iter_parquet_frames(
+    file,
+    chunksize: int = DEFAULT_CHUNK_SIZE,
+    dtype: Optional[Dict[str, type]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a Parquet file in record batches of ``chunksize`` rows.
+
+    Column types (dates, decimals, times) come straight from the file
+    schema, so no text re-parsing is needed.
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(file)
+    start = 0
+    for batch in parquet_file.iter_batches(batch_size=chunksize):
+        frame = batch.to_pandas()
+        frame.index = pd.RangeIndex(start, start + len(frame))
+        start += len(frame)
+        yield _apply_dtype(frame, dtype)
+
+
+def iter_frames(
+    file,
+    file_type: str,
+    chunksize: int = DEFAULT_CHUNK_SIZE,
+    encoding: Optional[str] = None,
+    dtype: Optional[Dict[str, type]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the rows of a file as DataFrames of ``chunksize`` rows.
+
+    :param file: Path or file-like object
+    :param file_type: 'csv', 'xlsx'/'excel', 'xls' or 'parquet'
+    :param chunksize: Maximum number of rows per yielded frame
+    :param encoding: Text encoding for CSV files
+    :param dtype: Optional column types
+    """
+    file_type = file_type.lower()
+    if file_type == 'csv':
+        yield from pd.read_csv(file, encoding=encoding, dtype=dtype, chunksize=chunksize)
+    elif file_type in EXCEL_TYPES:
+        yield from iter_xlsx_frames(file, chunksize=chunksize, dtype=dtype)
+    elif file_type == 'parquet':
+        yield from iter_parquet_frames(file, chunksize=chunksize, dtype=dtype)
+    elif file_type == 'xls':
+        # The legacy binary format cannot be streamed
+        frame = pd.read_excel(file, dtype=dtype)
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start + chunksize]
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def read_frame(file, file_type: str, **kwargs) -> pd.DataFrame:
+    """Read a whole file into one DataFrame through the chunked readers."""
+    frames = list(iter_frames(file, file_type, **kwargs))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames)
@@ -0,0 +1,43 @@
+"""
+Transaction list filters and sort orders shared by the listing view and
+other endpoints that select transactions from query parameters.
+"""
+from .search import search_transactions
+
+# Keyset sort orders by name; each ends with the primary key so positions are unique.
+# Entries are (field, descending, nullable), as expected by pagination.KeysetPaginator.
+TRANSACTION_SORTS = {
+    '-date': [('date', True, False), ('time', True, True), ('transaction_id', True, False)],
+    'date': [('date', False, False), ('time', False, True), ('transaction_id', False, False)],
+    '-amount': [('amount', True, False), ('transaction_id', True, False)],
+    'amount': [('amount', False, False), ('transaction_id', False, False)],
+}
+DEFAULT_SORT = '-date'
+
+FILTER_PARAMS = ('status', 'search', 'date_from', 'date_to')
+
+
+def transaction_filters(params) -> dict:
+    """
+    Read the transaction filters from query parameters.
+
+    Unknown sort orders fall back to the default one.
+    """
+    filters = {name: params.get(name, '').strip() for name in FILTER_PARAMS}
+    sort = params.get('sort', DEFAULT_SORT)
+    filters['sort'] = sort if sort in TRANSACTION_SORTS else DEFAULT_SORT
+    return filters
+
+
+def filter_transactions(queryset, filters: dict):
+    """Apply the filters read by ``transaction_filters`` to a transaction queryset"""
+    if filters.get('status'):
+        queryset = queryset.filter(status=filters['status'])
+    if filters.get('search'):
+        # Served by the full-text index rather than icontains scans
+        queryset = search_transactions(queryset, filters['search'])
+    if filters.get('date_from'):
+        queryset = queryset.filter(date__gte=filters['date_from'])
+    if filters.get('date_to'):
+        queryset = queryset.filter(date__lte=filters['date_to'])
+    return queryset
@@ -0,0 +1,226 @@
+"""
+Helpers shared by the bulk ingest paths (transaction and account uploads).
+"""
+import hashlib
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .models import Account, Transaction
+from .versioning import bump_version
+
+
+def resolve_accounts(codes: Iterable[str]) -> Tuple[Dict[str, Account], Set[str]]:
+    """
+    Resolve a set of account codes with a single query.
+
+    :param codes: Account codes as they appear in the uploaded file
+    :return: Tuple of (accounts keyed by code, codes that do not exist)
+    """
+    codes = {str(code).strip() for code in codes if code is not None and str(code).strip()}
+    if not codes:
+        return {}, set()
+
+    accounts = Account.objects.in_bulk(codes)
+    return accounts, codes - accounts.keys()
+
+
+def normalize_description(description: str) -> str:
+    """Lowercase a description and collapse runs of whitespace."""
+    return ' '.join(str(description).lower().split())
+
+
+def transaction_fingerprint(
+    date,
+    amount,
+    description: str,
+    customer_name: Optional[str] = None,
+    account_id: Optional[str] = None,
+    transaction_id: Optional[str] = None
+) -> str:
+    """
+    Build a deterministic content hash for a transaction.
+
+    Two rows from overlapping statement exports hash to the same value, which
+    lets re-uploads skip rows that are already stored. A transaction ID
+    supplied by the bank is part of the hash, so identical payments that the
+    bank tells apart stay separate; only rows without one are matched on
+    content alone.
+    """
+    parts = [
+        date.isoformat(),
+        str(Decimal(str(amount)).quantize(Decimal('0.01'))),
+        normalize_description(description),
+        (customer_name or '').strip().lower(),
+        (account_id or '').strip(),
+    ]
+    if transaction_id:
+        parts.append(str(transaction_id).strip())
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class TransactionDeduplicator:
+    """
+    Per-upload filter that drops transactions whose fingerprint was already
+    seen earlier in the file or is already stored in the database.
+    """
+
+    def __init__(self):
+        self._seen: Set[str] = set()
+
+    def new_only(self, transactions: List[Transaction]) -> List[Transaction]:
+        """Return the transactions of a batch that have not been imported yet."""
+        unseen = {trans.fingerprint for trans in transactions} - self._seen
+        stored = set()
+        if unseen:
+            stored = set(
+                Transaction.objects.filter(fingerprint__in=unseen)
+                .values_list('fingerprint', flat=True)
+            )
+
+        fresh = []
+        for trans in transactions:
+            if trans.fingerprint in self._seen or trans.fingerprint in stored:
+                continue
+            self._seen.add(trans.fingerprint)
+            fresh.append(trans)
+
+        self._seen.update(stored)
+        return fresh
+
+
+def order_accounts_by_level(
+    rows: Dict[str, dict],
+    existing_parents: Set[str]
+) -> Tuple[List[List[str]], Dict[str, str]]:
+    """
+    Group uploaded accounts into levels so every parent is written before
+    its children.
+
+    :param rows: Account rows keyed by account_id, each with a 'parent_account' code or None
+    :param existing_parents: Parent codes outside the file that exist in the database
+    :return: Tuple of (levels of account_ids, errors keyed by account_id)
+    """
+    errors = {}
+    children: Dict[str, List[str]] = {}
+    level = []
+    for account_id, row in rows.items():
+        parent_id = row['parent_account']
+        if parent_id is None or (parent_id not in rows and parent_id in existing_parents):
+            level.append(account_id)
+        elif parent_id in rows:
+            children.setdefault(parent_id, []).append(account_id)
+        else:
+            errors[account_id] = f"Parent account {parent_id} not found for account {account_id}"
+
+    levels = []
+    placed = set()
+    while level:
+        levels.append(level)
+        placed.update(level)
+        level = [child for parent_id in level for child in children.get(parent_id, [])]
+
+    # Anything left is below a missing parent or part of a parent cycle
+    unplaced = [account_id for account_id in rows if account_id not in placed and account_id not in errors]
+    changed = True
+    while changed:
+        changed = False
+        for account_id in unplaced:
+            parent_id = rows[account_id]['parent_account']
+            if account_id not in errors and parent_id in errors:
+                errors[account_id] = f"Parent account {parent_id} could not be loaded for account {account_id}"
+                changed = True
+    for account_id in unplaced:
+        if account_id not in errors:
+            errors[account_id] = f"Circular parent reference for account {account_id}"
+    return levels, errors
+
+
+def upsert_accounts(rows: Iterable[dict], batch_size: int = 1000) -> dict:
+    """
+    Insert or update chart-of-accounts rows in bulk.
+
+    Parent references may point at accounts defined later in the same file;
+    accounts are written level by level with ``bulk_create(update_conflicts=True)``,
+    so the number of queries depends on the depth of the chart, not its size.
+    Materialized paths are computed along the way.
+
+    :param rows: Dicts with account_id, name, account_type and parent_account (code or None)
+    :param batch_size: Maximum number of accounts per INSERT statement
+    :return: Dict with created and updated counts and a list of error messages
+    """
+    accounts: Dict[str, dict] = {}
+    errors = []
+    for row in rows:
+        if row['account_id'] in accounts:
+            errors.append(f"Duplicate account {row['account_id']} in file, keeping the first occurrence")
+            continue
+        accounts[row['account_id']] = row
+
+    external_parents = {
+        row['parent_account'] for row in accounts.values()
+        if row['parent_account'] is not None and row['parent_account'] not in accounts
+    }
+    # Materialized paths of parents outside the file, keyed by account_id
+    paths: Dict[str, str] = {}
+    if external_parents:
+        paths = dict(
+            Account.objects.filter(account_id__in=external_parents).values_list('account_id', 'path')
+        )
+
+    levels, level_errors = order_accounts_by_level(accounts, set(paths))
+    errors.extend(level_errors.values())
+
+    old_paths = dict(
+        Account.objects.filter(account_id__in=accounts.keys()).values_list('account_id', 'path')
+    )
+
+    created = updated = 0
+    rejected = set()
+    for level in levels:
+        new_accounts = []
+        for account_id in level:
+            row = accounts[account_id]
+            parent = row['parent_account']
+            if parent in rejected:
+                rejected.add(account_id)
+                errors.append(f"Account {account_id} skipped because its parent {parent} was rejected")
+                continue
+            parent_path = paths.get(parent)
+            old_path = old_paths.get(account_id)
+            # Moving an account below one of its own descendants would detach
+            # the subtree into a cycle that no path can describe
+            if old_path and parent_path and parent_path.startswith(old_path):
+                rejected.add(account_id)
+                errors.append(f"Account {account_id} cannot be moved below its own descendant {parent}")
+                continue
+            path, depth = Account.build_path(account_id, parent_path)
+            paths[account_id] = path
+            new_accounts.append(Account(
+                account_id=account_id,
+                name=row['name'],
+                account_type=row['account_type'],
+                parent_account_id=row['parent_account'],
+                path=path,
+                depth=depth,
+            ))
+        Account.objects.bulk_create(
+            new_accounts,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['account_id'],
+            update_fields=['name', 'account_type', 'parent_account', 'path', 'depth'],
+        )
+        updated += sum(1 for account in new_accounts if account.account_id in old_paths)
+        created += sum(1 for account in new_accounts if account.account_id not in old_paths)
+
+    # Re-parented accounts drag along descendants that were not in the file;
+    # deepest first, so nested moves are applied before their ancestors'
+    moved = [
+        (old_path, paths[account_id]) for account_id, old_path in old_paths.items()
+        if old_path and account_id in paths and paths[account_id] != old_path
+    ]
+    for old_path, new_path in sorted(moved, key=lambda move: len(move[0]), reverse=True):
+        Account.move_subtree(old_path, new_path)
+
+    bump_version('chart')
+    return {'created': created, 'updated': updated, 'errors': errors}
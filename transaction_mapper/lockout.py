@@ -0,0 +1,91 @@
+"""
+Failed login counting and account lockout.
+
+Every outcome is recorded with conditional ``UPDATE`` statements using
+``F()`` expressions, never a read-modify-save of the user, so concurrent
+attempts cannot lose increments and a login costs a fixed number of queries.
+
+With ``LOGIN_FAILURE_COUNTER = 'cache'`` in settings, failures are counted in
+the cache instead and the database is only written when an account is
+locked, so a credential-stuffing burst, including attempts against
+usernames that do not exist, does not turn into a stream of writes.
+"""
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import User
+
+MAX_FAILED_ATTEMPTS = 5
+# How long cache-counted failures are remembered after the last one
+FAILURE_WINDOW_SECONDS = 60 * 60
+
+
+def client_ip(request) -> Optional[str]:
+    """Client address, taking the first X-Forwarded-For hop when behind a proxy"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def _uses_cache() -> bool:
+    return getattr(settings, 'LOGIN_FAILURE_COUNTER', 'database') == 'cache'
+
+
+def _failure_key(username: str) -> str:
+    return f'login_failures:{username.lower()}'
+
+
+def clear_failed_logins(username: str) -> None:
+    """Forget cache-counted failures, e.g. when a locked account is reactivated"""
+    if _uses_cache():
+        cache.delete(_failure_key(username))
+
+
+def _lock(username: str, attempts=None) -> bool:
+    """Deactivate an account that reached the limit; True if this call locked it"""
+    values = {'is_active': False}
+    if attempts is not None:
+        values['failed_login_attempts'] = attempts
+    queryset = User.objects.filter(username=username, is_active=True)
+    if attempts is None:
+        queryset = queryset.filter(failed_login_attempts__gte=MAX_FAILED_ATTEMPTS)
+    return bool(queryset.update(**values))
+
+
+def record_failed_login(username: str) -> bool:
+    """
+    Count a failed login for a username.
+
+    :return: True if the account was locked by this attempt
+    """
+    if _uses_cache():
+        key = _failure_key(username)
+        cache.add(key, 0, FAILURE_WINDOW_SECONDS)
+        try:
+            attempts = cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.set(key, 1, FAILURE_WINDOW_SECONDS)
+            attempts = 1
+        cache.touch(key, FAILURE_WINDOW_SECONDS)
+        if attempts >= MAX_FAILED_ATTEMPTS and _lock(username, attempts):
+            # The count now lives on the locked user; a stale key would re-lock it on reactivation
+            cache.delete(key)
+            return True
+        return False
+
+    updated = User.objects.filter(username=username).update(failed_login_attempts=F('failed_login_attempts') + 1)
+    return bool(updated) and _lock(username)
+
+
+def record_successful_login(user, ip_address: Optional[str]) -> None:
+    """Reset the failure count and store the login address, writing only if either changed"""
+    clear_failed_logins(user.username)
+    if user.failed_login_attempts or user.last_login_ip != ip_address:
+        User.objects.filter(pk=user.pk).update(failed_login_attempts=0, last_login_ip=ip_address)
+        user.failed_login_attempts = 0
+        user.last_login_ip = ip_address
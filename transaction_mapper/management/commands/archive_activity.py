@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from transaction_mapper.activity_archive import DEFAULT_RETENTION_DAYS, apply_retention, archive_directory
+
+class Command(BaseCommand):
+    help = 'Roll up completed days of user activity and archive months older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=DEFAULT_RETENTION_DAYS,
+                            help='Keep raw activity for at least this many days')
+        parser.add_argument('--archive-dir', default=None,
+                            help='Directory for the monthly segments (default: ACTIVITY_ARCHIVE_DIR)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the months that would be archived without changing anything')
+
+    def handle(self, *args, **options):
+        directory = options['archive_dir'] or archive_directory()
+        result = apply_retention(
+            retention_days=options['retention_days'],
+            directory=directory,
+            dry_run=options['dry_run']
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"Would roll up {result['rolled_up']} daily activity rows")
+        else:
+            self.stdout.write(f"Rolled up {result['rolled_up']} daily activity rows")
+        for month, path, count in result['archived']:
+            if options['dry_run']:
+                self.stdout.write(f"{month:%Y-%m}: would archive {count} activities to {directory}")
+            else:
+                self.stdout.write(f"{month:%Y-%m}: archived {count} activities to {path}")
+        self.stdout.write(self.style.SUCCESS(f"{len(result['archived'])} months archived"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from transaction_mapper.query_plans import check_query_plans
+from transaction_mapper.search import missing_search_triggers
+
+class Command(BaseCommand):
+    help = ('EXPLAIN the hot transaction queries and fail if any of them scans the whole table or sorts '
+            'without an index, or if the full-text search triggers are missing')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=2000,
+                            help='Synthetic transactions to insert before explaining (rolled back afterwards)')
+        parser.add_argument('--show-plans', action='store_true', help='Print every query plan')
+
+    def handle(self, *args, **options):
+        results = check_query_plans(seed=options['seed'])
+
+        failures = []
+        for name, (plan, scans) in results.items():
+            if scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'NO INDEX   {name}'))
+                for line in scans:
+                    self.stdout.write(f'    {line}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'ok         {name}'))
+            if options['show_plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+
+        # Search stays correct only while the triggers keep the FTS index in step
+        missing = missing_search_triggers()
+        for trigger in missing:
+            self.stdout.write(self.style.ERROR(f'MISSING    search trigger {trigger}'))
+        if missing:
+            raise CommandError(f'{len(missing)} full-text search triggers are missing; run migrate to restore them')
+
+        if failures:
+            raise CommandError(f'{len(failures)} of {len(results)} hot queries fall back to a full table scan or a temporary sort')
+        self.stdout.write(self.style.SUCCESS(f'All {len(results)} hot queries use an index'))
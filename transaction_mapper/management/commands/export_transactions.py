@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from transaction_mapper.exporters import DEFAULT_ROW_GROUP_SIZE, export_queryset, write_transactions_parquet
+
+class Command(BaseCommand):
+    help = 'Export transactions to a Parquet file, filtered by date range and status'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the Parquet file to write')
+        parser.add_argument('--date-from', help='First transaction date to include (YYYY-MM-DD)')
+        parser.add_argument('--date-to', help='Last transaction date to include (YYYY-MM-DD)')
+        parser.add_argument('--status', action='append', dest='statuses',
+                            help='Only export this status (repeatable)')
+        parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                            help='Rows per Parquet row group and cursor fetch')
+
+    def handle(self, *args, **options):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise CommandError('pyarrow is required for Parquet export. Install it with: pip install pyarrow')
+
+        queryset = export_queryset(
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            statuses=options['statuses'],
+        )
+        self.stdout.write(f"Exporting transactions to {options['output']}...")
+        count = write_transactions_parquet(queryset, options['output'],
+                                           row_group_size=options['row_group_size'])
+        self.stdout.write(self.style.SUCCESS(f'Exported {count} transactions'))
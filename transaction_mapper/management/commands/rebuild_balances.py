@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from transaction_mapper.rollups import rebuild_balances
+
+class Command(BaseCommand):
+    help = 'Recompute the daily and monthly account balance rollups from the Transaction table'
+
+    def handle(self, *args, **options):
+        daily, monthly = rebuild_balances()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {daily} daily and {monthly} monthly balance rows'))
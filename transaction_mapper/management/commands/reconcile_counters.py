@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from transaction_mapper.counters import reconcile_counters, status_counts
+
+class Command(BaseCommand):
+    help = 'Recompute the per-status transaction counters from the Transaction table'
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters()
+        for status, (stored, actual) in sorted(drift.items()):
+            self.stdout.write(self.style.WARNING(f'{status}: counter was {stored}, actual {actual}'))
+
+        counts = status_counts()
+        if drift:
+            self.stdout.write(self.style.SUCCESS(f"Corrected {len(drift)} counters ({counts['total']} transactions)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Counters are in sync ({counts['total']} transactions)"))
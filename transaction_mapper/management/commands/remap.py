@@ -0,0 +1,60 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from transaction_mapper.models import RemapRun
+from transaction_mapper.remap import (
+    DEFAULT_LEASE_SECONDS, DEFAULT_STATUSES, default_worker_name, run_worker, worker_process
+)
+
+class Command(BaseCommand):
+    help = 'Remap stored transactions in leased batches; rerun with the same name to resume'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Name of the remap run, used to resume it')
+        parser.add_argument('--status', action='append', dest='statuses',
+                            help=f"Remap transactions with this status (repeatable, default: {', '.join(DEFAULT_STATUSES)})")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Transactions per leased batch (new runs only)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of worker processes to start on this machine')
+        parser.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+                            help='Seconds before an unfinished batch can be taken over by another worker')
+        parser.add_argument('--worker-id', help='Worker name recorded on leased batches (default: host:pid)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be at least 1')
+
+        run, created = RemapRun.objects.get_or_create(
+            name=options['name'],
+            defaults={
+                'statuses': options['statuses'] or DEFAULT_STATUSES,
+                'batch_size': options['batch_size'],
+            }
+        )
+        if created:
+            self.stdout.write(f"Starting remap run '{run.name}'...")
+        elif run.finished_at:
+            self.stdout.write(self.style.WARNING(f"Remap run '{run.name}' already finished at {run.finished_at}"))
+            return
+        else:
+            done = run.batches.filter(completed_at__isnull=False).count()
+            self.stdout.write(f"Resuming remap run '{run.name}' after {done} completed batches...")
+
+        lease_seconds = options['lease_seconds']
+        if options['workers'] == 1:
+            results = [run_worker(run.pk, options['worker_id'], lease_seconds)]
+        else:
+            prefix = options['worker_id'] or default_worker_name()
+            # Child processes must open their own database connections
+            connections.close_all()
+            with multiprocessing.get_context('spawn').Pool(options['workers']) as pool:
+                results = pool.starmap(worker_process, [
+                    (run.pk, f'{prefix}/{index}', lease_seconds)
+                    for index in range(options['workers'])
+                ])
+
+        batches = sum(result['batches'] for result in results)
+        mapped = sum(result['mapped'] for result in results)
+        self.stdout.write(self.style.SUCCESS(f'Processed {batches} batches, mapped {mapped} transactions'))
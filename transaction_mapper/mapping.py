@@ -0,0 +1,75 @@
+"""
+Rule-based account matching shared by the map views and batch jobs.
+"""
+from typing import Iterable, Optional, Tuple
+
+from django.utils import timezone
+
+from .models import Account, Transaction
+
+# Fields written when a transaction is mapped, for bulk_update()
+MAPPING_FIELDS = [
+    'debit_account', 'credit_account', 'status', 'confidence_score',
+    'mapped_at', 'mapped_by', 'mapping_notes',
+]
+
+# Matches at or below this confidence are left for manual mapping
+MIN_CONFIDENCE = 0.5
+
+
+class AccountMatcher:
+    """Word-matching account matcher over an in-memory chart of accounts"""
+
+    def __init__(self, accounts: Iterable[Account]):
+        self.candidates = []
+        for account in accounts:
+            name = account.name.lower()
+            self.candidates.append((account, name, name.split()))
+
+    def __bool__(self):
+        return bool(self.candidates)
+
+    def match(self, description: str) -> Tuple[Optional[Account], float]:
+        """
+        Find the account whose name best matches a transaction description.
+
+        :return: Tuple of (best account or None, confidence)
+        """
+        # TODO: Replace with actual AI mapping call
+        desc_lower = description.lower()
+        best_account = None
+        highest_confidence = 0
+
+        for account, name, words in self.candidates:
+            # Simple word matching (replace with actual AI logic)
+            confidence = 0
+            if name in desc_lower:
+                confidence = 0.9
+            elif any(word in desc_lower for word in words):
+                confidence = 0.7
+
+            if confidence > highest_confidence:
+                highest_confidence = confidence
+                best_account = account
+
+        return best_account, highest_confidence
+
+
+def entry_accounts(trans: Transaction, account: Account) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return the (debit, credit) account ids for booking a transaction against
+    the matched account. The other side is the statement's source account.
+    """
+    if trans.transaction_type == 'CREDIT':
+        return trans.account_id, account.account_id
+    return account.account_id, trans.account_id
+
+
+def apply_mapping(trans: Transaction, account: Account, user, confidence: float, notes: str, mapped_at=None):
+    """Set the mapping fields of a transaction in memory, without saving it"""
+    trans.debit_account_id, trans.credit_account_id = entry_accounts(trans, account)
+    trans.mapped_by = user
+    trans.mapped_at = mapped_at or timezone.now()
+    trans.mapping_notes = notes
+    trans.confidence_score = confidence
+    trans.status = 'MAPPED'
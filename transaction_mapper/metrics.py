@@ -0,0 +1,103 @@
+"""
+Aggregates for the dashboard widgets.
+
+``dashboard_metrics`` gathers every widget's numbers in a fixed handful of
+queries: the status mix from the maintained status counters, monthly volume
+from one grouped query over a date range, the most frequent unmapped
+descriptions from one grouped query over pending rows, and the busiest
+accounts from the monthly balance rollups. The result is cached under the
+'transactions' and 'chart' versions, which every write path bumps, so a
+write invalidates it and every other page load is a single cache read.
+"""
+from datetime import date
+from typing import List
+
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .counters import status_counts
+from .models import MonthlyAccountBalance, Transaction
+from .rollups import next_month
+from .versioning import get_version
+
+DASHBOARD_CACHE_TIMEOUT = 24 * 60 * 60
+VOLUME_MONTHS = 12
+TOP_LIMIT = 10
+
+
+def _first_month(today: date) -> date:
+    """First day of the oldest month in the ``VOLUME_MONTHS`` window ending with today's month"""
+    months = today.year * 12 + today.month - 1 - (VOLUME_MONTHS - 1)
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def monthly_volume(first_month: date, end_month: date) -> List[dict]:
+    """Transaction count and amount per month, with empty months filled in"""
+    rows = {
+        row['month']: row
+        for row in Transaction.objects.filter(date__gte=first_month, date__lt=end_month)
+        .order_by()
+        .annotate(month=TruncMonth('date'))
+        .values('month')
+        .annotate(count=Count('pk'), total=Sum('amount'))
+    }
+    volume = []
+    month = first_month
+    while month < end_month:
+        row = rows.get(month, {})
+        volume.append({'month': month, 'count': row.get('count', 0), 'total': row.get('total') or 0})
+        month = next_month(month)
+    return volume
+
+
+def top_unmapped_descriptions(limit: int = TOP_LIMIT) -> List[dict]:
+    """The most frequent descriptions among transactions still waiting to be mapped"""
+    return list(
+        Transaction.objects.filter(status='PENDING')
+        .order_by()
+        .values('description')
+        .annotate(count=Count('pk'), total=Sum('amount'))
+        .order_by('-count', 'description')[:limit]
+    )
+
+
+def top_accounts(first_month: date, limit: int = TOP_LIMIT) -> List[dict]:
+    """Accounts with the largest booked turnover since a month, from the monthly rollups"""
+    return list(
+        MonthlyAccountBalance.objects.filter(month__gte=first_month)
+        .order_by()
+        .values('account_id', 'account__name', 'account__account_type')
+        .annotate(
+            debit=Sum('debit_total'),
+            credit=Sum('credit_total'),
+            entries=Sum('count'),
+            turnover=Sum(F('debit_total') + F('credit_total')),
+        )
+        .order_by('-turnover', 'account_id')[:limit]
+    )
+
+
+def build_dashboard_metrics(today: date) -> dict:
+    first_month = _first_month(today)
+    end_month = next_month(today)
+    counts = status_counts()
+    return {
+        'status_counts': counts,
+        'mapped_share': (counts['MAPPED'] + counts['VERIFIED']) / counts['total'] if counts['total'] else 0,
+        'monthly_volume': monthly_volume(first_month, end_month),
+        'top_unmapped': top_unmapped_descriptions(),
+        'top_accounts': top_accounts(first_month),
+    }
+
+
+def dashboard_metrics() -> dict:
+    """Return the dashboard aggregates, rebuilding them only after transactions or the chart changed"""
+    today = timezone.localdate()
+    key = f"dashboard_metrics:{today:%Y-%m}:t{get_version('transactions')}:c{get_version('chart')}"
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = build_dashboard_metrics(today)
+        cache.set(key, metrics, DASHBOARD_CACHE_TIMEOUT)
+    return metrics
@@ -1,5 +1,5 @@
-from django.utils import timezone
-from .models import UserActivity
+from .activity import get_activity_sink
+from .models import User
 import json
 
 class UserActivityMiddleware:
@@ -17,24 +17,24 @@ class UserActivityMiddleware:
         if hasattr(request, 'user') and request.user.is_authenticated:
             # Track certain activities based on the request
             if request.method in ['POST', 'PUT', 'DELETE']:
-                activity_type = f"{request.method}_{request.resolver_match.url_name}"
+                url_name = request.resolver_match.url_name if request.resolver_match else None
+                activity_type = f"{request.method}_{url_name}"
                 description = {
                     'path': request.path,
                     'method': request.method,
-                    'view': request.resolver_match.url_name
+                    'view': url_name
                 }
-                
-                UserActivity.objects.create(
-                    user=request.user,
-                    activity_type=activity_type,
-                    description=json.dumps(description),
-                    ip_address=self.get_client_ip(request)
+                ip_address = self.get_client_ip(request)
+
+                # Written in batches by a background thread, outside the request
+                get_activity_sink().record(
+                    request.user.pk, activity_type, json.dumps(description), ip_address
                 )
                 
-                # Update last login IP
+                # Update last login IP without a full save and its signals
                 if not request.user.last_login_ip:
-                    request.user.last_login_ip = self.get_client_ip(request)
-                    request.user.save()
+                    User.objects.filter(pk=request.user.pk, last_login_ip__isnull=True).update(last_login_ip=ip_address)
+                    request.user.last_login_ip = ip_address
         
         return response
     
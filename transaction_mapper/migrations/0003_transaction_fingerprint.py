@@ -0,0 +1,62 @@
+import hashlib
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def _fingerprint(date, amount, description, customer_name, account_id):
+    """Content hash as it was when this migration was written; kept frozen here"""
+    parts = [
+        date.isoformat(),
+        str(Decimal(str(amount)).quantize(Decimal('0.01'))),
+        ' '.join(str(description).lower().split()),
+        (customer_name or '').strip().lower(),
+        (account_id or '').strip(),
+    ]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def backfill_fingerprints(apps, schema_editor):
+    Transaction = apps.get_model('transaction_mapper', 'Transaction')
+    seen = set()
+    batch = []
+    queryset = Transaction.objects.filter(fingerprint__isnull=True).order_by('transaction_id')
+    for trans in queryset.iterator(chunk_size=1000):
+        fingerprint = _fingerprint(
+            trans.date, trans.amount, trans.description,
+            trans.customer_name, trans.account_id
+        )
+        # Rows that already duplicate each other keep an empty fingerprint
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        trans.fingerprint = fingerprint
+        batch.append(trans)
+        if len(batch) >= 1000:
+            Transaction.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    if batch:
+        Transaction.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction_mapper', '0002_add_debit_credit_accounts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='fingerprint',
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                null=True,
+                unique=True,
+                help_text='Content hash used to skip rows that were already imported'
+            ),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_account_paths(apps, schema_editor):
+    Account = apps.get_model('transaction_mapper', 'Account')
+    accounts = {account.account_id: account for account in Account.objects.all()}
+    children = {}
+    level = []
+    for account in accounts.values():
+        if account.parent_account_id in accounts:
+            children.setdefault(account.parent_account_id, []).append(account)
+        else:
+            level.append(account)
+
+    depth = 0
+    prefix = {None: '/'}
+    while level:
+        for account in level:
+            account.path = f"{prefix.get(account.parent_account_id, '/')}{account.account_id}/"
+            account.depth = depth
+            prefix[account.account_id] = account.path
+        level = [child for account in level for child in children.get(account.account_id, [])]
+        depth += 1
+
+    Account.objects.bulk_update(accounts.values(), ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction_mapper', '0003_transaction_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeStamp',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_account_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction_mapper', '0004_account_path_changestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemapRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('statuses', models.JSONField(default=list)),
+                ('batch_size', models.PositiveIntegerField(default=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RemapBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_id', models.CharField(max_length=50)),
+                ('last_id', models.CharField(max_length=50)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('leased_until', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('mapped', models.PositiveIntegerField(default=0)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='transaction_mapper.remaprun')),
+            ],
+            options={
+                'ordering': ['run', 'first_id'],
+                'indexes': [models.Index(fields=['run', 'completed_at', 'leased_until'], name='transaction_run_id_8a9563_idx')],
+                'constraints': [models.UniqueConstraint(fields=('run', 'first_id'), name='unique_remap_batch_start')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    Transaction = apps.get_model('transaction_mapper', 'Transaction')
+    TransactionCounter = apps.get_model('transaction_mapper', 'TransactionCounter')
+    counts = Transaction.objects.order_by().values('status').annotate(n=Count('pk')).values_list('status', 'n')
+    TransactionCounter.objects.bulk_create(
+        [TransactionCounter(status=status, count=n) for status, n in counts]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction_mapper', '0006_transaction_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionCounter',
+            fields=[
+                ('status', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction_mapper', '0007_transactioncounter'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_date_31804d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_custome_54a52a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_transac_2155a1_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date', 'time', 'transaction_id'], name='transaction_date_989965_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', 'date', 'time', 'transaction_id'], name='transaction_status_25e89a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', 'confidence_score'], name='transaction_status_1d7f98_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['amount', 'transaction_id'], name='transaction_amount_402d92_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['uploaded_by', 'uploaded_at'], name='transaction_uploade_c3a359_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'date'], name='transaction_account_09dd4e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['debit_account', 'date'], name='transaction_debit_a_983598_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['credit_account', 'date'], name='transaction_credit__d2888d_idx'),
+        ),
+    ]
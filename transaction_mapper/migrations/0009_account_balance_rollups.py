@@ -0,0 +1,87 @@
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_balances(apps, schema_editor):
+    Transaction = apps.get_model('transaction_mapper', 'Transaction')
+    DailyAccountBalance = apps.get_model('transaction_mapper', 'DailyAccountBalance')
+    MonthlyAccountBalance = apps.get_model('transaction_mapper', 'MonthlyAccountBalance')
+
+    daily = defaultdict(lambda: [Decimal('0.00'), Decimal('0.00'), 0])
+    booked = Transaction.objects.filter(status='VERIFIED').order_by()
+    for position, side in enumerate(('debit', 'credit')):
+        rows = (
+            booked.filter(**{f'{side}_account__isnull': False})
+            .values_list(f'{side}_account_id', 'date')
+            .annotate(total=Sum('amount'), entries=Count('pk'))
+        )
+        for account_id, day, total, entries in rows:
+            daily[(account_id, day)][position] += total
+            daily[(account_id, day)][2] += entries
+
+    monthly = defaultdict(lambda: [Decimal('0.00'), Decimal('0.00'), 0])
+    for (account_id, day), (debit, credit, entries) in daily.items():
+        totals = monthly[(account_id, day.replace(day=1))]
+        totals[0] += debit
+        totals[1] += credit
+        totals[2] += entries
+
+    DailyAccountBalance.objects.bulk_create(
+        [
+            DailyAccountBalance(account_id=account_id, date=day, debit_total=debit, credit_total=credit, count=entries)
+            for (account_id, day), (debit, credit, entries) in daily.items()
+        ],
+        batch_size=1000
+    )
+    MonthlyAccountBalance.objects.bulk_create(
+        [
+            MonthlyAccountBalance(account_id=account_id, month=month, debit_total=debit, credit_total=credit, count=entries)
+            for (account_id, month), (debit, credit, entries) in monthly.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction_mapper', '0008_transaction_workload_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAccountBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('count', models.IntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='transaction_mapper.account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'account'], name='daily_balance_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'date'), name='unique_daily_account_balance')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyAccountBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('count', models.IntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_balances', to='transaction_mapper.account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'account'], name='monthly_balance_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'month'), name='unique_monthly_account_balance')],
+            },
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
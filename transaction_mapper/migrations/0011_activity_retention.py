@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction_mapper', '0010_useractivity_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['created_at'], name='user_activity_created_idx'),
+        ),
+        migrations.CreateModel(
+            name='UserActivityDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('activity_type', models.CharField(max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User Activity Daily Totals',
+                'ordering': ['-date', 'activity_type'],
+                'indexes': [
+                    models.Index(fields=['user', 'date'], name='activity_daily_user_idx'),
+                    models.Index(fields=['date'], name='activity_daily_date_idx'),
+                ],
+            },
+        ),
+    ]
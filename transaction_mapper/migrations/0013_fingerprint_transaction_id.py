@@ -0,0 +1,48 @@
+import hashlib
+from decimal import Decimal
+
+from django.db import migrations
+
+
+def _fingerprint(date, amount, description, customer_name, account_id, transaction_id):
+    """Content hash as it was when this migration was written; kept frozen here"""
+    parts = [
+        date.isoformat(),
+        str(Decimal(str(amount)).quantize(Decimal('0.01'))),
+        ' '.join(str(description).lower().split()),
+        (customer_name or '').strip().lower(),
+        (account_id or '').strip(),
+    ]
+    if transaction_id:
+        parts.append(str(transaction_id).strip())
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def refingerprint_supplied_ids(apps, schema_editor):
+    Transaction = apps.get_model('transaction_mapper', 'Transaction')
+    batch = []
+    for trans in Transaction.objects.order_by('transaction_id').iterator(chunk_size=1000):
+        # IDs derived from the content hash stay matched on content alone
+        if trans.fingerprint and trans.transaction_id == trans.fingerprint[:40]:
+            continue
+        trans.fingerprint = _fingerprint(
+            trans.date, trans.amount, trans.description,
+            trans.customer_name, trans.account_id, trans.transaction_id
+        )
+        batch.append(trans)
+        if len(batch) >= 1000:
+            Transaction.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    if batch:
+        Transaction.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction_mapper', '0012_transaction_status_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(refingerprint_supplied_ids, migrations.RunPython.noop),
+    ]
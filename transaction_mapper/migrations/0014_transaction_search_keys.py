@@ -0,0 +1,106 @@
+from django.db import migrations
+
+TABLE = 'transaction_mapper_transaction'
+FTS_TABLE = 'transaction_mapper_transaction_fts'
+KEYS_TABLE = 'transaction_mapper_transaction_fts_keys'
+
+# The external-content index of 0006 pointed at the transaction table's
+# implicit rowid, which VACUUM may renumber. The index now stores its own
+# content under stable integer keys mapped to transaction_id.
+DROP_OLD = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+SQLITE_FORWARD = DROP_OLD + [
+    f"CREATE TABLE {KEYS_TABLE} (id INTEGER PRIMARY KEY, transaction_id TEXT NOT NULL UNIQUE)",
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        transaction_id, description, customer_name,
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {KEYS_TABLE}(transaction_id) VALUES (new.transaction_id);
+        INSERT INTO {FTS_TABLE}(rowid, transaction_id, description, customer_name)
+        VALUES ((SELECT id FROM {KEYS_TABLE} WHERE transaction_id = new.transaction_id),
+                new.transaction_id, new.description, new.customer_name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = (SELECT id FROM {KEYS_TABLE} WHERE transaction_id = old.transaction_id);
+        DELETE FROM {KEYS_TABLE} WHERE transaction_id = old.transaction_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF transaction_id, description, customer_name ON {TABLE} BEGIN
+        UPDATE {KEYS_TABLE} SET transaction_id = new.transaction_id WHERE transaction_id = old.transaction_id;
+        UPDATE {FTS_TABLE}
+        SET transaction_id = new.transaction_id, description = new.description, customer_name = new.customer_name
+        WHERE rowid = (SELECT id FROM {KEYS_TABLE} WHERE transaction_id = new.transaction_id);
+    END
+    """,
+    f"INSERT INTO {KEYS_TABLE}(transaction_id) SELECT transaction_id FROM {TABLE}",
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, transaction_id, description, customer_name)
+    SELECT keys.id, t.transaction_id, t.description, t.customer_name
+    FROM {TABLE} t JOIN {KEYS_TABLE} keys ON keys.transaction_id = t.transaction_id
+    """,
+]
+
+SQLITE_REVERSE = DROP_OLD + [
+    f"DROP TABLE IF EXISTS {KEYS_TABLE}",
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        transaction_id, description, customer_name,
+        content='{TABLE}', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, transaction_id, description, customer_name)
+        VALUES (new.rowid, new.transaction_id, new.description, new.customer_name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, transaction_id, description, customer_name)
+        VALUES ('delete', old.rowid, old.transaction_id, old.description, old.customer_name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF transaction_id, description, customer_name ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, transaction_id, description, customer_name)
+        VALUES ('delete', old.rowid, old.transaction_id, old.description, old.customer_name);
+        INSERT INTO {FTS_TABLE}(rowid, transaction_id, description, customer_name)
+        VALUES (new.rowid, new.transaction_id, new.description, new.customer_name);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction_mapper', '0013_fingerprint_transaction_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD}),
+            _run({'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
@@ -17,6 +19,63 @@ class Role(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Permissions as stored, to sync users only when they were edited
+        # (copied, since callers may edit the list in place)
+        stored = instance.__dict__.get('permissions')
+        instance._synced_permissions = list(stored) if isinstance(stored, list) else stored
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .access import invalidate_all_access
+
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not adding and self.permissions != getattr(self, '_synced_permissions', None):
+                self.sync_user_permissions()
+            self._synced_permissions = list(self.permissions)
+            invalidate_all_access()
+
+    def sync_user_permissions(self):
+        """
+        Make the permissions of every user with this role match the role,
+        with one DELETE and one INSERT ... SELECT on the through table.
+        """
+        through = User.user_permissions.through
+        user_column = through._meta.get_field('user').column
+        permission_column = through._meta.get_field('permission').column
+        wanted = Permission.objects.filter(codename__in=self.permissions).values('pk')
+
+        through.objects.filter(user__role=self).exclude(permission_id__in=wanted).delete()
+        if not self.permissions:
+            return
+
+        quote = connection.ops.quote_name
+        codenames = list(self.permissions)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(through._meta.db_table)} ({quote(user_column)}, {quote(permission_column)}) "
+                f"SELECT u.{quote(User._meta.pk.column)}, p.{quote(Permission._meta.pk.column)} "
+                f"FROM {quote(User._meta.db_table)} u, {quote(Permission._meta.db_table)} p "
+                f"WHERE u.{quote(User._meta.get_field('role').column)} = %s "
+                f"AND p.{quote('codename')} IN ({', '.join(['%s'] * len(codenames))}) "
+                f"AND NOT EXISTS (SELECT 1 FROM {quote(through._meta.db_table)} t "
+                f"WHERE t.{quote(user_column)} = u.{quote(User._meta.pk.column)} "
+                f"AND t.{quote(permission_column)} = p.{quote(Permission._meta.pk.column)})",
+                [self._meta.pk.get_db_prep_value(self.pk, connection), *codenames]
+            )
+
+    def delete(self, *args, **kwargs):
+        from .access import invalidate_all_access
+
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            invalidate_all_access()
+        return result
+
     class Meta:
         verbose_name = _('role')
         verbose_name_plural = _('roles')
@@ -62,32 +121,136 @@ class User(AbstractUser):
         verbose_name = _('user')
         verbose_name_plural = _('users')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Role whose permissions the stored user already has
+        instance._synced_role_id = instance.__dict__.get('role_id')
+        instance._synced_is_active = instance.__dict__.get('is_active')
+        return instance
+
     def save(self, *args, **kwargs):
+        from .access import invalidate_user_access
+        from .lockout import clear_failed_logins
+
+        update_fields = kwargs.get('update_fields')
+        role_changed = (
+            self.role_id != getattr(self, '_synced_role_id', None)
+            and (update_fields is None or 'role' in update_fields or 'role_id' in update_fields)
+        )
+        reactivated = (
+            self.is_active and getattr(self, '_synced_is_active', None) is False
+            and (update_fields is None or 'is_active' in update_fields)
+        )
+        if reactivated:
+            # A reactivated account starts with a clean slate, or its next failure locks it again
+            self.failed_login_attempts = 0
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'failed_login_attempts'}
         super().save(*args, **kwargs)
-        if self.role:
-            self.update_user_permissions()
+        if reactivated:
+            clear_failed_logins(self.username)
+        self._synced_is_active = self.is_active
+        if role_changed:
+            if self.role_id is not None:
+                self.update_user_permissions()
+            self._synced_role_id = self.role_id
+            invalidate_user_access(self)
 
     def update_user_permissions(self):
-        """Update user permissions based on their role"""
+        """Update user permissions based on their role, changing only the difference"""
         if self.role:
-            self.user_permissions.clear()
-            role_permissions = self.role.permissions
-            for perm_codename in role_permissions:
-                try:
-                    perm = Permission.objects.get(codename=perm_codename)
-                    self.user_permissions.add(perm)
-                except Permission.DoesNotExist:
-                    pass
+            wanted = set(Permission.objects.filter(codename__in=self.role.permissions).values_list('pk', flat=True))
+            current = set(self.user_permissions.values_list('pk', flat=True))
+            if current - wanted:
+                self.user_permissions.remove(*(current - wanted))
+            if wanted - current:
+                self.user_permissions.add(*(wanted - current))
 
     def has_module_perms(self, app_label):
         """Check if user has any permissions for the app"""
-        return self.is_active and (self.is_superuser or bool(self.user_permissions.filter(content_type__app_label=app_label).exists()))
+        from .access import get_user_access
+
+        return self.is_active and (self.is_superuser or app_label in get_user_access(self).app_labels)
 
     def has_perm(self, perm, obj=None):
         """Check if user has a specific permission"""
+        from .access import get_user_access
+
         if self.is_active and self.is_superuser:
             return True
-        return self.user_permissions.filter(codename=perm.split('.')[-1]).exists()
+        return perm.split('.')[-1] in get_user_access(self).permissions
+
+# Fields the login path writes; saves limited to them skip the user signals
+LOGIN_FIELDS = frozenset({'last_login', 'last_login_ip', 'failed_login_attempts'})
+
+class UserProfile(models.Model):
+    """Profile details kept alongside each user"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
+    department = models.CharField(max_length=100, blank=True)
+    phone_number = models.CharField(max_length=20, blank=True)
+    timezone = models.CharField(max_length=50, default='UTC')
+    notification_preferences = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"Profile of {self.user.username}"
+
+class UserActivity(models.Model):
+    """Audit log entry of something a user did or that happened to a user"""
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    activity_type = models.CharField(max_length=50)
+    description = models.TextField()
+    ip_address = models.GenericIPAddressField()
+    # Set when the event happens; rows may be written later by the activity sink
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'User Activities'
+        indexes = [
+            models.Index(fields=['created_at'], name='user_activity_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.activity_type} at {self.created_at}"
+
+class UserActivityDaily(models.Model):
+    """Number of activities of one type by one user on one day, kept after the raw rows are archived"""
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='daily_activity')
+    date = models.DateField()
+    activity_type = models.CharField(max_length=50)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date', 'activity_type']
+        verbose_name_plural = 'User Activity Daily Totals'
+        indexes = [
+            models.Index(fields=['user', 'date'], name='activity_daily_user_idx'),
+            models.Index(fields=['date'], name='activity_daily_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.activity_type}: {self.count}"
+
+class ChangeStamp(models.Model):
+    """Version counter for a named dataset, bumped whenever that data is written"""
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+class TransactionCounter(models.Model):
+    """Number of transactions in a status, maintained by every write path"""
+    status = models.CharField(max_length=20, primary_key=True)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.status}: {self.count}"
+
+# Separator of the materialized account paths, e.g. "/1000/1100/1110/"
+ACCOUNT_PATH_SEPARATOR = '/'
 
 class Account(models.Model):
     """Chart of accounts model"""
@@ -95,15 +258,131 @@ class Account(models.Model):
     name = models.CharField(max_length=100)
     account_type = models.CharField(max_length=20)
     parent_account = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='sub_accounts')
+    # Materialized path of account_ids from the root, maintained on save and bulk upsert
+    path = models.CharField(max_length=500, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.account_id} - {self.name}"
 
+    @staticmethod
+    def build_path(account_id, parent_path=None):
+        """Return the (path, depth) of an account below the given parent path"""
+        prefix = parent_path or ACCOUNT_PATH_SEPARATOR
+        return f"{prefix}{account_id}{ACCOUNT_PATH_SEPARATOR}", prefix.count(ACCOUNT_PATH_SEPARATOR) - 1
+
+    @classmethod
+    def move_subtree(cls, old_path, new_path):
+        """Rewrite the paths of every descendant of a moved account in one UPDATE"""
+        depth_delta = new_path.count(ACCOUNT_PATH_SEPARATOR) - old_path.count(ACCOUNT_PATH_SEPARATOR)
+        return cls.objects.filter(path__startswith=old_path).exclude(path=old_path).update(
+            path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+            depth=F('depth') + depth_delta
+        )
+
+    def get_descendants(self, include_self=False):
+        """Return this account's subtree with a single indexed prefix query"""
+        queryset = Account.objects.filter(path__startswith=self.path)
+        return queryset if include_self else queryset.exclude(pk=self.pk)
+
+    def save(self, *args, **kwargs):
+        from .versioning import bump_version
+
+        old_path = self.path
+        parent = self.parent_account
+        if parent is not None and old_path and parent.path.startswith(old_path):
+            raise ValidationError({'parent_account': 'An account cannot be moved below itself'})
+        self.path, self.depth = self.build_path(self.account_id, parent.path if parent else None)
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                self.move_subtree(old_path, self.path)
+            bump_version('chart')
+
+    def delete(self, *args, **kwargs):
+        from .counters import record_transaction_changes, removed, status_breakdown
+        from .rollups import BalanceDeltas
+        from .versioning import bump_version
+
+        with transaction.atomic():
+            # Statement rows of the subtree are deleted with it; unbook them
+            # from the other accounts they were mapped to and uncount them
+            statement_rows = Transaction.objects.filter(account__path__startswith=self.path)
+            balances = BalanceDeltas()
+            balances.add_queryset(statement_rows, -1)
+            balances.apply()
+            record_transaction_changes(removed(status_breakdown(statement_rows)))
+            result = super().delete(*args, **kwargs)
+            bump_version('chart')
+        return result
+
     class Meta:
         ordering = ['account_id']
         verbose_name = _('account')
         verbose_name_plural = _('accounts')
 
+class TransactionQuerySet(models.QuerySet):
+    """Set-based operations for reviewing many transactions at once"""
+
+    def verifiable(self):
+        """Mapped transactions with both entry accounts set"""
+        return self.filter(status='MAPPED', debit_account__isnull=False, credit_account__isnull=False)
+
+    def rejectable(self):
+        """Transactions whose mapping can still be rejected"""
+        return self.exclude(status='REJECTED')
+
+    def update_in_batches(self, batch_size=1000, **values):
+        """
+        Apply an UPDATE to this queryset one primary-key range at a time.
+
+        Each batch re-applies the queryset's filters in its UPDATE, so rows
+        changed by someone else since they were selected are left alone.
+        Status changes are recorded in the status counters and the balance
+        rollups.
+
+        :return: Number of rows updated
+        """
+        from .counters import moved_to, record_transaction_changes, status_breakdown
+        from .rollups import BalanceDeltas
+
+        ordered = self.order_by('pk')
+        updated = 0
+        last_pk = None
+        while True:
+            page = ordered if last_pk is None else ordered.filter(pk__gt=last_pk)
+            ids = list(page.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return updated
+            last_pk = ids[-1]
+            with transaction.atomic():
+                batch = self.filter(pk__in=ids)
+                deltas = moved_to(values['status'], status_breakdown(batch)) if 'status' in values else None
+                # Unbook the batch as it was and book it as it is after the UPDATE
+                balances = BalanceDeltas()
+                balances.add_queryset(Transaction.objects.filter(pk__in=ids), -1)
+                count = batch.update(**values)
+                if count:
+                    balances.add_queryset(Transaction.objects.filter(pk__in=ids))
+                    balances.apply()
+                    record_transaction_changes(deltas)
+                updated += count
+
+    def verify_mappings(self, batch_size=1000):
+        """Verify every verifiable transaction in this queryset"""
+        return self.verifiable().update_in_batches(batch_size, status='VERIFIED')
+
+    def reject_mappings(self, reason='', batch_size=1000):
+        """Reject the mappings of this queryset, clearing their entry accounts"""
+        return self.rejectable().update_in_batches(
+            batch_size,
+            status='REJECTED',
+            mapping_notes=f"Rejected: {reason}",
+            debit_account=None,
+            credit_account=None
+        )
+
 class Transaction(models.Model):
     """Transaction model for financial records"""
     TRANSACTION_TYPES = [
@@ -123,7 +402,25 @@ class Transaction(models.Model):
     time = models.TimeField(null=True, blank=True)
     description = models.TextField()
     customer_name = models.CharField(max_length=100, null=True, blank=True)
+    transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     amount = models.DecimalField(max_digits=15, decimal_places=2)
+
+    # Source account from the uploaded statement
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='transactions'
+    )
+    mapped_account = models.ForeignKey(
+        Account,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='legacy_mapped_transactions',
+        help_text='Legacy field - use debit_account and credit_account instead'
+    )
     
     # Double-entry accounting fields
     debit_account = models.ForeignKey(
@@ -171,14 +468,31 @@ class Transaction(models.Model):
     confidence_score = models.FloatField(default=0.0)
     is_recurring = models.BooleanField(default=False)
     tags = models.JSONField(default=list, null=True, blank=True)
+    fingerprint = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Content hash used to skip rows that were already imported'
+    )
+
+    objects = TransactionQuerySet.as_manager()
         
     class Meta:
         ordering = ['-date', '-time']
+        # Composite indexes for the list filters and keyset sorts, review
+        # queues, uploads per user and per-account ledgers; see check_query_plans
         indexes = [
-            models.Index(fields=['date', 'status']),
-            models.Index(fields=['customer_name']),
-            models.Index(fields=['debit_account']),
-            models.Index(fields=['credit_account']),
+            models.Index(fields=['date', 'time', 'transaction_id']),
+            models.Index(fields=['status', 'date', 'time', 'transaction_id']),
+            models.Index(fields=['status', 'transaction_id']),
+            models.Index(fields=['status', 'confidence_score']),
+            models.Index(fields=['amount', 'transaction_id']),
+            models.Index(fields=['uploaded_by', 'uploaded_at']),
+            models.Index(fields=['account', 'date']),
+            models.Index(fields=['debit_account', 'date']),
+            models.Index(fields=['credit_account', 'date']),
         ]
 
     def clean(self):
@@ -190,8 +504,39 @@ class Transaction(models.Model):
             raise ValidationError({'tags': 'Tags must be a list'})
 
     def save(self, *args, **kwargs):
+        from .counters import moved, record_transaction_changes
+        from .rollups import BOOKED_STATUS, BalanceDeltas
+
         self.full_clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Bulk writes record their own changes; a single save is recorded
+            # here, moving the row from its stored status to the new one
+            stored = Transaction.objects.filter(pk=self.pk)
+            old_status = None
+            if not self._state.adding:
+                old_status = stored.values_list('status', flat=True).first()
+            # A booked row is unbooked as it was stored and booked again as
+            # saved, so changes to its amount, date or accounts reach the rollups
+            balances = BalanceDeltas()
+            if old_status == BOOKED_STATUS:
+                balances.add_queryset(stored, -1)
+            super().save(*args, **kwargs)
+            if self.status == BOOKED_STATUS:
+                balances.add_queryset(stored)
+            balances.apply()
+            record_transaction_changes({self.status: 1} if old_status is None else moved(old_status, self.status))
+
+    def delete(self, *args, **kwargs):
+        from .counters import record_transaction_changes, removed, status_breakdown
+        from .rollups import BalanceDeltas
+
+        with transaction.atomic():
+            stored = Transaction.objects.filter(pk=self.pk)
+            balances = BalanceDeltas()
+            balances.add_queryset(stored, -1)
+            balances.apply()
+            record_transaction_changes(removed(status_breakdown(stored)))
+            return super().delete(*args, **kwargs)
 
     def map_accounts(self, debit_account, credit_account, user, notes='', confidence=1.0):
         """Map transaction to debit and credit accounts"""
@@ -221,3 +566,78 @@ class Transaction(models.Model):
 
     def __str__(self):
         return f"{self.date} - {self.description} ({self.amount})"
+
+class RemapRun(models.Model):
+    """A named remap job over stored transactions, shared by all of its workers"""
+    name = models.CharField(max_length=100, unique=True)
+    statuses = models.JSONField(default=list)
+    batch_size = models.PositiveIntegerField(default=500)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+class RemapBatch(models.Model):
+    """
+    A leased transaction_id range of a remap run. Completed batches are the
+    run's checkpoints; batches whose lease expired can be claimed again.
+    """
+    run = models.ForeignKey(RemapRun, on_delete=models.CASCADE, related_name='batches')
+    first_id = models.CharField(max_length=50)
+    last_id = models.CharField(max_length=50)
+    worker = models.CharField(max_length=100, blank=True)
+    leased_until = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    processed = models.PositiveIntegerField(default=0)
+    mapped = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['run', 'first_id']
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'first_id'], name='unique_remap_batch_start'),
+        ]
+        indexes = [
+            models.Index(fields=['run', 'completed_at', 'leased_until']),
+        ]
+
+    def __str__(self):
+        return f"{self.run.name} [{self.first_id} .. {self.last_id}]"
+
+class DailyAccountBalance(models.Model):
+    """Booked (VERIFIED) debit and credit totals of an account on one day, maintained by rollups.py"""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='daily_balances')
+    date = models.DateField()
+    debit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='unique_daily_account_balance'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'account'], name='daily_balance_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} {self.date}: {self.debit_total} / {self.credit_total}"
+
+class MonthlyAccountBalance(models.Model):
+    """Booked debit and credit totals of an account over a calendar month, keyed by its first day"""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='monthly_balances')
+    month = models.DateField()
+    debit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'month'], name='unique_monthly_account_balance'),
+        ]
+        indexes = [
+            models.Index(fields=['month', 'account'], name='monthly_balance_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} {self.month:%Y-%m}: {self.debit_total} / {self.credit_total}"
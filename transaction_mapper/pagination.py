@@ -0,0 +1,230 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, each page is fetched with a WHERE clause that starts
+right after the sort key of the last row on the previous page, so every
+page costs the same index range scan as the first one. Page links carry
+opaque tokens encoding that sort key rather than page numbers.
+"""
+import base64
+import binascii
+import json
+import operator
+from functools import reduce
+from typing import Optional, Sequence, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import F, Q
+
+# A sort key: (field name, descending, nullable). NULLs sort as the lowest value.
+SortKey = Tuple[str, bool, bool]
+
+# Page sizes are capped so a crafted URL cannot fetch the whole table
+MAX_PAGE_SIZE = 500
+
+# Filtered totals are counted up to this many rows and shown as "N+" beyond it
+DEFAULT_COUNT_LIMIT = 10_000
+
+
+class InvalidCursor(ValueError):
+    """Raised when a page token cannot be decoded for the current sort"""
+
+
+def encode_cursor(sort: str, direction: str, values: Sequence) -> str:
+    """Encode a page position as an opaque, URL-safe token"""
+    payload = json.dumps({'s': sort, 'd': direction, 'v': list(values)}, cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> dict:
+    """Decode a token made by ``encode_cursor``"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Malformed page token: {e}")
+    if not isinstance(payload, dict) or payload.get('d') not in ('next', 'prev') or not isinstance(payload.get('v'), list):
+        raise InvalidCursor("Malformed page token")
+    return payload
+
+
+def _order_expressions(keys: Sequence[SortKey], reverse: bool = False) -> list:
+    expressions = []
+    for name, descending, nullable in keys:
+        descending = descending != reverse
+        if not nullable:
+            expressions.append(f'-{name}' if descending else name)
+        elif descending:
+            expressions.append(F(name).desc(nulls_last=True))
+        else:
+            expressions.append(F(name).asc(nulls_first=True))
+    return expressions
+
+
+def _equal(name: str, value) -> Q:
+    return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+
+def _beyond(name: str, descending: bool, value) -> Optional[Q]:
+    """Rows strictly after ``value`` in the given direction, or None if there are none"""
+    if descending:
+        if value is None:
+            return None
+        return Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+    if value is None:
+        return Q(**{f'{name}__isnull': False})
+    return Q(**{f'{name}__gt': value})
+
+
+def keyset_filter(keys: Sequence[SortKey], values: Sequence, reverse: bool = False) -> Q:
+    """
+    Build the WHERE clause selecting rows after ``values`` in the sort order.
+
+    For keys (a, b, c) this is ``a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)``,
+    with explicit NULL predicates for nullable keys. A redundant ``a >= x``
+    bound is added in front, since planners seek an index on a plain range
+    but not on the OR expression.
+    """
+    branches = []
+    prefix = Q()
+    for (name, descending, nullable), value in zip(keys, values):
+        step = _beyond(name, descending != reverse, value)
+        if step is not None:
+            branches.append(prefix & step)
+        prefix &= _equal(name, value)
+    if not branches:
+        return Q(pk__in=[])
+    condition = reduce(operator.or_, branches)
+
+    name, descending, nullable = keys[0]
+    if not nullable and values[0] is not None:
+        lookup = 'lte' if descending != reverse else 'gte'
+        condition = Q(**{f'{name}__{lookup}': values[0]}) & condition
+    return condition
+
+
+class KeysetPage:
+    """One page of rows with tokens for the neighbouring pages"""
+
+    def __init__(self, rows: list, next_token: Optional[str], previous_token: Optional[str]):
+        self.object_list = rows
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_token is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_token is not None
+
+    @property
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by a fixed sort key.
+
+    :param queryset: Rows to paginate, already filtered
+    :param keys: Sort keys; the last one must be unique (usually the primary key)
+    :param sort: Name of the sort, stored in tokens so they are not reused across sorts
+    :param per_page: Rows per page
+    """
+
+    def __init__(self, queryset, keys: Sequence[SortKey], sort: str, per_page: int = 50):
+        self.queryset = queryset
+        self.keys = list(keys)
+        self.sort = sort
+        self.per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+
+    def ordered(self, reverse: bool = False):
+        """The queryset in page order, or reversed for walking backwards"""
+        return self.queryset.order_by(*_order_expressions(self.keys, reverse))
+
+    def _key_values(self, row) -> list:
+        if isinstance(row, dict):
+            return [row[name] for name, _, _ in self.keys]
+        return [getattr(row, name) for name, _, _ in self.keys]
+
+    def _parse_values(self, values: list) -> list:
+        if len(values) != len(self.keys):
+            raise InvalidCursor("Page token does not match the sort order")
+        model = self.queryset.model
+        try:
+            return [
+                None if value is None else model._meta.get_field(name).to_python(value)
+                for (name, _, _), value in zip(self.keys, values)
+            ]
+        except Exception as e:
+            raise InvalidCursor(f"Invalid page token value: {e}")
+
+    def page(self, token: Optional[str] = None) -> KeysetPage:
+        """
+        Fetch the page addressed by a token, or the first page without one.
+
+        An invalid or stale token (e.g. from another sort) falls back to the first page.
+        """
+        direction, values = 'next', None
+        if token:
+            try:
+                cursor = decode_cursor(token)
+                if cursor.get('s') == self.sort:
+                    direction, values = cursor['d'], self._parse_values(cursor['v'])
+            except InvalidCursor:
+                direction, values = 'next', None
+
+        backwards = direction == 'prev'
+        queryset = self.ordered(reverse=backwards)
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(self.keys, values, reverse=backwards))
+
+        # One extra row tells whether another page follows
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_token = previous_token = None
+        if rows:
+            if more or backwards:
+                next_token = encode_cursor(self.sort, 'next', self._key_values(rows[-1]))
+            if values is not None and (more or not backwards):
+                previous_token = encode_cursor(self.sort, 'prev', self._key_values(rows[0]))
+        return KeysetPage(rows, next_token, previous_token)
+
+
+def approximate_count(queryset, limit: int = DEFAULT_COUNT_LIMIT) -> Tuple[int, bool]:
+    """
+    Count rows without scanning more than ``limit`` of them.
+
+    An unfiltered queryset on PostgreSQL uses the planner's row estimate.
+    Otherwise rows are counted up to ``limit`` + 1.
+
+    :return: Tuple of (count, approximate); approximate is True when the
+        count is an estimate or a lower bound
+    """
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0]), True
+
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, True
+    return count, False
@@ -0,0 +1,112 @@
+"""
+Query plan checks for the hot Transaction queries.
+
+Each entry in ``HOT_QUERIES`` builds a queryset the way the views and batch
+jobs do. ``check_query_plans`` runs every one through the database's
+EXPLAIN and reports the queries that read the whole Transaction table
+instead of an index, or that sort their rows in a temporary B-tree because
+no index matches their ordering, so a dropped or mismatched index shows up
+before it reaches production. Run it with ``manage.py check_query_plans``.
+"""
+import random
+import re
+from datetime import date, time, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List, Tuple
+
+from django.db import connection, transaction
+
+from .filters import TRANSACTION_SORTS
+from .models import Transaction
+from .pagination import KeysetPaginator, keyset_filter
+
+PAGE = 51
+SAMPLE_DATE = date(2024, 6, 15)
+
+
+def _page(sort: str, queryset=None, after: bool = False):
+    keys = TRANSACTION_SORTS[sort]
+    paginator = KeysetPaginator(queryset if queryset is not None else Transaction.objects.all(), keys, sort)
+    ordered = paginator.ordered()
+    if after:
+        values = {'date': SAMPLE_DATE, 'time': time(12, 0), 'transaction_id': 'T-000500', 'amount': Decimal('100.00')}
+        ordered = ordered.filter(keyset_filter(keys, [values[name] for name, _, _ in keys]))
+    return ordered[:PAGE]
+
+
+# (name, queryset builder) for every query the application runs per request or per batch;
+# lookups whose callers do not sort clear the model's default ordering, as those callers do
+HOT_QUERIES: List[Tuple[str, Callable]] = [
+    ('list: newest first', lambda: _page('-date')),
+    ('list: newest first, deep page', lambda: _page('-date', after=True)),
+    ('list: oldest first, deep page', lambda: _page('date', after=True)),
+    ('list: amount, deep page', lambda: _page('-amount', after=True)),
+    ('list: status filter, deep page', lambda: _page('-date', Transaction.objects.filter(status='MAPPED'), after=True)),
+    ('list: date range', lambda: _page('-date', Transaction.objects.filter(
+        date__gte=SAMPLE_DATE - timedelta(days=30), date__lte=SAMPLE_DATE))),
+    ('map all: pending batch', lambda: Transaction.objects.filter(
+        status='PENDING', transaction_id__gt='T-000500').order_by('transaction_id')[:500]),
+    ('review: high-confidence queue', lambda: Transaction.objects.filter(
+        status='MAPPED', confidence_score__gte=0.9).order_by().values_list('pk', flat=True)),
+    ('uploads: by user', lambda: Transaction.objects.filter(uploaded_by_id=1).order_by('-uploaded_at')[:PAGE]),
+    ('ledger: source account', lambda: Transaction.objects.filter(
+        account_id='1000', date__gte=SAMPLE_DATE - timedelta(days=30)).order_by()),
+    ('ledger: debit account', lambda: Transaction.objects.filter(
+        debit_account_id='1000', date__gte=SAMPLE_DATE - timedelta(days=30)).order_by()),
+    ('ledger: credit account', lambda: Transaction.objects.filter(
+        credit_account_id='1000', date__gte=SAMPLE_DATE - timedelta(days=30)).order_by()),
+]
+
+
+def seed_transactions(count: int) -> None:
+    """Insert ``count`` synthetic transactions spread over a year (call inside a rolled back transaction)"""
+    statuses = [code for code, _ in Transaction.STATUS_CHOICES]
+    rng = random.Random(42)
+    rows = [
+        Transaction(
+            transaction_id=f'T-{number:06d}',
+            date=SAMPLE_DATE - timedelta(days=rng.randrange(365)),
+            time=time(rng.randrange(24), rng.randrange(60)) if rng.random() > 0.1 else None,
+            description=f'Seeded transaction {number}',
+            amount=Decimal(rng.randrange(1, 100_000)) / 100,
+            transaction_type=rng.choice(['DEBIT', 'CREDIT']),
+            status=rng.choice(statuses),
+            confidence_score=rng.random(),
+        )
+        for number in range(count)
+    ]
+    Transaction.objects.bulk_create(rows, batch_size=1000)
+
+
+def full_scans(plan: str, table: str) -> List[str]:
+    """Return the plan lines that read ``table`` without an index or sort outside one"""
+    sqlite_scan = re.compile(rf'\bSCAN {re.escape(table)}\b(?!.*\bUSING\b)')
+    sqlite_sort = re.compile(r'\bUSE TEMP B-TREE\b')
+    postgres_scan = re.compile(rf'\bSeq Scan on {re.escape(table)}\b')
+    return [
+        line.strip() for line in plan.splitlines()
+        if sqlite_scan.search(line) or sqlite_sort.search(line) or postgres_scan.search(line)
+    ]
+
+
+def check_query_plans(seed: int = 0) -> Dict[str, Tuple[str, List[str]]]:
+    """
+    Explain every hot query, optionally on a seeded dataset that is rolled back afterwards.
+
+    :return: Mapping of query name to (plan, full scan and temporary sort lines)
+    """
+    table = Transaction._meta.db_table
+    results = {}
+    with transaction.atomic():
+        if seed:
+            seed_transactions(seed)
+        if connection.vendor == 'postgresql':
+            # Small seeded tables make sequential scans look cheap; rule them out
+            # so a remaining Seq Scan means no usable index exists
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, build in HOT_QUERIES:
+            plan = build().explain()
+            results[name] = (plan, full_scans(plan, table))
+        transaction.set_rollback(True)
+    return results
@@ -0,0 +1,184 @@
+"""
+Resumable, multi-worker remapping of stored transactions.
+
+A remap run splits the transaction_id keyspace into batches recorded in
+RemapBatch. Workers, in one process or on several machines sharing the
+database, lease a batch, map its rows with the mapping engine and mark the
+batch completed in the same database transaction. Completed batches are
+checkpoints: a killed run is resumed by starting it again under the same
+name, and batches whose lease expired are picked up by the next worker.
+"""
+import logging
+import os
+import socket
+from collections import Counter
+from datetime import timedelta
+from typing import Optional
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .counters import moved_to, record_transaction_changes
+from .mapping import MAPPING_FIELDS, MIN_CONFIDENCE, AccountMatcher, apply_mapping
+from .models import Account, RemapBatch, RemapRun, Transaction
+from .rollups import BalanceDeltas
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATUSES = ['PENDING', 'MAPPED']
+DEFAULT_LEASE_SECONDS = 300
+CLAIM_ATTEMPTS = 5
+
+
+class LeaseLost(Exception):
+    """Raised when a worker's lease on a batch expired and was claimed by another worker"""
+
+
+def default_worker_name() -> str:
+    """Identify a worker by host and process id"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _reclaim_expired_batch(run: RemapRun, worker: str, lease_until) -> Optional[RemapBatch]:
+    """Take over an unfinished batch whose lease has expired"""
+    now = timezone.now()
+    expired = RemapBatch.objects.filter(run=run, completed_at__isnull=True, leased_until__lt=now)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            batch = expired.select_for_update(skip_locked=True).order_by('first_id').first()
+            if batch is not None:
+                batch.worker = worker
+                batch.leased_until = lease_until
+                batch.save(update_fields=['worker', 'leased_until'])
+            return batch
+
+    # Without row locks, a conditional UPDATE decides which worker wins
+    for batch_id in expired.order_by('first_id').values_list('pk', flat=True)[:CLAIM_ATTEMPTS]:
+        claimed = RemapBatch.objects.filter(
+            pk=batch_id, completed_at__isnull=True, leased_until__lt=now
+        ).update(worker=worker, leased_until=lease_until)
+        if claimed:
+            return RemapBatch.objects.get(pk=batch_id)
+    return None
+
+
+def claim_batch(run: RemapRun, worker: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> Optional[RemapBatch]:
+    """
+    Lease the next batch of a run for a worker.
+
+    Expired leases are reclaimed first; otherwise a new transaction_id range
+    is carved after the highest range claimed so far. Two workers carving
+    the same range collide on the (run, first_id) constraint and the loser
+    retries with the next range.
+
+    :return: The leased batch, or None when the run has nothing left to claim
+    """
+    lease_until = timezone.now() + timedelta(seconds=lease_seconds)
+
+    batch = _reclaim_expired_batch(run, worker, lease_until)
+    if batch is not None:
+        return batch
+
+    for _ in range(CLAIM_ATTEMPTS):
+        last_id = RemapBatch.objects.filter(run=run).aggregate(last=Max('last_id'))['last'] or ''
+        ids = list(
+            Transaction.objects.filter(transaction_id__gt=last_id)
+            .order_by('transaction_id')
+            .values_list('transaction_id', flat=True)[:run.batch_size]
+        )
+        if not ids:
+            return None
+        try:
+            with transaction.atomic():
+                return RemapBatch.objects.create(
+                    run=run, first_id=ids[0], last_id=ids[-1],
+                    worker=worker, leased_until=lease_until
+                )
+        except IntegrityError:
+            continue
+    return None
+
+
+def process_batch(run: RemapRun, batch: RemapBatch, matcher: AccountMatcher, worker: str) -> int:
+    """
+    Remap the transactions of a leased batch and record it as completed.
+
+    Both happen in one database transaction, so a batch is either fully
+    remapped and checkpointed or not at all.
+
+    :return: Number of transactions mapped
+    """
+    with transaction.atomic():
+        queryset = Transaction.objects.filter(
+            transaction_id__gte=batch.first_id, transaction_id__lte=batch.last_id
+        )
+        if run.statuses:
+            queryset = queryset.filter(status__in=run.statuses)
+        if connection.features.has_select_for_update:
+            queryset = queryset.select_for_update()
+        rows = list(queryset)
+
+        mapped_at = timezone.now()
+        mapped = []
+        previous_statuses = Counter()
+        balances = BalanceDeltas()
+        for trans in rows:
+            account, confidence = matcher.match(trans.description)
+            if account and confidence > MIN_CONFIDENCE:
+                previous_statuses[trans.status] += 1
+                # Remapped rows drop back to MAPPED, so verified ones are unbooked
+                balances.add_transaction(trans, -1)
+                apply_mapping(
+                    trans, account, None, confidence,
+                    notes=f'Remapped by run {run.name} (confidence: {confidence:.2f})',
+                    mapped_at=mapped_at
+                )
+                mapped.append(trans)
+        if mapped:
+            Transaction.objects.bulk_update(mapped, MAPPING_FIELDS)
+            balances.apply()
+            record_transaction_changes(moved_to('MAPPED', previous_statuses))
+
+        completed = RemapBatch.objects.filter(
+            pk=batch.pk, worker=worker, completed_at__isnull=True
+        ).update(completed_at=timezone.now(), processed=len(rows), mapped=len(mapped))
+        if not completed:
+            raise LeaseLost(f"Lease on {batch} was taken over by another worker")
+
+    return len(mapped)
+
+
+def run_worker(run_id: int, worker: Optional[str] = None, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> dict:
+    """
+    Claim and process batches of a run until none are left.
+
+    :return: Dict with the number of batches completed and transactions mapped by this worker
+    """
+    run = RemapRun.objects.get(pk=run_id)
+    worker = worker or default_worker_name()
+    matcher = AccountMatcher(Account.objects.all())
+    stats = {'batches': 0, 'mapped': 0}
+
+    while True:
+        batch = claim_batch(run, worker, lease_seconds)
+        if batch is None:
+            break
+        try:
+            stats['mapped'] += process_batch(run, batch, matcher, worker)
+            stats['batches'] += 1
+        except LeaseLost as e:
+            logger.warning(str(e))
+
+    # The last worker to find nothing left closes the run
+    if not RemapBatch.objects.filter(run=run, completed_at__isnull=True).exists():
+        RemapRun.objects.filter(pk=run.pk, finished_at__isnull=True).update(finished_at=timezone.now())
+    return stats
+
+
+def worker_process(run_id: int, worker: str, lease_seconds: int) -> dict:
+    """Entry point of a worker started by the remap command in a child process"""
+    import django
+    django.setup()
+    return run_worker(run_id, worker, lease_seconds)
@@ -0,0 +1,270 @@
+"""
+Financial reports computed in the database.
+
+Only VERIFIED transactions are booked. Each report starts from per-account
+debit and credit totals read from the daily and monthly balance rollups
+(see rollups.py), which stay a few hundred rows per account however many
+transactions the period holds, and rolls them up through the account
+hierarchy using the materialized ``Account.path``.
+
+Results are cached under the report, its parameters and the 'transactions'
+and 'chart' versions, so any write that could change a report makes its
+old cache entries unreachable.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from .models import ACCOUNT_PATH_SEPARATOR, Account, Transaction
+from .rollups import BOOKED_STATUS, account_totals
+from .versioning import get_version
+
+REPORT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Account types, compared upper-cased, whose balance is debit minus credit;
+# every other type is credit-normal
+DEBIT_NORMAL_TYPES = {'ASSET', 'EXPENSE'}
+REVENUE_TYPES = {'REVENUE', 'INCOME'}
+EXPENSE_TYPES = {'EXPENSE'}
+
+ZERO = Decimal('0.00')
+
+
+class InvalidPeriod(ValueError):
+    """Raised for report date parameters that are malformed or out of order"""
+
+
+def report_period(params) -> Tuple[Optional[date], Optional[date]]:
+    """
+    Read an inclusive (date_from, date_to) period from query parameters.
+
+    Either bound may be left out for an open-ended period.
+    """
+    bounds = []
+    for name in ('date_from', 'date_to'):
+        value = params.get(name, '').strip()
+        parsed = None
+        if value:
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                pass
+            if parsed is None:
+                raise InvalidPeriod(f"{name} must be a date in YYYY-MM-DD format")
+        bounds.append(parsed)
+    date_from, date_to = bounds
+    if date_from and date_to and date_from > date_to:
+        raise InvalidPeriod("date_from must not be after date_to")
+    return date_from, date_to
+
+
+def _cached(name: str, params: tuple, build):
+    """Return a cached report, building it if the data or the chart changed since"""
+    key = ':'.join(
+        ['report', name, *(str(param) for param in params),
+         f"t{get_version('transactions')}", f"c{get_version('chart')}"]
+    )
+    result = cache.get(key)
+    if result is None:
+        result = build()
+        cache.set(key, result, REPORT_CACHE_TIMEOUT)
+    return result
+
+
+def booked_transactions(date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """VERIFIED transactions in a period, served by the (status, date, ...) index"""
+    queryset = Transaction.objects.filter(status=BOOKED_STATUS)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    return queryset
+
+
+def account_movements(date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict[str, dict]:
+    """
+    Sum booked amounts per account over a period, from the balance rollups.
+
+    :return: Mapping of account_id to {'debit', 'credit', 'count'}
+    """
+    return account_totals(date_from, date_to)
+
+
+def normal_balance(account_type: str, debit: Decimal, credit: Decimal) -> Decimal:
+    """Balance in the account type's normal direction"""
+    if account_type.strip().upper() in DEBIT_NORMAL_TYPES:
+        return debit - credit
+    return credit - debit
+
+
+def _chart() -> List[dict]:
+    return list(
+        Account.objects.order_by('path').values(
+            'account_id', 'name', 'account_type', 'parent_account_id', 'path', 'depth'
+        )
+    )
+
+
+def _ancestors(path: str) -> List[str]:
+    """Account ids on a materialized path, root first and the account itself last"""
+    return [part for part in path.split(ACCOUNT_PATH_SEPARATOR) if part]
+
+
+def rollup(accounts: List[dict], movements: Dict[str, dict]) -> List[dict]:
+    """
+    Attach own and subtree totals to path-ordered chart rows.
+
+    Every account's movements are added to itself and to each ancestor on its
+    path, so a parent's ``total_*`` columns cover its whole subtree.
+    """
+    totals = defaultdict(lambda: {'debit': ZERO, 'credit': ZERO})
+    for account in accounts:
+        own = movements.get(account['account_id'])
+        if own:
+            for ancestor in _ancestors(account['path']):
+                totals[ancestor]['debit'] += own['debit']
+                totals[ancestor]['credit'] += own['credit']
+
+    rows = []
+    for account in accounts:
+        own = movements.get(account['account_id'], {'debit': ZERO, 'credit': ZERO, 'count': 0})
+        subtree = totals[account['account_id']]
+        rows.append({
+            'account_id': account['account_id'],
+            'name': account['name'],
+            'account_type': account['account_type'],
+            'parent_account_id': account['parent_account_id'],
+            'depth': account['depth'],
+            'debit': own['debit'],
+            'credit': own['credit'],
+            'entries': own['count'],
+            'balance': normal_balance(account['account_type'], own['debit'], own['credit']),
+            'total_debit': subtree['debit'],
+            'total_credit': subtree['credit'],
+            'total_balance': normal_balance(account['account_type'], subtree['debit'], subtree['credit']),
+        })
+    return rows
+
+
+def _build_trial_balance(date_from, date_to) -> dict:
+    rows = rollup(_chart(), account_movements(date_from, date_to))
+
+    by_type = defaultdict(lambda: {'debit': ZERO, 'credit': ZERO})
+    for row in rows:
+        by_type[row['account_type']]['debit'] += row['debit']
+        by_type[row['account_type']]['credit'] += row['credit']
+
+    total_debit = sum((row['debit'] for row in rows), ZERO)
+    total_credit = sum((row['credit'] for row in rows), ZERO)
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        # Only accounts with activity somewhere in their subtree are listed
+        'accounts': [row for row in rows if row['total_debit'] or row['total_credit']],
+        'by_type': {
+            account_type: {**sides, 'balance': normal_balance(account_type, sides['debit'], sides['credit'])}
+            for account_type, sides in sorted(by_type.items())
+        },
+        'total_debit': total_debit,
+        'total_credit': total_credit,
+        'balanced': total_debit == total_credit,
+    }
+
+
+def trial_balance(date_from: Optional[date] = None, date_to: Optional[date] = None) -> dict:
+    """
+    Debit and credit totals of every account with activity in a period.
+
+    :return: Dict with per-account rows in chart order, totals per account type
+        and grand totals
+    """
+    return _cached('trial_balance', (date_from, date_to), lambda: _build_trial_balance(date_from, date_to))
+
+
+def _statement_section(rows: List[dict], types: set) -> Tuple[List[dict], Decimal]:
+    section = [row for row in rows if row['account_type'].strip().upper() in types]
+    # Own balances add up to the section total; subtree totals would count parents twice
+    total = sum((row['balance'] for row in section), ZERO)
+    return [row for row in section if row['total_debit'] or row['total_credit']], total
+
+
+def _build_income_statement(date_from, date_to) -> dict:
+    rows = rollup(_chart(), account_movements(date_from, date_to))
+    revenue, total_revenue = _statement_section(rows, REVENUE_TYPES)
+    expenses, total_expenses = _statement_section(rows, EXPENSE_TYPES)
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'revenue': revenue,
+        'expenses': expenses,
+        'total_revenue': total_revenue,
+        'total_expenses': total_expenses,
+        'net_income': total_revenue - total_expenses,
+    }
+
+
+def income_statement(date_from: Optional[date] = None, date_to: Optional[date] = None) -> dict:
+    """
+    Revenue and expense accounts over a period, with subtree totals and net income.
+    """
+    return _cached('income_statement', (date_from, date_to), lambda: _build_income_statement(date_from, date_to))
+
+
+def _subtree_ids(account: Account) -> List[str]:
+    return list(account.get_descendants(include_self=True).values_list('account_id', flat=True))
+
+
+def ledger_entries(account_ids: List[str], date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """Booked transactions touching any of the accounts, served by the (side account, date) indexes"""
+    return booked_transactions(date_from, date_to).filter(
+        Q(debit_account_id__in=account_ids) | Q(credit_account_id__in=account_ids)
+    )
+
+
+def _summed(totals: Dict[str, dict]) -> Tuple[Decimal, Decimal]:
+    return (
+        sum((sides['debit'] for sides in totals.values()), ZERO),
+        sum((sides['credit'] for sides in totals.values()), ZERO),
+    )
+
+
+def _build_ledger_summary(account: Account, account_ids: List[str], date_from, date_to) -> dict:
+    opening_debit = opening_credit = ZERO
+    if date_from:
+        opening_debit, opening_credit = _summed(
+            account_totals(date_to=date_from - timedelta(days=1), account_ids=account_ids)
+        )
+    debit, credit = _summed(account_totals(date_from, date_to, account_ids=account_ids))
+
+    opening = normal_balance(account.account_type, opening_debit, opening_credit)
+    movement = normal_balance(account.account_type, debit, credit)
+    return {
+        'account_id': account.account_id,
+        'name': account.name,
+        'account_type': account.account_type,
+        'date_from': date_from,
+        'date_to': date_to,
+        'opening_balance': opening,
+        'debit': debit,
+        'credit': credit,
+        'closing_balance': opening + movement,
+    }
+
+
+def account_ledger(account: Account, date_from: Optional[date] = None, date_to: Optional[date] = None) -> dict:
+    """
+    Opening balance, period movements and closing balance of an account and its sub-accounts.
+
+    The entries themselves are paged separately with ``ledger_entries``.
+    """
+    account_ids = _subtree_ids(account)
+    summary = _cached(
+        'ledger', (account.account_id, date_from, date_to),
+        lambda: _build_ledger_summary(account, account_ids, date_from, date_to)
+    )
+    return {**summary, 'account_ids': account_ids}
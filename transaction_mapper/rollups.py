@@ -0,0 +1,247 @@
+"""
+Per-account balance rollups of booked (VERIFIED) transactions.
+
+DailyAccountBalance holds each account's debit and credit totals per day and
+MonthlyAccountBalance the same per calendar month. Every write path that
+moves a transaction into or out of VERIFIED, changes the accounts of a
+verified transaction or deletes one collects the change in a
+``BalanceDeltas`` and applies it in the same database transaction.
+
+Period totals read whole months from the monthly table and only the
+partial months at either end of the period from the daily table, so a
+balance as of any date touches one row per account and month plus at most
+a month of daily rows, however many transactions there are.
+``rebuild_balances`` recomputes both tables from the transactions, for
+backfills and after raw SQL fix-ups.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import DailyAccountBalance, MonthlyAccountBalance, Transaction
+
+BOOKED_STATUS = 'VERIFIED'
+ZERO = Decimal('0.00')
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+class BalanceDeltas:
+    """Signed changes to the daily and monthly balances, collected before being applied in bulk"""
+
+    def __init__(self):
+        # [debit, credit, entries] per (account_id, day)
+        self.daily: Dict[Tuple[str, date], list] = defaultdict(lambda: [ZERO, ZERO, 0])
+
+    def __bool__(self):
+        return any(entries or debit or credit for debit, credit, entries in self.daily.values())
+
+    def add_entry(self, account_id: Optional[str], day: date, debit=ZERO, credit=ZERO, entries=0, sign: int = 1):
+        if account_id is None:
+            return
+        totals = self.daily[(account_id, day)]
+        totals[0] += sign * debit
+        totals[1] += sign * credit
+        totals[2] += sign * entries
+
+    def add_transaction(self, trans: Transaction, sign: int = 1):
+        """Book (sign=1) or unbook (sign=-1) an in-memory transaction if it is VERIFIED"""
+        if trans.status != BOOKED_STATUS:
+            return
+        self.add_entry(trans.debit_account_id, trans.date, debit=trans.amount, entries=1, sign=sign)
+        self.add_entry(trans.credit_account_id, trans.date, credit=trans.amount, entries=1, sign=sign)
+
+    def add_queryset(self, queryset, sign: int = 1):
+        """Book or unbook the VERIFIED rows of a queryset as stored, with one grouped query per side"""
+        booked = queryset.filter(status=BOOKED_STATUS).order_by()
+        for side in ('debit', 'credit'):
+            rows = (
+                booked.filter(**{f'{side}_account__isnull': False})
+                .values_list(f'{side}_account_id', 'date')
+                .annotate(total=Sum('amount'), entries=Count('pk'))
+            )
+            for account_id, day, total, entries in rows:
+                self.add_entry(account_id, day, entries=entries, sign=sign, **{side: total})
+
+    def monthly(self) -> Dict[Tuple[str, date], list]:
+        months = defaultdict(lambda: [ZERO, ZERO, 0])
+        for (account_id, day), (debit, credit, entries) in self.daily.items():
+            totals = months[(account_id, month_start(day))]
+            totals[0] += debit
+            totals[1] += credit
+            totals[2] += entries
+        return months
+
+    def apply(self) -> None:
+        """Add the deltas to both rollup tables; call inside the writer's transaction"""
+        if not self:
+            return
+        _upsert(DailyAccountBalance, 'date', self.daily)
+        _upsert(MonthlyAccountBalance, 'month', self.monthly())
+        self.daily.clear()
+
+
+def _upsert(model, period_column: str, deltas: Dict[Tuple[str, date], list]) -> None:
+    """
+    Add deltas to rollup rows with one multi-row INSERT ... ON CONFLICT per call.
+
+    Rows are incremented in place, so concurrent writers never overwrite each
+    other's totals; rows left without entries are removed.
+    """
+    rows = [
+        (account_id, period, debit, credit, entries)
+        for (account_id, period), (debit, credit, entries) in deltas.items()
+        if entries or debit or credit
+    ]
+    if not rows:
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    period_column = connection.ops.quote_name(period_column)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (account_id, {period_column}, debit_total, credit_total, count) "
+            f"VALUES (%s, %s, %s, %s, %s) "
+            f"ON CONFLICT (account_id, {period_column}) DO UPDATE SET "
+            f"debit_total = {table}.debit_total + excluded.debit_total, "
+            f"credit_total = {table}.credit_total + excluded.credit_total, "
+            f"count = {table}.count + excluded.count",
+            rows
+        )
+        cursor.executemany(
+            f"DELETE FROM {table} WHERE account_id = %s AND {period_column} = %s AND count = 0",
+            [(account_id, period) for account_id, period, _, _, _ in rows]
+        )
+
+
+def split_period(date_from: Optional[date], date_to: Optional[date]):
+    """
+    Split an inclusive period into partial months read from the daily table
+    and a run of whole months read from the monthly table.
+
+    :return: Tuple of (list of inclusive (first, last) day ranges,
+        (first month or None, end month exclusive or None) or None)
+    """
+    first_month = date_from if date_from is None or date_from.day == 1 else next_month(date_from)
+    if date_to is None:
+        end_month = None
+    elif (date_to + timedelta(days=1)).day == 1:
+        end_month = next_month(date_to)
+    else:
+        end_month = month_start(date_to)
+
+    if first_month is not None and end_month is not None and first_month >= end_month:
+        return [(date_from, date_to)], None
+
+    day_ranges = []
+    if date_from is not None and first_month != date_from:
+        day_ranges.append((date_from, first_month - timedelta(days=1)))
+    if date_to is not None and end_month <= date_to:
+        day_ranges.append((end_month, date_to))
+    return day_ranges, (first_month, end_month)
+
+
+def account_totals(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    account_ids: Optional[Iterable[str]] = None
+) -> Dict[str, dict]:
+    """
+    Booked debit and credit totals per account over an inclusive period.
+
+    :param account_ids: Restrict the totals to these accounts
+    :return: Mapping of account_id to {'debit', 'credit', 'count'}
+    """
+    day_ranges, months = split_period(date_from, date_to)
+    daily = DailyAccountBalance.objects.order_by()
+    monthly = MonthlyAccountBalance.objects.order_by()
+    if account_ids is not None:
+        account_ids = list(account_ids)
+        daily = daily.filter(account_id__in=account_ids)
+        monthly = monthly.filter(account_id__in=account_ids)
+
+    parts = []
+    if day_ranges:
+        in_ranges = Q()
+        for first, last in day_ranges:
+            in_ranges |= Q(date__gte=first, date__lte=last)
+        parts.append(daily.filter(in_ranges))
+    if months is not None:
+        first_month, end_month = months
+        if first_month is not None:
+            monthly = monthly.filter(month__gte=first_month)
+        if end_month is not None:
+            monthly = monthly.filter(month__lt=end_month)
+        parts.append(monthly)
+
+    totals = defaultdict(lambda: {'debit': ZERO, 'credit': ZERO, 'count': 0})
+    for part in parts:
+        rows = part.values_list('account_id').annotate(
+            debit=Sum('debit_total'), credit=Sum('credit_total'), entries=Sum('count')
+        )
+        for account_id, debit, credit, entries in rows:
+            totals[account_id]['debit'] += debit or ZERO
+            totals[account_id]['credit'] += credit or ZERO
+            totals[account_id]['count'] += entries or 0
+    return dict(totals)
+
+
+def rebuild_balances() -> Tuple[int, int]:
+    """
+    Recompute the daily and monthly rollups from the Transaction table.
+
+    The daily table is rebuilt with a single INSERT ... SELECT and the
+    monthly table from the daily one, all in one database transaction.
+
+    :return: Number of (daily, monthly) rows written
+    """
+    quote = connection.ops.quote_name
+    transactions = quote(Transaction._meta.db_table)
+    daily_table = quote(DailyAccountBalance._meta.db_table)
+
+    with transaction.atomic():
+        DailyAccountBalance.objects.all().delete()
+        MonthlyAccountBalance.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {daily_table} (account_id, date, debit_total, credit_total, count) "
+                f"SELECT account_id, date, SUM(debit_total), SUM(credit_total), SUM(entries) FROM ("
+                f"  SELECT debit_account_id AS account_id, date, SUM(amount) AS debit_total, "
+                f"         0 AS credit_total, COUNT(*) AS entries "
+                f"  FROM {transactions} WHERE status = %s AND debit_account_id IS NOT NULL "
+                f"  GROUP BY debit_account_id, date "
+                f"  UNION ALL "
+                f"  SELECT credit_account_id, date, 0, SUM(amount), COUNT(*) "
+                f"  FROM {transactions} WHERE status = %s AND credit_account_id IS NOT NULL "
+                f"  GROUP BY credit_account_id, date"
+                f") entries GROUP BY account_id, date",
+                [BOOKED_STATUS, BOOKED_STATUS]
+            )
+            daily_rows = cursor.rowcount
+
+        months = (
+            DailyAccountBalance.objects.order_by()
+            .annotate(month=TruncMonth('date'))
+            .values_list('account_id', 'month')
+            .annotate(debit=Sum('debit_total'), credit=Sum('credit_total'), entries=Sum('count'))
+        )
+        monthly_rows = MonthlyAccountBalance.objects.bulk_create(
+            [
+                MonthlyAccountBalance(
+                    account_id=account_id, month=month, debit_total=debit, credit_total=credit, count=entries
+                )
+                for account_id, month, debit, credit, entries in months.iterator()
+            ],
+            batch_size=1000
+        )
+    return daily_rows, len(monthly_rows)
@@ -0,0 +1,199 @@
+"""
+Full-text search over transaction ids, descriptions and customer names.
+
+The index lives in the database and is maintained by the database itself,
+so bulk inserts, queryset updates and deletes keep it in sync:
+
+- SQLite: an FTS5 table kept current by triggers. It stores its own copy
+  of the searched columns under integer keys from a mapping table, not
+  under the transaction table's implicit rowid, which VACUUM may renumber.
+- PostgreSQL: a stored generated ``tsvector`` column with a GIN index
+
+Both are created by migrations 0006 and 0014. Other backends fall back to
+``icontains`` scans.
+
+A migration that makes SQLite rebuild the transaction table (most
+AlterField and index changes) drops its triggers along with the old table.
+``ensure_search_triggers`` runs after every ``migrate`` to put the triggers
+back and rebuild the index.
+"""
+import re
+from typing import List, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Transaction
+
+FTS_TABLE = 'transaction_mapper_transaction_fts'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+
+FTS_KEYS_TABLE = 'transaction_mapper_transaction_fts_keys'
+
+# Triggers that keep the SQLite FTS5 table in step with the transaction table
+FTS_TRIGGERS = {
+    f'{FTS_TABLE}_ai': """
+        CREATE TRIGGER IF NOT EXISTS {trigger} AFTER INSERT ON {table} BEGIN
+            INSERT INTO {keys}(transaction_id) VALUES (new.transaction_id);
+            INSERT INTO {fts}(rowid, transaction_id, description, customer_name)
+            VALUES ((SELECT id FROM {keys} WHERE transaction_id = new.transaction_id),
+                    new.transaction_id, new.description, new.customer_name);
+        END
+    """,
+    f'{FTS_TABLE}_ad': """
+        CREATE TRIGGER IF NOT EXISTS {trigger} AFTER DELETE ON {table} BEGIN
+            DELETE FROM {fts} WHERE rowid = (SELECT id FROM {keys} WHERE transaction_id = old.transaction_id);
+            DELETE FROM {keys} WHERE transaction_id = old.transaction_id;
+        END
+    """,
+    f'{FTS_TABLE}_au': """
+        CREATE TRIGGER IF NOT EXISTS {trigger}
+        AFTER UPDATE OF transaction_id, description, customer_name ON {table} BEGIN
+            UPDATE {keys} SET transaction_id = new.transaction_id WHERE transaction_id = old.transaction_id;
+            UPDATE {fts}
+            SET transaction_id = new.transaction_id, description = new.description, customer_name = new.customer_name
+            WHERE rowid = (SELECT id FROM {keys} WHERE transaction_id = new.transaction_id);
+        END
+    """,
+}
+
+# Upper bound on ranked results returned by the search API
+MAX_SEARCH_RESULTS = 50
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(text: str) -> List[str]:
+    """Split a search string into lowercase word tokens"""
+    return [token.lower() for token in _TOKEN_RE.findall(text or '')]
+
+
+def fts5_query(terms: List[str]) -> str:
+    """Build an FTS5 MATCH expression requiring every term as a prefix"""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def tsquery(terms: List[str]) -> str:
+    """Build a PostgreSQL tsquery requiring every term as a prefix"""
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def search_transactions(queryset, text: str):
+    """
+    Narrow a transaction queryset to rows matching every word of ``text``
+    as a prefix of a word in the id, description or customer name.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+
+    if connection.vendor == 'sqlite':
+        matches = RawSQL(f"SELECT transaction_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts5_query(terms)])
+        return queryset.filter(transaction_id__in=matches)
+
+    if connection.vendor == 'postgresql':
+        table = Transaction._meta.db_table
+        matches = RawSQL(
+            f"SELECT transaction_id FROM {table} WHERE {SEARCH_VECTOR_COLUMN} @@ to_tsquery('simple', %s)",
+            [tsquery(terms)]
+        )
+        return queryset.filter(transaction_id__in=matches)
+
+    for term in terms:
+        queryset = queryset.filter(
+            Q(description__icontains=term) |
+            Q(customer_name__icontains=term) |
+            Q(transaction_id__icontains=term)
+        )
+    return queryset
+
+
+def ranked_transaction_ids(text: str, limit: int = MAX_SEARCH_RESULTS) -> List[Tuple[str, float]]:
+    """
+    Return the best matching transaction ids with their relevance, best first.
+
+    Matches in the transaction id weigh most, then the customer name, then
+    the description.
+
+    :return: List of (transaction_id, score); higher scores are better
+    """
+    terms = search_terms(text)
+    if not terms:
+        return []
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # bm25() is lower for better matches; columns: id, description, customer name
+            cursor.execute(
+                f"SELECT transaction_id, -bm25({FTS_TABLE}, 10.0, 1.0, 5.0) AS score "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY score DESC LIMIT %s",
+                [fts5_query(terms), limit]
+            )
+            return [(row[0], row[1]) for row in cursor.fetchall()]
+
+        if connection.vendor == 'postgresql':
+            table = Transaction._meta.db_table
+            cursor.execute(
+                f"SELECT transaction_id, ts_rank({SEARCH_VECTOR_COLUMN}, query) AS score "
+                f"FROM {table}, to_tsquery('simple', %s) AS query "
+                f"WHERE {SEARCH_VECTOR_COLUMN} @@ query ORDER BY score DESC LIMIT %s",
+                [tsquery(terms), limit]
+            )
+            return [(row[0], row[1]) for row in cursor.fetchall()]
+
+    ids = search_transactions(Transaction.objects.all(), text).values_list('transaction_id', flat=True)[:limit]
+    return [(transaction_id, 1.0) for transaction_id in ids]
+
+
+def _sqlite_objects(cursor, object_type: str, names) -> set:
+    names = list(names)
+    cursor.execute(
+        f"SELECT name FROM sqlite_master WHERE type = %s AND name IN ({', '.join(['%s'] * len(names))})",
+        [object_type, *names]
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def missing_search_triggers(db=connection) -> List[str]:
+    """Names of the SQLite full-text triggers that do not exist (always empty on other backends)"""
+    if db.vendor != 'sqlite':
+        return []
+    with db.cursor() as cursor:
+        # Before migration 0014 the index has a different shape; leave it to the migrations
+        if len(_sqlite_objects(cursor, 'table', [FTS_TABLE, FTS_KEYS_TABLE])) < 2:
+            return []
+        return sorted(set(FTS_TRIGGERS) - _sqlite_objects(cursor, 'trigger', FTS_TRIGGERS))
+
+
+def ensure_search_triggers(db=connection) -> List[str]:
+    """
+    Re-create missing SQLite full-text triggers and rebuild the index if any were missing.
+
+    :return: Names of the triggers that were re-created
+    """
+    missing = missing_search_triggers(db)
+    if not missing:
+        return []
+    table = Transaction._meta.db_table
+    with transaction.atomic(using=db.alias), db.cursor() as cursor:
+        for trigger in missing:
+            cursor.execute(FTS_TRIGGERS[trigger].format(
+                trigger=trigger, table=table, fts=FTS_TABLE, keys=FTS_KEYS_TABLE
+            ))
+        # Writes made without the triggers are only picked up by a full rebuild
+        rebuild_search_index(cursor)
+    return missing
+
+
+def rebuild_search_index(cursor) -> None:
+    """Refill the SQLite FTS5 table and its key mapping from the transaction table"""
+    table = Transaction._meta.db_table
+    cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    cursor.execute(f"DELETE FROM {FTS_KEYS_TABLE}")
+    cursor.execute(f"INSERT INTO {FTS_KEYS_TABLE}(transaction_id) SELECT transaction_id FROM {table}")
+    cursor.execute(
+        f"INSERT INTO {FTS_TABLE}(rowid, transaction_id, description, customer_name) "
+        f"SELECT keys.id, t.transaction_id, t.description, t.customer_name "
+        f"FROM {table} t JOIN {FTS_KEYS_TABLE} keys ON keys.transaction_id = t.transaction_id"
+    )
@@ -1,6 +1,13 @@
-from django.db.models.signals import post_save, post_delete
+import logging
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import m2m_changed, post_migrate, post_save, post_delete
 from django.dispatch import receiver
-from .models import User, UserProfile, UserActivity
+from .models import LOGIN_FIELDS, User, UserProfile, UserActivity
+from .access import invalidate_user_access
+from .search import ensure_search_triggers
+
+logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -8,14 +15,22 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
+def _login_only(update_fields):
+    """True for saves that only record a login, which need no profile save or audit entry"""
+    return bool(update_fields) and set(update_fields) <= LOGIN_FIELDS
+
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
     """Save UserProfile when User is saved"""
+    if _login_only(update_fields):
+        return
     instance.profile.save()
 
 @receiver([post_save, post_delete], sender=User)
-def log_user_changes(sender, instance, created=None, **kwargs):
+def log_user_changes(sender, instance, created=None, update_fields=None, **kwargs):
     """Log user creation and deletion"""
+    if _login_only(update_fields):
+        return
     if created:
         activity_type = 'USER_CREATED'
         description = f'User {instance.username} was created'
@@ -33,3 +48,18 @@ def log_user_changes(sender, instance, created=None, **kwargs):
         description=description,
         ip_address='system'  # System-generated event
     )
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_permission_cache(sender, instance, action, **kwargs):
+    """Drop a user's cached permissions when they are edited directly, e.g. in the admin"""
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, User):
+        invalidate_user_access(instance)
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Put back the SQLite full-text triggers if a migration rebuilt the transaction table"""
+    if sender.name != 'transaction_mapper':
+        return
+    restored = ensure_search_triggers(connections[using])
+    if restored:
+        logger.warning(f"Re-created full-text search triggers {', '.join(restored)} and rebuilt the index")
@@ -0,0 +1,95 @@
+"""
+Newline-delimited JSON progress streams for long-running batch requests.
+
+Batch loops in the views are written as generators that yield after every
+batch. ``ndjson_response`` sends each progress event to the browser as soon
+as it is produced, so the page can update live and proxies see traffic
+during multi-minute jobs; without streaming, the view simply exhausts the
+generator and returns the final summary as one JSON response.
+"""
+import json
+import logging
+import time
+from collections import Counter
+from typing import Callable, Iterable, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def wants_stream(request) -> bool:
+    """Return True when the client asked for a progress stream with ``stream=true``"""
+    return 'true' in (request.POST.get('stream'), request.GET.get('stream'))
+
+
+class BatchProgress:
+    """Running totals of a batch job, reported after every batch"""
+
+    def __init__(self, max_error_details: int = 10):
+        self.started = time.monotonic()
+        self.batches = 0
+        self.processed = 0
+        self.errors = 0
+        self.error_details = []
+        self.max_error_details = max_error_details
+        self.counts = Counter()
+
+    def add_error(self, detail: dict, count: int = 1):
+        """Count failed rows, keeping details of the first few only"""
+        self.errors += count
+        if len(self.error_details) < self.max_error_details:
+            self.error_details.append(detail)
+
+    @property
+    def rate(self) -> float:
+        """Rows processed per second so far"""
+        elapsed = time.monotonic() - self.started
+        return round(self.processed / elapsed, 1) if elapsed > 0 else 0.0
+
+    def batch_done(self, processed: int) -> dict:
+        """Record a finished batch and return its progress event"""
+        self.batches += 1
+        self.processed += processed
+        return {
+            'type': 'progress',
+            'batch': self.batches,
+            'processed': self.processed,
+            'errors': self.errors,
+            'rate': self.rate,
+            **self.counts,
+        }
+
+
+def _encode(event: dict) -> str:
+    return json.dumps(event, cls=DjangoJSONEncoder) + '\n'
+
+
+def _ndjson_lines(events: Iterable[dict], summary: Optional[Callable[[], dict]]):
+    try:
+        for event in events:
+            yield _encode(event)
+        if summary is not None:
+            yield _encode({'type': 'complete', **summary()})
+    except Exception as e:
+        # The status line is already sent, so failures are reported in-band
+        logger.error(f"Error while streaming progress: {str(e)}")
+        yield _encode({'type': 'error', 'error': str(e)})
+
+
+def ndjson_response(events: Iterable[dict], summary: Optional[Callable[[], dict]] = None) -> StreamingHttpResponse:
+    """
+    Stream progress events as newline-delimited JSON.
+
+    :param events: Iterable of event dicts, consumed while the response is sent
+    :param summary: Called after the last event; its result is sent as the
+        final ``complete`` event
+    """
+    response = StreamingHttpResponse(_ndjson_lines(events, summary), content_type=NDJSON_CONTENT_TYPE)
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream until the job finishes
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,643 @@
+import tempfile
+from datetime import date, datetime, time, timedelta
+from time import monotonic, sleep
+from decimal import Decimal
+
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .activity import ActivitySink
+from .activity_archive import apply_retention, pending_rollup_days, rollup_grace
+from .counters import reconcile_counters, status_counts
+from .decorators import role_required
+from .exporters import escape_formula, export_queryset, stream_transactions_csv
+from .filters import TRANSACTION_SORTS
+from .ingest import TransactionDeduplicator, order_accounts_by_level, transaction_fingerprint, upsert_accounts
+from .lockout import MAX_FAILED_ATTEMPTS, record_failed_login
+from .models import Account, DailyAccountBalance, MonthlyAccountBalance, RemapRun, Role, Transaction, User, UserActivity, UserActivityDaily
+from .pagination import InvalidCursor, KeysetPaginator, decode_cursor, encode_cursor, keyset_filter
+from .remap import run_worker
+from .rollups import BOOKED_STATUS, account_totals, rebuild_balances, split_period
+from .search import ensure_search_triggers, search_transactions
+from .versioning import get_version
+
+
+class SplitPeriodTests(TestCase):
+    def test_open_ended_period_reads_every_month(self):
+        self.assertEqual(split_period(None, None), ([], (None, None)))
+
+    def test_open_start(self):
+        self.assertEqual(
+            split_period(None, date(2024, 3, 10)),
+            ([(date(2024, 3, 1), date(2024, 3, 10))], (None, date(2024, 3, 1)))
+        )
+
+    def test_open_end(self):
+        self.assertEqual(
+            split_period(date(2024, 3, 10), None),
+            ([(date(2024, 3, 10), date(2024, 3, 31))], (date(2024, 4, 1), None))
+        )
+
+    def test_period_inside_one_month_reads_days_only(self):
+        self.assertEqual(
+            split_period(date(2024, 3, 5), date(2024, 3, 20)),
+            ([(date(2024, 3, 5), date(2024, 3, 20))], None)
+        )
+
+    def test_whole_month(self):
+        self.assertEqual(split_period(date(2024, 3, 1), date(2024, 3, 31)), ([], (date(2024, 3, 1), date(2024, 4, 1))))
+
+    def test_period_ending_on_month_end(self):
+        self.assertEqual(
+            split_period(date(2024, 1, 15), date(2024, 3, 31)),
+            ([(date(2024, 1, 15), date(2024, 1, 31))], (date(2024, 2, 1), date(2024, 4, 1)))
+        )
+
+    def test_leap_day_closes_february(self):
+        self.assertEqual(split_period(date(2024, 2, 1), date(2024, 2, 29)), ([], (date(2024, 2, 1), date(2024, 3, 1))))
+        self.assertEqual(
+            split_period(date(2024, 1, 10), date(2024, 2, 29)),
+            ([(date(2024, 1, 10), date(2024, 1, 31))], (date(2024, 2, 1), date(2024, 3, 1)))
+        )
+        self.assertEqual(split_period(None, date(2024, 2, 29)), ([], (None, date(2024, 3, 1))))
+
+    def test_period_starting_on_leap_day(self):
+        self.assertEqual(
+            split_period(date(2024, 2, 29), date(2024, 3, 15)),
+            ([(date(2024, 2, 29), date(2024, 3, 15))], None)
+        )
+
+
+class BalanceRollupTests(TestCase):
+    """Incrementally maintained rollups must match a rebuild from the transactions"""
+
+    def setUp(self):
+        self.bank = Account.objects.create(account_id='1000', name='Bank', account_type='ASSET')
+        self.card = Account.objects.create(account_id='1100', name='Card', account_type='ASSET')
+        self.groceries = Account.objects.create(account_id='5000', name='Groceries', account_type='EXPENSE')
+        self.rent = Account.objects.create(account_id='5100', name='Rent', account_type='EXPENSE')
+        self.sales = Account.objects.create(account_id='4000', name='Sales', account_type='REVENUE')
+
+        self.transactions = [
+            self._transaction('T-001', date(2024, 1, 31), '45.10', 'Groceries corner shop', 'DEBIT'),
+            self._transaction('T-002', date(2024, 2, 1), '1200.00', 'Rent February', 'DEBIT'),
+            self._transaction('T-003', date(2024, 2, 29), '310.55', 'Sales invoice 17', 'CREDIT'),
+            self._transaction('T-004', date(2024, 2, 29), '12.99', 'Groceries market', 'DEBIT', self.card),
+            self._transaction('T-005', date(2024, 3, 1), '88.00', 'Sales invoice 18', 'CREDIT', self.card),
+        ]
+
+    def _transaction(self, transaction_id, day, amount, description, transaction_type, account=None):
+        return Transaction.objects.create(
+            transaction_id=transaction_id,
+            date=day,
+            amount=Decimal(amount),
+            description=description,
+            transaction_type=transaction_type,
+            account=account or self.bank,
+        )
+
+    def _map_and_verify(self, trans, account):
+        if trans.transaction_type == 'CREDIT':
+            trans.map_accounts(trans.account, account, None)
+        else:
+            trans.map_accounts(account, trans.account, None)
+        trans.verify_mapping(None)
+
+    def _verify_all(self):
+        targets = {'T-001': self.groceries, 'T-002': self.rent, 'T-003': self.sales,
+                   'T-004': self.groceries, 'T-005': self.sales}
+        for trans in self.transactions:
+            self._map_and_verify(trans, targets[trans.transaction_id])
+
+    def _snapshot(self):
+        daily = {
+            (row.account_id, row.date): (row.debit_total, row.credit_total, row.count)
+            for row in DailyAccountBalance.objects.all()
+        }
+        monthly = {
+            (row.account_id, row.month): (row.debit_total, row.credit_total, row.count)
+            for row in MonthlyAccountBalance.objects.all()
+        }
+        return daily, monthly
+
+    def assertMatchesRebuild(self):
+        incremental = self._snapshot()
+        rebuild_balances()
+        self.assertEqual(incremental, self._snapshot())
+
+    def _booked_totals(self, date_from=None, date_to=None):
+        """Totals per account summed directly from the booked transactions"""
+        totals = {}
+        booked = Transaction.objects.filter(status=BOOKED_STATUS)
+        if date_from:
+            booked = booked.filter(date__gte=date_from)
+        if date_to:
+            booked = booked.filter(date__lte=date_to)
+        for trans in booked:
+            for account_id, side in ((trans.debit_account_id, 'debit'), (trans.credit_account_id, 'credit')):
+                if account_id is None:
+                    continue
+                entry = totals.setdefault(account_id, {'debit': Decimal('0.00'), 'credit': Decimal('0.00'), 'count': 0})
+                entry[side] += trans.amount
+                entry['count'] += 1
+        return totals
+
+    def test_verify_books_both_sides(self):
+        self._verify_all()
+        self.assertMatchesRebuild()
+        self.assertEqual(account_totals(), self._booked_totals())
+
+    def test_period_totals_match_transactions(self):
+        self._verify_all()
+        for date_from, date_to in [
+            (None, None),
+            (date(2024, 1, 31), date(2024, 2, 29)),
+            (date(2024, 2, 1), date(2024, 2, 29)),
+            (date(2024, 2, 29), date(2024, 3, 1)),
+            (None, date(2024, 2, 28)),
+            (date(2024, 3, 1), None),
+        ]:
+            with self.subTest(date_from=date_from, date_to=date_to):
+                self.assertEqual(account_totals(date_from, date_to), self._booked_totals(date_from, date_to))
+
+    def test_reject_unbooks(self):
+        self._verify_all()
+        self.transactions[1].reject_mapping(None, 'wrong account')
+        Transaction.objects.filter(transaction_id='T-003').reject_mappings('bulk')
+        self.assertMatchesRebuild()
+        self.assertNotIn(self.rent.account_id, account_totals())
+
+    def test_bulk_verify_books(self):
+        for trans in self.transactions:
+            trans.map_accounts(self.groceries, trans.account, None)
+        Transaction.objects.all().verify_mappings(batch_size=2)
+        self.assertMatchesRebuild()
+        self.assertEqual(account_totals()[self.groceries.account_id]['count'], len(self.transactions))
+
+    def test_remapping_verified_rows_unbooks_them(self):
+        self._verify_all()
+        run = RemapRun.objects.create(name='rollup test', statuses=[BOOKED_STATUS], batch_size=2)
+        stats = run_worker(run.pk, worker='test')
+        self.assertEqual(stats['mapped'], len(self.transactions))
+        self.assertMatchesRebuild()
+        self.assertEqual(account_totals(), {})
+
+        # Verifying the remapped rows books them again
+        for trans in Transaction.objects.all():
+            trans.verify_mapping(None)
+        self.assertMatchesRebuild()
+        self.assertEqual(account_totals(), self._booked_totals())
+
+    def test_deleting_a_statement_account_unbooks_its_rows(self):
+        self._verify_all()
+        self.card.delete()
+        self.assertFalse(Transaction.objects.filter(transaction_id__in=['T-004', 'T-005']).exists())
+        self.assertMatchesRebuild()
+        self.assertEqual(account_totals(), self._booked_totals())
+
+
+
+    def test_editing_a_verified_row_rebooks_it(self):
+        self._verify_all()
+        trans = Transaction.objects.get(transaction_id='T-001')
+        trans.amount = Decimal('50.00')
+        trans.date = date(2024, 3, 2)
+        trans.debit_account = self.rent
+        trans.save()
+        self.assertMatchesRebuild()
+        self.assertEqual(account_totals(), self._booked_totals())
+        self.assertNotIn((self.groceries.account_id, date(2024, 1, 31)), self._snapshot()[0])
+
+    def test_deleting_a_verified_row_unbooks_it(self):
+        self._verify_all()
+        Transaction.objects.get(transaction_id='T-002').delete()
+        self.assertMatchesRebuild()
+        self.assertNotIn(self.rent.account_id, account_totals())
+
+class TransactionCounterTests(TestCase):
+    """Single-row saves and deletes keep the status counters and the change stamp current"""
+
+    def test_single_row_writes(self):
+        trans = Transaction.objects.create(
+            transaction_id='C-1', date=date(2024, 5, 1), amount=Decimal('10.00'),
+            description='Stationery', transaction_type='DEBIT',
+        )
+        self.assertEqual(status_counts()['PENDING'], 1)
+
+        version = get_version('transactions')
+        trans.description = 'Stationery and paper'
+        trans.save()
+        self.assertGreater(get_version('transactions'), version)
+
+        trans.status = 'MAPPED'
+        trans.save()
+        self.assertEqual((status_counts()['PENDING'], status_counts()['MAPPED']), (0, 1))
+
+        version = get_version('transactions')
+        trans.delete()
+        self.assertEqual(status_counts()['total'], 0)
+        self.assertGreater(get_version('transactions'), version)
+        self.assertEqual(reconcile_counters(), {})
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite full-text index')
+class SearchIndexTests(TransactionTestCase):
+    """The FTS5 index must keep pointing at the right rows whatever SQLite does to rowids"""
+
+    def setUp(self):
+        for number, description in enumerate(['Coffee beans', 'Office rent', 'Coffee machine', 'Train ticket']):
+            Transaction.objects.create(
+                transaction_id=f'S-{number}', date=date(2024, 5, 1), amount=Decimal('10.00'),
+                description=description, transaction_type='DEBIT',
+            )
+
+    def _search(self, text):
+        return sorted(search_transactions(Transaction.objects.all(), text).values_list('transaction_id', flat=True))
+
+    def test_search_after_vacuum(self):
+        Transaction.objects.filter(transaction_id='S-0').delete()
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+
+        self.assertEqual(self._search('coffee'), ['S-2'])
+        self.assertEqual(self._search('ticket'), ['S-3'])
+
+        # Updates and deletes after the VACUUM reach the right index entries
+        Transaction.objects.filter(transaction_id='S-1').update(description='Coffee for the office')
+        Transaction.objects.filter(transaction_id='S-2').delete()
+        self.assertEqual(self._search('coffee'), ['S-1'])
+        self.assertEqual(self._search('rent'), [])
+
+    def test_missing_triggers_are_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER transaction_mapper_transaction_fts_ai')
+        Transaction.objects.create(
+            transaction_id='S-9', date=date(2024, 5, 2), amount=Decimal('5.00'),
+            description='Coffee refill', transaction_type='DEBIT',
+        )
+        self.assertEqual(ensure_search_triggers(), ['transaction_mapper_transaction_fts_ai'])
+        self.assertEqual(self._search('coffee'), ['S-0', 'S-2', 'S-9'])
+
+
+class RoleRequiredTests(TestCase):
+    """Each role reaches the views that list it; administrators reach every view"""
+
+    views = {
+        'admin': ['ADMIN'],
+        'accounting': ['ADMIN', 'ACCOUNTANT'],
+        'reports': ['ADMIN', 'ACCOUNTANT', 'ANALYST'],
+    }
+
+    def _user(self, role_name):
+        role = Role.objects.create(name=role_name) if role_name else None
+        return User.objects.create_user(username=f'user-{role_name or "none"}', password='secret', role=role)
+
+    def _status(self, user, roles):
+        view = role_required(roles)(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        request.user = user
+        return view(request).status_code
+
+    def test_access_matrix(self):
+        allowed = {
+            'ADMIN': {'admin', 'accounting', 'reports'},
+            'ACCOUNTANT': {'accounting', 'reports'},
+            'ANALYST': {'reports'},
+            'VIEWER': set(),
+            None: set(),
+        }
+        for role_name, views in allowed.items():
+            user = self._user(role_name)
+            for view, roles in self.views.items():
+                with self.subTest(role=role_name, view=view):
+                    self.assertEqual(self._status(user, roles), 200 if view in views else 403)
+
+
+class ExportFormulaTests(TestCase):
+    """Free text that a spreadsheet would evaluate is exported as plain text"""
+
+    def test_escape_formula(self):
+        for value in ['=SUM(A1:A9)', '+1', '-2+3', '@cmd', '\tX', '\rX']:
+            with self.subTest(value=value):
+                self.assertEqual(escape_formula(value), "'" + value)
+        for value in ['Coffee', '', None, Decimal('-5.00')]:
+            with self.subTest(value=value):
+                self.assertEqual(escape_formula(value), value)
+
+    def test_csv_escapes_description_and_customer(self):
+        Transaction.objects.create(
+            transaction_id='-X-1', date=date(2024, 5, 1), amount=Decimal('-10.00'),
+            description='=HYPERLINK("http://example.com")', customer_name='@Acme',
+            transaction_type='DEBIT',
+        )
+        export = b''.join(stream_transactions_csv(export_queryset())).decode('utf-8')
+        self.assertIn("\"'=HYPERLINK(\"\"http://example.com\"\")\"", export)
+        self.assertIn(",'@Acme,", export)
+        # Identifiers and amounts are written as stored
+        self.assertIn('\n-X-1,', export)
+        self.assertIn(',-10.00,', export)
+
+
+class ActivityRetentionTests(TestCase):
+    def setUp(self):
+        for day in [datetime(2024, 1, 10, 9), datetime(2024, 1, 20, 17), datetime(2024, 5, 1, 23, 59)]:
+            UserActivity.objects.create(activity_type='LOGIN', description='login', created_at=timezone.make_aware(day))
+
+    def test_dry_run_reports_what_a_run_does(self):
+        today = date(2024, 6, 1)
+        preview = apply_retention(today=today, retention_days=90, dry_run=True)
+        self.assertFalse(UserActivityDaily.objects.exists())
+        self.assertEqual(UserActivity.objects.count(), 3)
+
+        with tempfile.TemporaryDirectory() as directory:
+            result = apply_retention(today=today, retention_days=90, directory=directory)
+        self.assertEqual(preview['rolled_up'], result['rolled_up'])
+        self.assertEqual(
+            [(month, count) for month, _, count in preview['archived']],
+            [(month, count) for month, _, count in result['archived']]
+        )
+        self.assertEqual([month for month, _, _ in result['archived']], [date(2024, 1, 1), date(2024, 2, 1)])
+
+    def test_yesterday_waits_for_late_flushes(self):
+        midnight = timezone.make_aware(datetime(2024, 5, 2))
+        with mock.patch('django.utils.timezone.now', return_value=midnight + timedelta(seconds=1)):
+            self.assertEqual(pending_rollup_days(date(2024, 5, 2)), (date(2024, 1, 10), date(2024, 4, 30)))
+        with mock.patch('django.utils.timezone.now', return_value=midnight + rollup_grace()):
+            self.assertEqual(pending_rollup_days(date(2024, 5, 2)), (date(2024, 1, 10), date(2024, 5, 1)))
+
+
+class LockoutTests(TestCase):
+    """A reactivated account gets the full number of attempts again"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='locked', password='secret')
+
+    def _lock_out(self):
+        locked = [record_failed_login('locked') for _ in range(MAX_FAILED_ATTEMPTS)]
+        self.assertEqual(locked, [False] * (MAX_FAILED_ATTEMPTS - 1) + [True])
+
+    def _reactivate(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(user.is_active)
+        user.is_active = True
+        user.save()
+        return User.objects.get(pk=self.user.pk)
+
+    def test_reactivation_resets_database_count(self):
+        self._lock_out()
+        user = self._reactivate()
+        self.assertEqual(user.failed_login_attempts, 0)
+        self.assertFalse(record_failed_login('locked'))
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_active)
+
+    @override_settings(LOGIN_FAILURE_COUNTER='cache')
+    def test_reactivation_resets_cache_count(self):
+        self._lock_out()
+        self._reactivate()
+        self.assertFalse(record_failed_login('locked'))
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_active)
+        # The limit still applies after reactivation
+        self.assertEqual([record_failed_login('locked') for _ in range(MAX_FAILED_ATTEMPTS - 1)][-1], True)
+
+
+class KeysetPaginationTests(TestCase):
+    """Walking the pages of every sort visits each row once, in order, both ways"""
+
+    def setUp(self):
+        rows = [
+            ('P-01', date(2024, 4, 1), time(9, 0), '10.00'),
+            ('P-02', date(2024, 4, 1), time(9, 0), '10.00'),
+            ('P-03', date(2024, 4, 1), None, '25.00'),
+            ('P-04', date(2024, 4, 1), None, '10.00'),
+            ('P-05', date(2024, 4, 1), time(17, 30), '5.00'),
+            ('P-06', date(2024, 4, 2), None, '25.00'),
+            ('P-07', date(2024, 4, 2), time(8, 15), '99.99'),
+            ('P-08', date(2024, 3, 31), time(23, 59), '10.00'),
+        ]
+        for transaction_id, day, at, amount in rows:
+            Transaction.objects.create(
+                transaction_id=transaction_id, date=day, time=at, amount=Decimal(amount),
+                description=transaction_id, transaction_type='DEBIT',
+            )
+
+    def _paginator(self, sort, per_page=3):
+        return KeysetPaginator(Transaction.objects.all(), TRANSACTION_SORTS[sort], sort, per_page)
+
+    def _ids(self, rows):
+        return [row.transaction_id for row in rows]
+
+    def test_pages_follow_the_sort_both_ways(self):
+        for sort in TRANSACTION_SORTS:
+            with self.subTest(sort=sort):
+                paginator = self._paginator(sort)
+                expected = self._ids(paginator.ordered())
+
+                pages = [paginator.page()]
+                while pages[-1].has_next:
+                    pages.append(paginator.page(pages[-1].next_token))
+                self.assertEqual([row for page in pages for row in self._ids(page)], expected)
+                self.assertFalse(pages[0].has_previous)
+
+                # Walking back from the last page gives the same pages
+                backwards = [pages[-1]]
+                while backwards[-1].has_previous:
+                    backwards.append(paginator.page(backwards[-1].previous_token))
+                self.assertEqual([self._ids(page) for page in reversed(backwards)], [self._ids(page) for page in pages])
+
+    def test_null_times_sort_lowest(self):
+        self.assertEqual(self._ids(self._paginator('-date').ordered())[:5], ['P-07', 'P-06', 'P-05', 'P-02', 'P-01'])
+        self.assertEqual(self._ids(self._paginator('date').ordered())[:4], ['P-08', 'P-03', 'P-04', 'P-01'])
+
+    def test_keyset_filter_selects_the_rows_after_each_row(self):
+        for sort, keys in TRANSACTION_SORTS.items():
+            paginator = self._paginator(sort)
+            ordered = list(paginator.ordered())
+            for position, row in enumerate(ordered):
+                values = [getattr(row, name) for name, _, _ in keys]
+                with self.subTest(sort=sort, row=row.transaction_id):
+                    after = paginator.ordered().filter(keyset_filter(keys, values))
+                    self.assertEqual(self._ids(after), self._ids(ordered[position + 1:]))
+                    before = Transaction.objects.filter(keyset_filter(keys, values, reverse=True))
+                    self.assertEqual(sorted(self._ids(before)), sorted(self._ids(ordered[:position])))
+
+    def test_decode_cursor_rejects_tampered_tokens(self):
+        token = encode_cursor('-date', 'next', ['2024-04-01', None, 'P-03'])
+        self.assertEqual(decode_cursor(token)['v'], ['2024-04-01', None, 'P-03'])
+        for bad in ['not a token!', token[:-3], encode_cursor('-date', 'sideways', []), 'WzEsMiwzXQ']:
+            with self.subTest(token=bad):
+                with self.assertRaises(InvalidCursor):
+                    decode_cursor(bad)
+
+    def test_bad_tokens_fall_back_to_the_first_page(self):
+        paginator = self._paginator('-date')
+        first = self._ids(paginator.page())
+        for token in [
+            'garbage',
+            encode_cursor('-date', 'next', ['2024-04-01', None]),
+            encode_cursor('-date', 'next', ['not a date', None, 'P-03']),
+            encode_cursor('amount', 'next', ['10.00', 'P-02']),
+        ]:
+            with self.subTest(token=token):
+                page = paginator.page(token)
+                self.assertEqual(self._ids(page), first)
+                self.assertFalse(page.has_previous)
+
+
+class ChartUploadTests(TestCase):
+    """Chart uploads are written parents first and keep the materialized paths consistent"""
+
+    def _row(self, account_id, parent=None):
+        return {'account_id': account_id, 'name': f'Account {account_id}', 'account_type': 'ASSET', 'parent_account': parent}
+
+    def _paths(self):
+        return dict(Account.objects.values_list('account_id', 'path'))
+
+    def test_levels_allow_forward_references(self):
+        rows = {row['account_id']: row for row in [self._row('C', 'B'), self._row('B', 'A'), self._row('A'), self._row('X', 'EXT')]}
+        levels, errors = order_accounts_by_level(rows, {'EXT'})
+        self.assertEqual(errors, {})
+        self.assertEqual([sorted(level) for level in levels], [['A', 'X'], ['B'], ['C']])
+
+    def test_levels_reject_cycles_and_missing_parents(self):
+        rows = {row['account_id']: row for row in [
+            self._row('P', 'Q'), self._row('Q', 'P'), self._row('M', 'NOPE'), self._row('N', 'M'), self._row('A'),
+        ]}
+        levels, errors = order_accounts_by_level(rows, set())
+        self.assertEqual(levels, [['A']])
+        self.assertEqual(set(errors), {'P', 'Q', 'M', 'N'})
+        self.assertIn('Circular parent reference', errors['P'])
+        self.assertIn('Circular parent reference', errors['Q'])
+        self.assertIn('not found', errors['M'])
+        self.assertIn('could not be loaded', errors['N'])
+
+    def test_upload_with_forward_references(self):
+        result = upsert_accounts([self._row('C', 'B'), self._row('B', 'A'), self._row('A')])
+        self.assertEqual((result['created'], result['updated'], result['errors']), (3, 0, []))
+        self.assertEqual(self._paths(), {'A': '/A/', 'B': '/A/B/', 'C': '/A/B/C/'})
+        self.assertEqual(Account.objects.get(account_id='C').depth, 2)
+
+    def test_reparenting_moves_the_stored_subtree(self):
+        upsert_accounts([self._row('A'), self._row('B', 'A'), self._row('C', 'B'), self._row('D')])
+        result = upsert_accounts([self._row('B', 'D')])
+        self.assertEqual((result['created'], result['updated'], result['errors']), (0, 1, []))
+        self.assertEqual(self._paths(), {'A': '/A/', 'B': '/D/B/', 'C': '/D/B/C/', 'D': '/D/'})
+        self.assertEqual(Account.objects.get(account_id='C').depth, 2)
+
+    def test_cannot_move_below_own_descendant(self):
+        upsert_accounts([self._row('A'), self._row('B', 'A'), self._row('C', 'B')])
+        result = upsert_accounts([self._row('A', 'C'), self._row('E', 'A')])
+        self.assertEqual(result['created'] + result['updated'], 0)
+        self.assertEqual(result['errors'], [
+            'Account A cannot be moved below its own descendant C',
+            'Account E skipped because its parent A was rejected',
+        ])
+        self.assertEqual(self._paths(), {'A': '/A/', 'B': '/A/B/', 'C': '/A/B/C/'})
+        self.assertIsNone(Account.objects.get(account_id='A').parent_account_id)
+
+
+class DeduplicatorTests(TestCase):
+    """Re-uploaded rows are skipped by fingerprint; rows the bank tells apart are kept"""
+
+    def _transaction(self, description='Coffee beans', amount='4.50', supplied_id=None):
+        # Built the way the upload builds rows
+        fingerprint = transaction_fingerprint(date(2024, 6, 3), Decimal(amount), description, 'Cafe', None, supplied_id)
+        return Transaction(
+            transaction_id=supplied_id or fingerprint[:40], fingerprint=fingerprint, date=date(2024, 6, 3),
+            amount=Decimal(amount), description=description, customer_name='Cafe', transaction_type='DEBIT',
+        )
+
+    def test_duplicates_within_the_file(self):
+        deduplicator = TransactionDeduplicator()
+        first = self._transaction()
+        fresh = deduplicator.new_only([first, self._transaction(), self._transaction('  COFFEE   beans ')])
+        self.assertEqual(fresh, [first])
+        # A later chunk of the same file repeats the row
+        fresh = deduplicator.new_only([self._transaction(), self._transaction(amount='5.00')])
+        self.assertEqual([trans.amount for trans in fresh], [Decimal('5.00')])
+
+    def test_rows_already_stored(self):
+        stored = self._transaction()
+        stored.save()
+        deduplicator = TransactionDeduplicator()
+        other = self._transaction('Train ticket')
+        with self.assertNumQueries(1):
+            self.assertEqual(deduplicator.new_only([self._transaction(), other]), [other])
+        # Fingerprints already known to be stored are not looked up again
+        with self.assertNumQueries(0):
+            self.assertEqual(deduplicator.new_only([self._transaction()]), [])
+
+    def test_bank_ids_keep_identical_payments_apart(self):
+        deduplicator = TransactionDeduplicator()
+        first, second = self._transaction(supplied_id='BANK-1'), self._transaction(supplied_id='BANK-2')
+        self.assertNotEqual(first.fingerprint, second.fingerprint)
+        self.assertEqual(deduplicator.new_only([first, second, self._transaction(supplied_id='BANK-1')]), [first, second])
+        # The same payment without an ID is matched on content alone, apart from both
+        self.assertEqual(len(deduplicator.new_only([self._transaction()])), 1)
+
+
+class ActivitySinkTests(TransactionTestCase):
+    """The sink writes every queued event and applies its overflow policy when full"""
+
+    def _sink(self, start=True, **options):
+        sink = ActivitySink(**options)
+        if not start:
+            # Nothing drains the queue, so it fills up
+            sink._ensure_started = lambda: None
+        self.addCleanup(sink.close)
+        return sink
+
+    def _record(self, sink, count):
+        for number in range(count):
+            sink.record(None, 'LOGIN', f'event {number}', '127.0.0.1')
+
+    def _wait_for_rows(self, count, timeout=5.0):
+        deadline = monotonic() + timeout
+        while UserActivity.objects.count() < count and monotonic() < deadline:
+            sleep(0.01)
+        return UserActivity.objects.count()
+
+    def test_drop_when_full(self):
+        sink = self._sink(start=False, max_queue=2, overflow='drop')
+        self._record(sink, 5)
+        self.assertEqual(sink.dropped, 3)
+        sink.close()
+        self.assertEqual(UserActivity.objects.count(), 2)
+
+    def test_block_waits_then_drops(self):
+        sink = self._sink(start=False, max_queue=1, overflow='block', block_seconds=0.02)
+        started = monotonic()
+        self._record(sink, 3)
+        self.assertGreaterEqual(monotonic() - started, 0.04)
+        self.assertEqual(sink.dropped, 2)
+        sink.close()
+        self.assertEqual(UserActivity.objects.count(), 1)
+
+    def test_sync_writes_in_the_caller(self):
+        sink = self._sink(start=False, max_queue=1, overflow='sync')
+        self._record(sink, 3)
+        self.assertEqual((sink.dropped, UserActivity.objects.count()), (0, 2))
+        sink.close()
+        self.assertEqual(UserActivity.objects.count(), 3)
+
+    def test_flush_when_a_batch_is_full(self):
+        sink = self._sink(batch_size=3, flush_interval=60)
+        self._record(sink, 3)
+        self.assertEqual(self._wait_for_rows(3), 3)
+
+    def test_flush_after_the_interval(self):
+        sink = self._sink(batch_size=100, flush_interval=0.05)
+        self._record(sink, 2)
+        self.assertEqual(self._wait_for_rows(2), 2)
+
+    def test_close_drains_without_waiting_for_the_interval(self):
+        sink = self._sink(batch_size=100, flush_interval=60)
+        self._record(sink, 5)
+        started = monotonic()
+        sink.close()
+        self.assertLess(monotonic() - started, 5.0)
+        self.assertFalse(sink._thread.is_alive())
+        self.assertEqual(UserActivity.objects.count(), 5)
+        self.assertEqual(sink.dropped, 0)
@@ -1,9 +1,12 @@
 from django.urls import path
 from .views.dashboard import dashboard_view
 from .views.profile import profile_view
-from .views.transactions import transaction_view, upload_transactions, delete_all_transactions, map_transaction, verify_transaction, reject_transaction
-from .views.users import user_management_view, register_view
-from .views.accounts import accounts_view, upload_accounts, delete_all_accounts
+from .views.transactions import transaction_view, search_transactions_api, upload_transactions, delete_all_transactions, map_transaction, verify_transaction, reject_transaction, bulk_verify_transactions, bulk_reject_transactions
+from .views.users import user_management_view, register_view, user_activity_summary
+from .views.api import transactions_api
+from .views.exports import export_transactions
+from .views.reports import trial_balance_view, income_statement_view, account_ledger_view
+from .views.accounts import accounts_view, account_tree, account_search, upload_accounts, delete_all_accounts
 from .views.auth import CustomLoginView, CustomLogoutView, CustomPasswordChangeView
 
 app_name = 'transaction_mapper'
@@ -12,14 +15,25 @@ urlpatterns = [
     path('', dashboard_view, name='dashboard'),
     path('profile/', profile_view, name='profile'),
     path('transactions/', transaction_view, name='transactions'),
+    path('transactions/search/', search_transactions_api, name='search_transactions'),
+    path('transactions/export/', export_transactions, name='export_transactions'),
     path('transactions/upload/', upload_transactions, name='upload_transactions'),
     path('transactions/delete-all/', delete_all_transactions, name='delete_all_transactions'),
     path('transactions/map/', map_transaction, name='map_transaction'),
     path('transactions/verify/', verify_transaction, name='verify_transaction'),
     path('transactions/reject/', reject_transaction, name='reject_transaction'),
+    path('transactions/verify/bulk/', bulk_verify_transactions, name='bulk_verify_transactions'),
+    path('transactions/reject/bulk/', bulk_reject_transactions, name='bulk_reject_transactions'),
+    path('api/transactions/', transactions_api, name='transactions_api'),
+    path('reports/trial-balance/', trial_balance_view, name='trial_balance'),
+    path('reports/income-statement/', income_statement_view, name='income_statement'),
+    path('reports/ledger/<str:account_id>/', account_ledger_view, name='account_ledger'),
     path('users/', user_management_view, name='user_management'),
+    path('users/activity/', user_activity_summary, name='user_activity_summary'),
     path('register/', register_view, name='register'),
     path('accounts/', accounts_view, name='accounts'),
+    path('accounts/tree/', account_tree, name='account_tree'),
+    path('accounts/search/', account_search, name='account_search'),
     path('accounts/upload/', upload_accounts, name='upload_accounts'),
     path('accounts/delete-all/', delete_all_accounts, name='delete_all_accounts'),
     # Add authentication URLs
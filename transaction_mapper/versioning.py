@@ -0,0 +1,35 @@
+"""
+Change stamps for cached, derived data.
+
+Each named dataset ('chart', 'transactions', ...) has a version counter that
+writers bump inside their transaction. Readers put the version into cache
+keys, so a write invalidates every cached result built from the old data
+without having to know which keys exist.
+"""
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ChangeStamp
+
+
+def get_stamp(name: str) -> ChangeStamp:
+    """Return the stamp of a dataset (version 0 if it was never written)."""
+    try:
+        return ChangeStamp.objects.get(name=name)
+    except ChangeStamp.DoesNotExist:
+        return ChangeStamp(name=name, version=0)
+
+
+def get_version(name: str) -> int:
+    """Return the current version number of a dataset."""
+    return get_stamp(name).version
+
+
+def bump_version(name: str) -> None:
+    """Mark a dataset as changed."""
+    now = timezone.now()
+    updated = ChangeStamp.objects.filter(name=name).update(version=F('version') + 1, changed_at=now)
+    if not updated:
+        _, created = ChangeStamp.objects.get_or_create(name=name, defaults={'version': 1, 'changed_at': now})
+        if not created:
+            ChangeStamp.objects.filter(name=name).update(version=F('version') + 1, changed_at=now)
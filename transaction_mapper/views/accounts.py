@@ -3,23 +3,81 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.db import transaction
+from django.db.models import Q
+from django.core.cache import cache
 from ..models import Account, Transaction
+from ..file_readers import file_type_from_name, read_frame
+from ..ingest import upsert_accounts
+from ..versioning import bump_version, get_version
+from ..counters import record_transaction_changes, removed, status_breakdown
+from ..account_index import DEFAULT_LIMIT, MAX_LIMIT, get_account_index
 import pandas as pd
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Upload errors are summarised; only the first few are returned to the browser
+MAX_REPORTED_ERRORS = 20
+
+# The cache key carries the chart version, so stale trees simply expire
+ACCOUNT_TREE_CACHE_TIMEOUT = 24 * 60 * 60
+
 @login_required
 def accounts_view(request):
     """View for listing and managing chart of accounts"""
-    accounts = Account.objects.all()
+    # Ordering by the materialized path lists every account right below its parent
+    accounts = Account.objects.select_related('parent_account').order_by('path')
     context = {
         'title': 'Chart of Accounts',
         'accounts': accounts,
     }
     return render(request, 'transaction_mapper/accounts.html', context)
 
+def build_account_tree():
+    """Build the nested chart of accounts from a single path-ordered query"""
+    roots = []
+    nodes = {}
+    rows = Account.objects.order_by('path').values(
+        'account_id', 'name', 'account_type', 'parent_account_id', 'depth'
+    )
+    for row in rows:
+        node = {
+            'account_id': row['account_id'],
+            'name': row['name'],
+            'account_type': row['account_type'],
+            'depth': row['depth'],
+            'children': [],
+        }
+        nodes[row['account_id']] = node
+        parent = nodes.get(row['parent_account_id'])
+        if parent is not None:
+            parent['children'].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+@login_required
+def account_tree(request):
+    """Return the chart of accounts as a nested JSON tree"""
+    version = get_version('chart')
+    cache_key = f'account_tree:{version}'
+    tree = cache.get(cache_key)
+    if tree is None:
+        tree = build_account_tree()
+        cache.set(cache_key, tree, ACCOUNT_TREE_CACHE_TIMEOUT)
+    return JsonResponse({'version': version, 'accounts': tree})
+
+@login_required
+def account_search(request):
+    """Typeahead lookup of accounts by id or name prefix"""
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    return JsonResponse({'results': get_account_index().search(query, limit)})
+
 @login_required
 def delete_all_accounts(request):
     """Delete all accounts from the system"""
@@ -28,15 +86,21 @@ def delete_all_accounts(request):
     
     try:
         with transaction.atomic():
-            # First check if any transactions are mapped
-            mapped_transactions = Transaction.objects.filter(mapped_account__isnull=False).exists()
+            # First check if any transactions are mapped, by the legacy field or the debit/credit pair
+            mapped_transactions = Transaction.objects.filter(
+                Q(mapped_account__isnull=False) | Q(debit_account__isnull=False) | Q(credit_account__isnull=False)
+            ).exists()
             if mapped_transactions:
                 return JsonResponse({
                     'error': 'Cannot delete accounts while transactions are mapped to them. Please unmap all transactions first.'
                 }, status=400)
             
+            # Transactions of an account are deleted with it
+            record_transaction_changes(removed(status_breakdown(Transaction.objects.filter(account__isnull=False))))
+            
             # Delete all accounts
             count = Account.objects.all().delete()[0]
+            bump_version('chart')
             logger.info(f"Deleted {count} accounts")
             
             return JsonResponse({
@@ -68,12 +132,10 @@ def upload_accounts(request):
     try:
         # Read file based on extension
         try:
-            if file.name.endswith('.csv'):
-                # Read CSV with accounting_code as string to preserve leading zeros
-                df = pd.read_csv(file, dtype={'accounting_code': str})
-            else:
-                # Read Excel with accounting_code as string
-                df = pd.read_excel(file, dtype={'accounting_code': str})
+            # Read with accounting_code as string to preserve leading zeros;
+            # workbooks are streamed in read-only mode
+            df = read_frame(file, file_type_from_name(file.name),
+                            dtype={'accounting_code': str, 'parent_account': str})
             
             logger.info(f"Successfully read file with {len(df)} rows")
             logger.info(f"Columns found in file: {list(df.columns)}")
@@ -110,56 +172,33 @@ def upload_accounts(request):
                 logger.error(error_msg)
                 return JsonResponse({'error': error_msg}, status=400)
             
-            # Process accounts
-            accounts_created = 0
-            accounts_updated = 0
-            errors = []
+            # Clean the rows; parents may reference accounts defined later in the file
+            rows = []
+            for row in df.to_dict('records'):
+                parent_id = row.get('parent_account')
+                rows.append({
+                    'account_id': str(row['account_id']).strip(),
+                    'name': str(row['name']).strip(),
+                    'account_type': str(row['account_type']).strip(),
+                    'parent_account': str(parent_id).strip().zfill(4) if pd.notna(parent_id) else None,
+                })
             
             # Use transaction.atomic to ensure all-or-nothing operation
             with transaction.atomic():
-                for index, row in df.iterrows():
-                    try:
-                        # Clean and validate data
-                        account_data = {
-                            'name': str(row['name']).strip(),
-                            'account_type': str(row['account_type']).strip(),
-                        }
-                        
-                        # Handle parent account if present
-                        if 'parent_account' in row and pd.notna(row['parent_account']):
-                            parent_id = str(row['parent_account']).strip()
-                            try:
-                                parent_account = Account.objects.get(account_id=parent_id)
-                                account_data['parent_account'] = parent_account
-                            except Account.DoesNotExist:
-                                errors.append(f"Parent account {parent_id} not found for account {row['account_id']}")
-                                continue
-                        
-                        # Create or update account
-                        account, created = Account.objects.update_or_create(
-                            account_id=str(row['account_id']).strip(),
-                            defaults=account_data
-                        )
-                        
-                        if created:
-                            accounts_created += 1
-                            logger.info(f"Created account: {account.account_id}")
-                        else:
-                            accounts_updated += 1
-                            logger.info(f"Updated account: {account.account_id}")
-                            
-                    except Exception as e:
-                        error_msg = f"Error processing row {index + 1} (account_id: {row.get('account_id', 'unknown')}): {str(e)}"
-                        logger.error(error_msg)
-                        errors.append(error_msg)
+                result = upsert_accounts(rows)
+            
+            errors = result['errors']
+            if errors:
+                logger.warning(f"{len(errors)} accounts skipped, first errors: {errors[:5]}")
             
             response_data = {
                 'success': True,
-                'accounts_created': accounts_created,
-                'accounts_updated': accounts_updated,
-                'errors': errors
+                'accounts_created': result['created'],
+                'accounts_updated': result['updated'],
+                'error_count': len(errors),
+                'errors': errors[:MAX_REPORTED_ERRORS]
             }
-            logger.info(f"Upload completed: {accounts_created} created, {accounts_updated} updated, {len(errors)} errors")
+            logger.info(f"Upload completed: {result['created']} created, {result['updated']} updated, {len(errors)} errors")
             return JsonResponse(response_data)
             
         except Exception as e:
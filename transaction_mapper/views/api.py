@@ -0,0 +1,71 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_safe
+from ..exporters import EXPORT_COLUMNS
+from ..filters import TRANSACTION_SORTS, filter_transactions, transaction_filters
+from ..models import Transaction
+from ..pagination import KeysetPaginator
+from ..versioning import get_stamp
+
+# Fields clients may request with ?fields=, mapped to their queryset lookups
+API_FIELDS = dict(EXPORT_COLUMNS)
+API_PAGE_SIZE = 100
+
+def _transactions_stamp(request):
+    """The 'transactions' change stamp, read once per request"""
+    if not hasattr(request, '_transactions_stamp'):
+        request._transactions_stamp = get_stamp('transactions')
+    return request._transactions_stamp
+
+def _transactions_etag(request):
+    # Validators are per URL, so the table version identifies the response
+    return f"transactions-v{_transactions_stamp(request).version}"
+
+def _transactions_last_modified(request):
+    return _transactions_stamp(request).changed_at
+
+def _requested_fields(request):
+    """Return the requested field names, or None if any of them is unknown"""
+    requested = request.GET.get('fields', '')
+    if not requested:
+        return list(API_FIELDS)
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    if any(name not in API_FIELDS for name in fields):
+        return None
+    return fields
+
+@login_required
+@require_safe
+@gzip_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_transactions_etag, last_modified_func=_transactions_last_modified)
+def transactions_api(request):
+    """JSON list of transactions with field projection and keyset cursors"""
+    fields = _requested_fields(request)
+    if fields is None:
+        return JsonResponse({
+            'error': 'Unknown field requested',
+            'allowed_fields': list(API_FIELDS)
+        }, status=400)
+
+    try:
+        limit = int(request.GET.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+    filters = transaction_filters(request.GET)
+    sort_keys = TRANSACTION_SORTS[filters['sort']]
+
+    # Rows are plain dicts from values(); sort keys are always fetched for the cursor
+    lookups = list(dict.fromkeys([API_FIELDS[name] for name in fields] + [name for name, _, _ in sort_keys]))
+    rows = filter_transactions(Transaction.objects.values(*lookups), filters)
+    page = KeysetPaginator(rows, sort_keys, filters['sort'], per_page=limit).page(request.GET.get('cursor'))
+
+    return JsonResponse({
+        'fields': fields,
+        'results': [{name: row[API_FIELDS[name]] for name in fields} for row in page],
+        'next': page.next_token,
+        'previous': page.previous_token,
+    })
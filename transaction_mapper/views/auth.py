@@ -17,6 +17,7 @@ from ..forms import (
 )
 from ..models import User, UserProfile
 from ..decorators import role_required
+from ..lockout import client_ip, record_failed_login, record_successful_login
 
 class CustomLoginView(LoginView):
     """Custom login view with enhanced security"""
@@ -24,43 +25,18 @@ class CustomLoginView(LoginView):
     template_name = 'transaction_mapper/auth/login.html'
     
     def form_valid(self, form):
-        # Reset failed login attempts on successful login
-        user = form.get_user()
-        user.failed_login_attempts = 0
-        user.save()
-        
-        # Get client IP
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-            
-        # Update last login IP
-        user.last_login_ip = ip
-        user.save()
-        
+        # Counter reset and IP are one UPDATE; login() then saves only last_login
+        record_successful_login(form.get_user(), client_ip(self.request))
         return super().form_valid(form)
     
     def form_invalid(self, form):
         # Increment failed login attempts
         username = form.cleaned_data.get('username')
-        if username:
-            try:
-                user = User.objects.get(username=username)
-                user.failed_login_attempts += 1
-                user.save()
-                
-                # Lock account after 5 failed attempts
-                if user.failed_login_attempts >= 5:
-                    user.is_active = False
-                    user.save()
-                    messages.error(self.request, 
-                        "Account locked due to too many failed login attempts. "
-                        "Please contact an administrator."
-                    )
-            except User.DoesNotExist:
-                pass
+        if username and record_failed_login(username):
+            messages.error(self.request, 
+                "Account locked due to too many failed login attempts. "
+                "Please contact an administrator."
+            )
                 
         return super().form_invalid(form)
 
@@ -1,10 +1,15 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from ..metrics import dashboard_metrics
 
 @login_required
 def dashboard_view(request):
     """Main dashboard view"""
+    # All widget aggregates come from one cached metrics bundle
+    metrics = dashboard_metrics()
     context = {
         'title': 'Dashboard',
+        'metrics': metrics,
+        'status_counts': metrics['status_counts'],
     }
     return render(request, 'transaction_mapper/dashboard.html', context)
@@ -0,0 +1,46 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+from ..decorators import permission_required
+from ..exporters import stream_transactions_csv, stream_transactions_xlsx
+from ..filters import TRANSACTION_SORTS, filter_transactions, transaction_filters
+from ..models import Transaction
+from ..pagination import KeysetPaginator
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the database cursor per chunk of streamed output
+EXPORT_CHUNK_SIZE = 2000
+
+# format -> (byte stream generator, content type)
+EXPORT_FORMATS = {
+    'csv': (stream_transactions_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (stream_transactions_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+@login_required
+@require_safe
+@permission_required('export_reports')
+def export_transactions(request):
+    """Stream the transactions matching the list view's filters as CSV or XLSX"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({
+            'error': 'Unsupported export format',
+            'allowed_formats': list(EXPORT_FORMATS)
+        }, status=400)
+    stream, content_type = EXPORT_FORMATS[export_format]
+
+    filters = transaction_filters(request.GET)
+    queryset = filter_transactions(Transaction.objects.all(), filters)
+    # Same order as the list view, served by the same indexes
+    queryset = KeysetPaginator(queryset, TRANSACTION_SORTS[filters['sort']], filters['sort']).ordered()
+
+    logger.info(f"User {request.user.username} exporting transactions as {export_format}")
+    filename = f"transactions-{timezone.localdate():%Y%m%d}.{export_format}"
+    response = StreamingHttpResponse(stream(queryset, EXPORT_CHUNK_SIZE), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
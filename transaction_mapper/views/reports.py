@@ -0,0 +1,71 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+from ..decorators import role_required
+from ..filters import TRANSACTION_SORTS
+from ..models import Account
+from ..pagination import KeysetPaginator
+from ..reports import InvalidPeriod, account_ledger, income_statement, ledger_entries, report_period, trial_balance
+
+REPORT_ROLES = ['ADMIN', 'ACCOUNTANT', 'ANALYST']
+LEDGER_PAGE_SIZE = 100
+# Ledger entries read oldest first, like a printed ledger
+LEDGER_SORT = 'date'
+
+@login_required
+@require_safe
+@role_required(REPORT_ROLES)
+def trial_balance_view(request):
+    """Trial balance over ?date_from= / ?date_to=, rolled up through the chart of accounts"""
+    try:
+        date_from, date_to = report_period(request.GET)
+    except InvalidPeriod as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(trial_balance(date_from, date_to))
+
+@login_required
+@require_safe
+@role_required(REPORT_ROLES)
+def income_statement_view(request):
+    """Income statement (P&L) over ?date_from= / ?date_to="""
+    try:
+        date_from, date_to = report_period(request.GET)
+    except InvalidPeriod as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(income_statement(date_from, date_to))
+
+@login_required
+@require_safe
+@role_required(REPORT_ROLES)
+def account_ledger_view(request, account_id):
+    """Ledger of an account and its sub-accounts, with entries paged by ?cursor="""
+    account = get_object_or_404(Account, account_id=account_id)
+    try:
+        date_from, date_to = report_period(request.GET)
+        per_page = int(request.GET.get('limit', LEDGER_PAGE_SIZE))
+    except InvalidPeriod as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+    ledger = account_ledger(account, date_from, date_to)
+    account_ids = set(ledger.pop('account_ids'))
+    entries = ledger_entries(list(account_ids), date_from, date_to).values(
+        'transaction_id', 'date', 'time', 'description', 'amount', 'debit_account_id', 'credit_account_id'
+    )
+    paginator = KeysetPaginator(entries, TRANSACTION_SORTS[LEDGER_SORT], LEDGER_SORT, per_page=per_page)
+    # A stale or malformed cursor falls back to the first page, as in the transaction list
+    page = paginator.page(request.GET.get('cursor'))
+
+    ledger['entries'] = [
+        {
+            **row,
+            'debit': row['amount'] if row['debit_account_id'] in account_ids else None,
+            'credit': row['amount'] if row['credit_account_id'] in account_ids else None,
+        }
+        for row in page
+    ]
+    ledger['next'] = page.next_token
+    ledger['previous'] = page.previous_token
+    return JsonResponse(ledger)
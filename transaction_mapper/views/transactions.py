@@ -2,93 +2,186 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Q, Count
-from django.core.paginator import Paginator
 from django.db import transaction
 from django.core.exceptions import ValidationError
+from django.conf import settings
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from ..models import Transaction, Account
 from ..decorators import role_required
+from ..ingest import TransactionDeduplicator, resolve_accounts, transaction_fingerprint
+from ..file_readers import file_type_from_name, iter_frames
+from ..mapping import MAPPING_FIELDS, MIN_CONFIDENCE, AccountMatcher, apply_mapping
+from ..streaming import BatchProgress, ndjson_response, wants_stream
+from ..filters import TRANSACTION_SORTS, filter_transactions, transaction_filters
+from ..pagination import KeysetPaginator, approximate_count
+from ..search import MAX_SEARCH_RESULTS, ranked_transaction_ids
+from ..counters import moved, record_transaction_changes, removed, status_breakdown, status_counts
+from ..rollups import BalanceDeltas
 import pandas as pd
+from itertools import chain
+from datetime import time
 from decimal import Decimal, InvalidOperation
 import logging
-import uuid
 
 logger = logging.getLogger(__name__)
 
+# Rows per page of the transaction list
+TRANSACTIONS_PER_PAGE = 50
+
+# Upload formats accepted by upload_transactions, all fed through the same chunked pipeline
+UPLOAD_FILE_TYPES = ('csv', 'xlsx', 'parquet')
+REQUIRED_COLUMNS = ['date', 'description', 'amount']
+UPLOAD_BATCH_SIZE = 1000
+
+# Pending transactions mapped per bulk_update by "Map All"
+MAP_BATCH_SIZE = 500
+MAX_ERROR_DETAILS = 10
+
+# Transactions changed per UPDATE by the bulk verify/reject endpoints
+REVIEW_BATCH_SIZE = 1000
+
 @login_required
 def transaction_view(request):
     """Transaction listing and filtering view"""
     # Get filter parameters
-    status = request.GET.get('status', '')
-    search = request.GET.get('search', '')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-    sort = request.GET.get('sort', '-date')
+    filters = transaction_filters(request.GET)
+    status = filters['status']
+    search = filters['search']
+    date_from = filters['date_from']
+    date_to = filters['date_to']
+    sort = filters['sort']
 
     # Base queryset with select_related to avoid N+1 queries
-    transactions = Transaction.objects.select_related('mapped_account', 'uploaded_by', 'mapped_by')
-
-    # Apply filters
-    if status:
-        transactions = transactions.filter(status=status)
-    if search:
-        transactions = transactions.filter(
-            Q(description__icontains=search) |
-            Q(customer_name__icontains=search) |
-            Q(transaction_id__icontains=search)
-        )
-    if date_from:
-        transactions = transactions.filter(date__gte=date_from)
-    if date_to:
-        transactions = transactions.filter(date__lte=date_to)
-
-    # Apply sorting
-    transactions = transactions.order_by(sort)
-
-    # Get accounts for mapping
-    accounts = Account.objects.all().order_by('name')
-
-    # Get statistics using efficient aggregation
-    stats = Transaction.objects.aggregate(
-        total_transactions=Count('transaction_id'),
-        mapped_transactions=Count('transaction_id', filter=Q(status='MAPPED')),
-        pending_transactions=Count('transaction_id', filter=Q(status='PENDING')),
-        verified_transactions=Count('transaction_id', filter=Q(status='VERIFIED'))
+    transactions = filter_transactions(
+        Transaction.objects.select_related('debit_account', 'credit_account'), filters
     )
 
-    # Pagination
-    paginator = Paginator(transactions, 50)  # Show 50 transactions per page
-    page = request.GET.get('page', 1)
-    try:
-        transactions = paginator.page(page)
-    except (PageNotAnInteger, EmptyPage):
-        transactions = paginator.page(1)
+    # Keyset pagination: every page is a range scan after the previous page's last row
+    paginator = KeysetPaginator(transactions, TRANSACTION_SORTS[sort], sort, per_page=TRANSACTIONS_PER_PAGE)
+    page = paginator.page(request.GET.get('cursor'))
+    total, total_approximate = approximate_count(transactions)
+
+    # Header statistics come from the maintained status counters
+    stats = status_counts()
+
+    # Links keep the filters and swap only the cursor
+    query = request.GET.copy()
+    query.pop('cursor', None)
 
     context = {
-        'transactions': transactions,
-        'accounts': accounts,
-        'total_transactions': stats['total_transactions'],
-        'mapped_transactions': stats['mapped_transactions'],
-        'pending_transactions': stats['pending_transactions'],
-        'verified_transactions': stats['verified_transactions'],
+        'transactions': page,
+        'filter_query': query.urlencode(),
+        'result_count': total,
+        'result_count_approximate': total_approximate,
+        'status_choices': Transaction.STATUS_CHOICES,
+        'total_transactions': stats['total'],
+        'mapped_transactions': stats['MAPPED'],
+        'pending_transactions': stats['PENDING'],
+        'verified_transactions': stats['VERIFIED'],
         'selected_status': status,
         'search_query': search,
         'date_from': date_from,
         'date_to': date_to,
         'sort': sort,
-        'filters': {
-            'status': status,
-            'search': search,
-            'date_from': date_from,
-            'date_to': date_to,
-            'sort': sort
-        }
+        'filters': filters
     }
 
     return render(request, 'transaction_mapper/transactions.html', context)
 
+@login_required
+def search_transactions_api(request):
+    """Ranked prefix search over transaction ids, descriptions and customer names"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', 20)), MAX_SEARCH_RESULTS)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+    ranked = ranked_transaction_ids(query, limit=max(limit, 1)) if query else []
+    rows = {
+        row['transaction_id']: row
+        for row in Transaction.objects.filter(transaction_id__in=[tid for tid, _ in ranked]).values(
+            'transaction_id', 'date', 'description', 'customer_name', 'amount', 'status'
+        )
+    } if ranked else {}
+
+    results = []
+    for transaction_id, score in ranked:
+        row = rows.get(transaction_id)
+        if row is not None:
+            results.append({**row, 'score': round(score, 4)})
+    return JsonResponse({'query': query, 'results': results})
+
+def _map_pending_batches(matcher, user, progress):
+    """Map pending transactions one batch at a time, yielding progress after each batch"""
+    # Walk pending transactions by primary key, so rows that leave
+    # PENDING during the run never shift the next batch
+    last_id = ''
+
+    while True:
+        try:
+            with transaction.atomic():
+                # Get batch of transactions with select_for_update to prevent concurrent modifications
+                batch = list(
+                    Transaction.objects.select_for_update(skip_locked=True)
+                    .filter(status='PENDING', transaction_id__gt=last_id)
+                    .order_by('transaction_id')[:MAP_BATCH_SIZE]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].transaction_id
+
+                mapped_at = timezone.now()
+                mapped = []
+                for trans in batch:
+                    account, confidence = matcher.match(trans.description)
+                    if account and confidence > MIN_CONFIDENCE:
+                        apply_mapping(
+                            trans, account, user, confidence,
+                            notes=f'Mapped via AI (confidence: {confidence:.2f})',
+                            mapped_at=mapped_at
+                        )
+                        mapped.append(trans)
+                    else:
+                        progress.add_error({
+                            'transaction_id': trans.transaction_id,
+                            'error': 'No suitable account found with sufficient confidence'
+                        })
+
+                # One UPDATE for the whole batch instead of a save() per row
+                if mapped:
+                    Transaction.objects.bulk_update(mapped, MAPPING_FIELDS)
+                    record_transaction_changes(moved('PENDING', 'MAPPED', len(mapped)))
+                progress.counts['mapped'] += len(mapped)
+
+        except Exception as e:
+            logger.error(f"Batch processing error after {last_id}: {str(e)}")
+            progress.add_error({
+                'batch': f"after={last_id}",
+                'error': f"Batch processing error: {str(e)}"
+            }, count=MAP_BATCH_SIZE)
+            yield progress.batch_done(0)
+            break
+
+        # Report outside the database transaction, so a slow client never holds row locks
+        yield progress.batch_done(len(batch))
+
+def _map_all_summary(progress):
+    """Final "Map All" result, as returned without streaming"""
+    response_data = {
+        'success': True,
+        'total_processed': progress.processed,
+        'total_mapped': progress.counts['mapped'],
+        'total_errors': progress.errors,
+        'error_details': progress.error_details
+    }
+
+    if progress.counts['mapped'] == 0:
+        response_data['warning'] = 'No transactions could be mapped successfully'
+
+    return response_data
+
 @login_required
 @role_required(['ADMIN', 'ACCOUNTANT'])
 def map_transaction(request, transaction_id=None):
@@ -102,136 +195,27 @@ def map_transaction(request, transaction_id=None):
 
         if map_all:
             # Map all unmapped transactions
-            pending_count = Transaction.objects.filter(status='PENDING').count()
-            if pending_count == 0:
+            if not Transaction.objects.filter(status='PENDING').exists():
                 return JsonResponse({'error': 'No pending transactions found'}, status=400)
 
-            # Get all accounts for AI context
-            all_accounts = list(Account.objects.all().values('account_id', 'name', 'account_type'))
-            if not all_accounts:
+            # Load the chart of accounts once for the whole run
+            matcher = AccountMatcher(Account.objects.all())
+            if not matcher:
                 return JsonResponse({'error': 'No accounts found in the system'}, status=400)
 
-            # Process in smaller batches
-            BATCH_SIZE = 50
-            total_mapped = 0
-            total_errors = 0
-            error_details = []
-
-            for offset in range(0, pending_count, BATCH_SIZE):
-                try:
-                    with transaction.atomic():
-                        # Get batch of transactions with select_for_update to prevent concurrent modifications
-                        batch = Transaction.objects.select_for_update(skip_locked=True).filter(
-                            status='PENDING'
-                        )[offset:offset + BATCH_SIZE]
-
-                        batch_data = []
-                        for trans in batch:
-                            try:
-                                # Prepare transaction data for AI
-                                batch_data.append({
-                                    'transaction_id': trans.transaction_id,
-                                    'description': trans.description,
-                                    'amount': str(trans.amount),
-                                    'customer_name': trans.customer_name,
-                                    'transaction_type': trans.transaction_type,
-                                    'date': trans.date.strftime('%Y-%m-%d')
-                                })
-                            except Exception as e:
-                                logger.error(f"Error preparing transaction {trans.transaction_id}: {str(e)}")
-                                error_details.append({
-                                    'transaction_id': trans.transaction_id,
-                                    'error': f"Data preparation error: {str(e)}"
-                                })
-                                total_errors += 1
-                                continue
-
-                        if not batch_data:
-                            continue
-
-                        try:
-                            # TODO: Replace with actual AI mapping call
-                            # This is where you'll call your AI service to get account mappings
-                            # Example:
-                            # ai_mappings = ai_service.map_transactions(batch_data, all_accounts)
-                            
-                            # Placeholder AI logic (replace with actual implementation)
-                            for trans in batch:
-                                try:
-                                    best_account = None
-                                    highest_confidence = 0
-                                    
-                                    for account in all_accounts:
-                                        # Simple word matching (replace with actual AI logic)
-                                        confidence = 0
-                                        desc_lower = trans.description.lower()
-                                        account_name_lower = account['name'].lower()
-                                        
-                                        if account_name_lower in desc_lower:
-                                            confidence = 0.9
-                                        elif any(word in desc_lower for word in account_name_lower.split()):
-                                            confidence = 0.7
-                                        
-                                        if confidence > highest_confidence:
-                                            highest_confidence = confidence
-                                            best_account = account
-
-                                    if best_account and highest_confidence > 0.5:
-                                        account_obj = Account.objects.get(account_id=best_account['account_id'])
-                                        trans.map_to_account(
-                                            account=account_obj,
-                                            user=request.user,
-                                            notes=f'Mapped via AI (confidence: {highest_confidence:.2f})',
-                                            confidence=highest_confidence
-                                        )
-                                        total_mapped += 1
-                                    else:
-                                        error_details.append({
-                                            'transaction_id': trans.transaction_id,
-                                            'error': 'No suitable account found with sufficient confidence'
-                                        })
-                                        total_errors += 1
-                                except Exception as e:
-                                    logger.error(f"Error mapping transaction {trans.transaction_id}: {str(e)}")
-                                    error_details.append({
-                                        'transaction_id': trans.transaction_id,
-                                        'error': f"Mapping error: {str(e)}"
-                                    })
-                                    total_errors += 1
-
-                        except Exception as e:
-                            logger.error(f"Batch AI mapping error: {str(e)}")
-                            error_details.append({
-                                'batch': f"offset={offset}",
-                                'error': f"AI service error: {str(e)}"
-                            })
-                            total_errors += len(batch_data)
-                            continue
-
-                except Exception as e:
-                    logger.error(f"Batch processing error at offset {offset}: {str(e)}")
-                    error_details.append({
-                        'batch': f"offset={offset}",
-                        'error': f"Batch processing error: {str(e)}"
-                    })
-                    total_errors += BATCH_SIZE
-                    continue
+            progress = BatchProgress(max_error_details=MAX_ERROR_DETAILS)
+            batches = _map_pending_batches(matcher, request.user, progress)
 
-            response_data = {
-                'success': True,
-                'total_processed': pending_count,
-                'total_mapped': total_mapped,
-                'total_errors': total_errors,
-                'error_details': error_details[:10] if error_details else []  # Limit error details in response
-            }
+            if wants_stream(request):
+                return ndjson_response(batches, lambda: _map_all_summary(progress))
 
-            if total_mapped == 0:
-                response_data['warning'] = 'No transactions could be mapped successfully'
-
-            return JsonResponse(response_data)
+            for _ in batches:
+                pass
+            return JsonResponse(_map_all_summary(progress))
 
         else:
             # Single transaction mapping
+            transaction_id = transaction_id or request.POST.get('transaction_id')
             if not transaction_id:
                 return JsonResponse({'error': 'Transaction ID is required'}, status=400)
 
@@ -255,12 +239,9 @@ def map_transaction(request, transaction_id=None):
                 except Account.DoesNotExist:
                     return JsonResponse({'error': 'Account not found'}, status=404)
                 
-                transaction_obj.map_to_account(
-                    account=account,
-                    user=request.user,
-                    notes='Mapped manually',
-                    confidence=1.0
-                )
+                apply_mapping(transaction_obj, account, request.user, 1.0, notes='Mapped manually')
+                # save() moves the row between the status counters
+                transaction_obj.save()
                 
                 return JsonResponse({
                     'success': True,
@@ -268,37 +249,18 @@ def map_transaction(request, transaction_id=None):
                 })
             else:
                 # AI mapping for single transaction
-                all_accounts = list(Account.objects.all().values('account_id', 'name', 'account_type'))
-                if not all_accounts:
+                matcher = AccountMatcher(Account.objects.all())
+                if not matcher:
                     return JsonResponse({'error': 'No accounts found in the system'}, status=400)
 
-                # TODO: Replace with actual AI mapping call
-                # Placeholder logic (same as batch processing)
-                best_account = None
-                highest_confidence = 0
-                
-                for account in all_accounts:
-                    confidence = 0
-                    desc_lower = transaction_obj.description.lower()
-                    account_name_lower = account['name'].lower()
-                    
-                    if account_name_lower in desc_lower:
-                        confidence = 0.9
-                    elif any(word in desc_lower for word in account_name_lower.split()):
-                        confidence = 0.7
-                    
-                    if confidence > highest_confidence:
-                        highest_confidence = confidence
-                        best_account = account
-
-                if best_account and highest_confidence > 0.5:
-                    account_obj = Account.objects.get(account_id=best_account['account_id'])
-                    transaction_obj.map_to_account(
-                        account=account_obj,
-                        user=request.user,
-                        notes=f'Mapped via AI (confidence: {highest_confidence:.2f})',
-                        confidence=highest_confidence
+                account_obj, highest_confidence = matcher.match(transaction_obj.description)
+
+                if account_obj and highest_confidence > MIN_CONFIDENCE:
+                    apply_mapping(
+                        transaction_obj, account_obj, request.user, highest_confidence,
+                        notes=f'Mapped via AI (confidence: {highest_confidence:.2f})'
                     )
+                    transaction_obj.save()
                     
                     return JsonResponse({
                         'success': True,
@@ -351,6 +313,221 @@ def reject_transaction(request, transaction_id):
         'message': 'Transaction rejected successfully'
     })
 
+def _bulk_review_queryset(request):
+    """
+    Select the transactions of a bulk review request, either by an explicit
+    ``transaction_ids`` list or by a status / minimum confidence filter.
+
+    :return: Tuple of (queryset, requested id count or None, error response or None)
+    """
+    transaction_ids = [tid for tid in request.POST.getlist('transaction_ids') if tid]
+    if transaction_ids:
+        ids = set(transaction_ids)
+        return Transaction.objects.filter(transaction_id__in=ids), len(ids), None
+
+    status = request.POST.get('status', '')
+    min_confidence = request.POST.get('min_confidence', '')
+    if not status and not min_confidence:
+        return None, None, JsonResponse({'error': 'Provide transaction_ids or a status/min_confidence filter'}, status=400)
+
+    queryset = Transaction.objects.all()
+    if status:
+        queryset = queryset.filter(status=status)
+    if min_confidence:
+        try:
+            queryset = queryset.filter(confidence_score__gte=float(min_confidence))
+        except ValueError:
+            return None, None, JsonResponse({'error': f'Invalid min_confidence: {min_confidence}'}, status=400)
+    return queryset, None, None
+
+def _bulk_review_counts(matched, updated, requested):
+    counts = {'matched': matched, 'skipped': matched - updated}
+    if requested is not None:
+        counts['not_found'] = requested - matched
+    return counts
+
+@login_required
+@role_required(['ADMIN', 'ACCOUNTANT'])
+def bulk_verify_transactions(request):
+    """Verify many mapped transactions with one UPDATE per batch"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    queryset, requested, error = _bulk_review_queryset(request)
+    if error:
+        return error
+
+    matched = queryset.count()
+    # Rows without both entry accounts are excluded in SQL and reported as skipped
+    verified = queryset.verify_mappings(batch_size=REVIEW_BATCH_SIZE)
+    logger.info(f"User {request.user.username} verified {verified} of {matched} transactions")
+    return JsonResponse({
+        'status': 'success',
+        'verified': verified,
+        **_bulk_review_counts(matched, verified, requested)
+    })
+
+@login_required
+@role_required(['ADMIN', 'ACCOUNTANT'])
+def bulk_reject_transactions(request):
+    """Reject many transaction mappings with one UPDATE per batch"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    queryset, requested, error = _bulk_review_queryset(request)
+    if error:
+        return error
+
+    matched = queryset.count()
+    rejected = queryset.reject_mappings(request.POST.get('reason', ''), batch_size=REVIEW_BATCH_SIZE)
+    logger.info(f"User {request.user.username} rejected {rejected} of {matched} transactions")
+    return JsonResponse({
+        'status': 'success',
+        'rejected': rejected,
+        **_bulk_review_counts(matched, rejected, requested)
+    })
+
+def _normalize_columns(chunk):
+    """Lowercase column names and strip byte order marks and whitespace"""
+    chunk.columns = chunk.columns.astype(str).str.replace('\ufeff', '').str.strip().str.lower()
+    return chunk
+
+def _import_chunks(frames, user, progress, unknown_accounts):
+    """Validate and insert uploaded rows one chunk at a time, yielding progress after each chunk"""
+    deduplicator = TransactionDeduplicator()
+
+    for chunk in frames:
+        transactions_to_create = []
+
+        # Resolve the distinct account codes of this chunk in one query
+        account_codes = chunk['account'].dropna() if 'account' in chunk.columns else []
+        accounts, unknown = resolve_accounts(account_codes)
+        unknown_accounts.update(unknown)
+
+        for index, row in chunk.iterrows():
+            try:
+                # Basic data validation
+                if pd.isna(row['date']) or pd.isna(row['description']) or pd.isna(row['amount']):
+                    progress.add_error({
+                        'row': index + 2,
+                        'error': 'Missing required fields'
+                    })
+                    continue
+                
+                # Validate and parse date
+                try:
+                    parsed_date = pd.to_datetime(row['date']).date()
+                except Exception as e:
+                    progress.add_error({
+                        'row': index + 2,
+                        'error': f'Invalid date format: {row["date"]}'
+                    })
+                    continue
+                
+                # Validate and parse amount
+                try:
+                    amount = Decimal(str(row['amount']).strip().replace(',', ''))
+                except Exception as e:
+                    progress.add_error({
+                        'row': index + 2,
+                        'error': f'Invalid amount format: {row["amount"]}'
+                    })
+                    continue
+                
+                description = str(row['description']).strip()[:255]
+                
+                # Create transaction object
+                trans_data = {
+                    'date': parsed_date,
+                    'description': description,
+                    'amount': amount,
+                    'transaction_type': str(row.get('transaction_type', 'OTHER')).strip().upper()[:50],
+                    'uploaded_by': user,
+                    'status': 'PENDING'
+                }
+                
+                # Add optional fields if present
+                if 'time' in row and pd.notna(row['time']):
+                    try:
+                        # Workbook cells already hold time objects
+                        value = row['time']
+                        trans_data['time'] = value if isinstance(value, time) else pd.to_datetime(value).time()
+                    except:
+                        logger.warning(f"Invalid time format in row {index + 2}: {row['time']}")
+                
+                if 'customer_name' in row and pd.notna(row['customer_name']):
+                    trans_data['customer_name'] = str(row['customer_name'])[:100]
+                
+                account_code = None
+                if 'account' in row and pd.notna(row['account']):
+                    account_code = str(row['account']).strip()
+                    account = accounts.get(account_code)
+                    if account is not None:
+                        trans_data['account'] = account
+                
+                # Identical rows from overlapping exports share a fingerprint;
+                # a supplied ID is part of it, and rows without one get an ID
+                # derived from their content
+                supplied_id = None
+                if 'transaction_id' in row and pd.notna(row['transaction_id']):
+                    supplied_id = str(row['transaction_id']).strip() or None
+                trans_data['fingerprint'] = transaction_fingerprint(
+                    parsed_date, amount, description,
+                    trans_data.get('customer_name'), account_code, supplied_id
+                )
+                trans_data['transaction_id'] = supplied_id or trans_data['fingerprint'][:40]
+                
+                # Validate transaction (uniqueness is handled by the deduplicator)
+                trans = Transaction(**trans_data)
+                trans.full_clean(validate_unique=False)
+                transactions_to_create.append(trans)
+                
+            except Exception as e:
+                logger.error(f"Error processing row {index + 2}: {str(e)}")
+                progress.add_error({
+                    'row': index + 2,
+                    'error': str(e)
+                })
+                continue
+
+        new_transactions = deduplicator.new_only(transactions_to_create)
+        created = 0
+        if new_transactions:
+            with transaction.atomic():
+                # Rows skipped by ignore_conflicts are not reported back, so
+                # count the batch's ids before and after the insert
+                batch_ids = Transaction.objects.filter(transaction_id__in=[t.transaction_id for t in new_transactions])
+                existing = batch_ids.count()
+                Transaction.objects.bulk_create(new_transactions, ignore_conflicts=True)
+                created = batch_ids.count() - existing
+                if created:
+                    record_transaction_changes({'PENDING': created})
+                progress.counts['created'] += created
+                logger.info(f"Created batch of {created} transactions")
+        progress.counts['duplicates'] += len(transactions_to_create) - created
+
+        yield progress.batch_done(len(chunk))
+
+def _upload_summary(progress, unknown_accounts):
+    """Final upload result, as returned without streaming"""
+    if unknown_accounts:
+        logger.warning(f"{len(unknown_accounts)} account codes not found: {sorted(unknown_accounts)[:10]}")
+
+    success_count = progress.counts['created']
+    logger.info(f"Upload complete. {success_count} transactions created, {progress.counts['duplicates']} duplicates skipped, {progress.errors} errors")
+
+    return {
+        'success': True,
+        'message': f'Successfully processed {success_count} transactions',
+        'total_rows': progress.processed,
+        'success_count': success_count,
+        'duplicate_count': progress.counts['duplicates'],
+        'error_count': progress.errors,
+        'errors': progress.error_details,
+        'unknown_account_count': len(unknown_accounts),
+        'unknown_accounts': sorted(unknown_accounts)[:10]
+    }
+
 @login_required
 @role_required(['ADMIN', 'ACCOUNTANT'])
 @csrf_exempt
@@ -369,182 +546,110 @@ def upload_transactions(request):
         file = request.FILES['file']
         logger.info(f"Received file: {file.name}, size: {file.size} bytes")
         
-        # Validate file size (10MB limit)
-        if file.size > 10 * 1024 * 1024:
+        file_type = file_type_from_name(file.name)
+        max_size = getattr(settings, 'TRANSACTION_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+        
+        # Validate file size
+        if file.size > max_size:
             logger.warning(f"File too large: {file.size} bytes")
-            return JsonResponse({'error': 'File size exceeds 10MB limit'}, status=400)
+            return JsonResponse({'error': f'File size exceeds {max_size // (1024 * 1024)}MB limit'}, status=400)
         
         # Validate file type
-        if not file.name.lower().endswith('.csv'):
+        if file_type not in UPLOAD_FILE_TYPES:
             logger.warning(f"Invalid file type: {file.name}")
-            return JsonResponse({'error': 'Only CSV files are allowed'}, status=400)
+            return JsonResponse({'error': 'Only CSV, XLSX and Parquet files are allowed'}, status=400)
         
         # Read and validate file content
         try:
-            # Try different encodings
-            df = None
-            encoding_errors = []
+            frames = None
             
-            for encoding in ['utf-8', 'utf-8-sig', 'latin1', 'iso-8859-1']:
-                try:
-                    logger.info(f"Trying to read file with {encoding} encoding")
-                    # First, try to read a small chunk to validate structure
-                    chunk = file.read(1024).decode(encoding)
-                    file.seek(0)
-                    
-                    # Validate CSV structure
-                    lines = [line.strip() for line in chunk.split('\n') if line.strip()]
-                    if not lines:
-                        logger.warning("File appears to be empty")
-                        return JsonResponse({'error': 'File appears to be empty'}, status=400)
-                    
-                    # Parse headers
-                    headers = [h.strip().lower() for h in lines[0].split(',')]
-                    logger.info(f"Found headers: {headers}")
-                    
-                    # Check required columns
-                    required_columns = ['date', 'description', 'amount']
-                    missing_columns = [col for col in required_columns if col not in headers]
-                    
-                    if missing_columns:
-                        logger.warning(f"Missing required columns: {missing_columns}")
+            if file_type == 'csv':
+                # Try different encodings
+                encoding_errors = []
+                
+                for encoding in ['utf-8', 'utf-8-sig', 'latin1', 'iso-8859-1']:
+                    try:
+                        logger.info(f"Trying to read file with {encoding} encoding")
+                        # First, try to read a small chunk to validate structure
+                        chunk = file.read(1024).decode(encoding)
+                        file.seek(0)
+                        
+                        # Validate CSV structure
+                        lines = [line.strip() for line in chunk.split('\n') if line.strip()]
+                        if not lines:
+                            logger.warning("File appears to be empty")
+                            return JsonResponse({'error': 'File appears to be empty'}, status=400)
+                        
+                        # Parse headers
+                        headers = [h.strip().lower() for h in lines[0].split(',')]
+                        logger.info(f"Found headers: {headers}")
+                        
+                        # Check required columns
+                        missing_columns = [col for col in REQUIRED_COLUMNS if col not in headers]
+                        
+                        if missing_columns:
+                            logger.warning(f"Missing required columns: {missing_columns}")
+                            return JsonResponse({
+                                'error': f'Missing required columns: {", ".join(missing_columns)}',
+                                'found_columns': headers
+                            }, status=400)
+                        
+                        # Stream the file in chunks from here on
+                        frames = iter_frames(file, 'csv', chunksize=UPLOAD_BATCH_SIZE, encoding=encoding)
+                        logger.info(f"Reading file with {encoding} encoding")
+                        break
+                        
+                    except UnicodeDecodeError as e:
+                        encoding_errors.append(f"{encoding}: {str(e)}")
+                        file.seek(0)
+                        continue
+                    except Exception as e:
+                        logger.error(f"Error reading file with {encoding} encoding: {str(e)}")
                         return JsonResponse({
-                            'error': f'Missing required columns: {", ".join(missing_columns)}',
-                            'found_columns': headers
+                            'error': f'Error reading CSV file: {str(e)}'
                         }, status=400)
-                    
-                    # Try to read the full file
-                    df = pd.read_csv(file, encoding=encoding)
-                    logger.info(f"Successfully read file with {encoding} encoding")
-                    break
-                    
-                except UnicodeDecodeError as e:
-                    encoding_errors.append(f"{encoding}: {str(e)}")
-                    file.seek(0)
-                    continue
-                except Exception as e:
-                    logger.error(f"Error reading file with {encoding} encoding: {str(e)}")
+                
+                if frames is None:
+                    logger.error(f"Failed to read file with any encoding. Errors: {encoding_errors}")
                     return JsonResponse({
-                        'error': f'Error reading CSV file: {str(e)}'
+                        'error': 'Unable to read the CSV file. Please ensure it is properly encoded (UTF-8).'
                     }, status=400)
+            else:
+                # Workbooks and Parquet files are read one chunk of rows at a time
+                frames = iter_frames(file, file_type, chunksize=UPLOAD_BATCH_SIZE)
             
-            if df is None:
-                logger.error(f"Failed to read file with any encoding. Errors: {encoding_errors}")
+            # Check the columns of the first chunk before any row is processed
+            frames = (_normalize_columns(chunk) for chunk in frames)
+            first_chunk = next(frames, None)
+            if first_chunk is None:
+                logger.warning("File appears to be empty")
+                return JsonResponse({'error': 'File appears to be empty'}, status=400)
+            
+            missing_columns = [col for col in REQUIRED_COLUMNS if col not in first_chunk.columns]
+            if missing_columns:
+                logger.warning(f"Missing required columns: {missing_columns}")
                 return JsonResponse({
-                    'error': 'Unable to read the CSV file. Please ensure it is properly encoded (UTF-8).'
+                    'error': f'Missing required columns: {", ".join(missing_columns)}',
+                    'found_columns': list(first_chunk.columns)
                 }, status=400)
             
-            # Process the data
-            success_count = 0
-            error_rows = []
-            transactions_to_create = []
-            
             # Process in batches
-            BATCH_SIZE = 100
-            total_rows = len(df)
-            logger.info(f"Processing {total_rows} rows in batches of {BATCH_SIZE}")
-            
-            for index, row in df.iterrows():
-                try:
-                    # Basic data validation
-                    if pd.isna(row['date']) or pd.isna(row['description']) or pd.isna(row['amount']):
-                        error_rows.append({
-                            'row': index + 2,
-                            'error': 'Missing required fields'
-                        })
-                        continue
-                    
-                    # Validate and parse date
-                    try:
-                        parsed_date = pd.to_datetime(row['date']).date()
-                    except Exception as e:
-                        error_rows.append({
-                            'row': index + 2,
-                            'error': f'Invalid date format: {row["date"]}'
-                        })
-                        continue
-                    
-                    # Validate and parse amount
-                    try:
-                        amount = Decimal(str(row['amount']).strip().replace(',', ''))
-                    except Exception as e:
-                        error_rows.append({
-                            'row': index + 2,
-                            'error': f'Invalid amount format: {row["amount"]}'
-                        })
-                        continue
-                    
-                    # Create transaction object
-                    trans_data = {
-                        'transaction_id': str(row.get('transaction_id', uuid.uuid4())),
-                        'date': parsed_date,
-                        'description': str(row['description']).strip()[:255],
-                        'amount': amount,
-                        'transaction_type': str(row.get('transaction_type', 'OTHER')).strip().upper()[:50],
-                        'uploaded_by': request.user,
-                        'status': 'PENDING'
-                    }
-                    
-                    # Add optional fields if present
-                    if 'time' in row and pd.notna(row['time']):
-                        try:
-                            trans_data['time'] = pd.to_datetime(row['time']).time()
-                        except:
-                            logger.warning(f"Invalid time format in row {index + 2}: {row['time']}")
-                    
-                    if 'customer_name' in row and pd.notna(row['customer_name']):
-                        trans_data['customer_name'] = str(row['customer_name'])[:100]
-                    
-                    if 'account' in row and pd.notna(row['account']):
-                        try:
-                            account = Account.objects.get(account_id=str(row['account']))
-                            trans_data['account'] = account
-                        except Account.DoesNotExist:
-                            logger.warning(f"Account {row['account']} not found for row {index + 2}")
-                    
-                    # Validate transaction
-                    trans = Transaction(**trans_data)
-                    trans.full_clean()
-                    transactions_to_create.append(trans)
-                    
-                    # Process in batches
-                    if len(transactions_to_create) >= BATCH_SIZE:
-                        with transaction.atomic():
-                            Transaction.objects.bulk_create(transactions_to_create)
-                            success_count += len(transactions_to_create)
-                            logger.info(f"Created batch of {len(transactions_to_create)} transactions")
-                        transactions_to_create = []
-                    
-                except Exception as e:
-                    logger.error(f"Error processing row {index + 2}: {str(e)}")
-                    error_rows.append({
-                        'row': index + 2,
-                        'error': str(e)
-                    })
-                    continue
+            logger.info(f"Processing {file_type} rows in batches of {UPLOAD_BATCH_SIZE}")
+            progress = BatchProgress(max_error_details=MAX_ERROR_DETAILS)
+            unknown_accounts = set()
+            batches = _import_chunks(chain([first_chunk], frames), request.user, progress, unknown_accounts)
             
-            # Process remaining transactions
-            if transactions_to_create:
-                with transaction.atomic():
-                    Transaction.objects.bulk_create(transactions_to_create)
-                    success_count += len(transactions_to_create)
-                    logger.info(f"Created final batch of {len(transactions_to_create)} transactions")
+            if wants_stream(request):
+                return ndjson_response(batches, lambda: _upload_summary(progress, unknown_accounts))
             
-            logger.info(f"Upload complete. {success_count} transactions created, {len(error_rows)} errors")
-            
-            return JsonResponse({
-                'success': True,
-                'message': f'Successfully processed {success_count} transactions',
-                'total_rows': total_rows,
-                'success_count': success_count,
-                'error_count': len(error_rows),
-                'errors': error_rows[:10] if error_rows else []
-            })
+            for _ in batches:
+                pass
+            return JsonResponse(_upload_summary(progress, unknown_accounts))
             
         except Exception as e:
-            logger.error(f"Error processing CSV: {str(e)}")
+            logger.error(f"Error processing {file_type} file: {str(e)}")
             return JsonResponse({
-                'error': f'Error processing CSV file: {str(e)}'
+                'error': f'Error processing {file_type.upper()} file: {str(e)}'
             }, status=400)
             
     except Exception as e:
@@ -582,7 +687,12 @@ def delete_all_transactions(request):
                     
                 # Delete the batch
                 batch_ids = list(batch.values_list('transaction_id', flat=True))
-                Transaction.objects.filter(transaction_id__in=batch_ids).delete()
+                doomed = Transaction.objects.filter(transaction_id__in=batch_ids)
+                balances = BalanceDeltas()
+                balances.add_queryset(doomed, -1)
+                balances.apply()
+                record_transaction_changes(removed(status_breakdown(doomed)))
+                doomed.delete()
                 deleted_count += len(batch_ids)
                 logger.info(f"Deleted batch of {len(batch_ids)} transactions")
         
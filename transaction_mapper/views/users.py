@@ -1,8 +1,13 @@
+import uuid
+
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.contrib import messages
+from django.http import JsonResponse
 from ..decorators import role_required
+from ..activity_archive import activity_summary
+from ..reports import InvalidPeriod, report_period
 
 User = get_user_model()
 
@@ -23,3 +28,19 @@ def register_view(request):
         # Handle registration logic here
         pass
     return render(request, 'transaction_mapper/users/register.html', {'title': 'Register'})
+
+@login_required
+@role_required('ADMIN')
+def user_activity_summary(request):
+    """Daily activity counts per user and type, read from the rollups rather than raw events"""
+    try:
+        date_from, date_to = report_period(request.GET)
+    except InvalidPeriod as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    user_id = request.GET.get('user') or None
+    if user_id is not None:
+        try:
+            user_id = uuid.UUID(user_id)
+        except ValueError:
+            return JsonResponse({'error': 'user must be a valid user id'}, status=400)
+    return JsonResponse({'results': activity_summary(user_id, date_from, date_to)})